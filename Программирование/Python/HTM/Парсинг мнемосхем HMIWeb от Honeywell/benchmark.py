@@ -0,0 +1,160 @@
+"""
+Бенчмарк "htm to xlsx v2.py": отдельно замеряет этапы ProjectScanner (поиск и разбор HTM),
+SHAParser (разбор SHA) и ExcelWriter (запись XLSX) и выводит файлы/с, элементы/с и пиковый RSS.
+
+Проект для замеров создаётся generate_test_project.py. Результаты можно дописывать в JSONL (--results),
+чтобы сравнивать оптимизации от запуска к запуску.
+
+Пример:
+    python generate_test_project.py --out bench_project --displays 1000
+    python benchmark.py --root bench_project --workers 8 --executor process --results bench.jsonl
+"""
+from __future__ import annotations
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Модуль экспортера загружается по пути (в имени файла пробелы) на уровне модуля,
+# чтобы при запуске пула процессов (spawn) воркеры тоже могли его импортировать
+_EXPORTER_PATH = Path(__file__).with_name("htm to xlsx v2.py")
+_spec = importlib.util.spec_from_file_location("htm_to_xlsx", _EXPORTER_PATH)
+exporter = importlib.util.module_from_spec(_spec)
+sys.modules["htm_to_xlsx"] = exporter
+_spec.loader.exec_module(exporter)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS процесса плюс пиковый RSS крупнейшего дочернего процесса (воркера пула), МБ."""
+    if resource is not None:
+        # ru_maxrss: килобайты в Linux, байты в macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return round((peak + children) / scale, 1)
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds > 0 else 0.0
+
+
+def run_once(root: Path, workers: int, executor: str, backend: str, output_dir: Path,
+             keep_raw: bool = False, trace_memory: bool = False) -> Dict[str, Any]:
+    """Один прогон всех этапов без кэша разбора."""
+    result: Dict[str, Any] = {}
+
+    scanner = exporter.ProjectScanner(root, exporter.HTMParser(backend=backend, keep_raw=keep_raw),
+                                      max_workers=workers, executor=executor)
+    if trace_memory:
+        # Объём, занимаемый разобранными HMIElement/HTMDisplay в основном процессе (замедляет замер времени)
+        tracemalloc.start()
+    start = time.perf_counter()
+    displays, htm_to_sha = scanner.collect_elements_and_shas()
+    elapsed = time.perf_counter() - start
+    n_elements = sum(len(d.elements) for d in displays.values())
+    result["ProjectScanner"] = {
+        "seconds": round(elapsed, 3), "files": len(displays), "elements": n_elements,
+        "files_per_s": rate(len(displays), elapsed), "elements_per_s": rate(n_elements, elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if trace_memory:
+        result["ProjectScanner"]["retained_mb"] = round(tracemalloc.get_traced_memory()[0] / (1024 * 1024), 1)
+        tracemalloc.stop()
+
+    sha_paths = sorted(set().union(*htm_to_sha.values())) if htm_to_sha else []
+    start = time.perf_counter()
+    sha_meta = scanner.parse_shas(sha_paths, exporter.SHAParser(backend=backend, keep_raw=keep_raw))
+    elapsed = time.perf_counter() - start
+    n_params = sum(len(m.parameters_list) + len(m.scripts_list) for m in sha_meta.values() if m)
+    result["SHAParser"] = {
+        "seconds": round(elapsed, 3), "files": len(sha_paths), "elements": n_params,
+        "files_per_s": rate(len(sha_paths), elapsed), "elements_per_s": rate(n_params, elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    report = exporter.ReportRows(displays, sha_meta)
+    writer = exporter.ExcelWriter(output_dir / "benchmark.xlsx")
+    start = time.perf_counter()
+    writer.write(general_info=report.iter_general_info, hmi_rows=report.iter_hmi_rows,
+                 nav_rows=report.iter_nav_rows, shape_defs=report.iter_shape_defs)
+    elapsed = time.perf_counter() - start
+    result["ExcelWriter"] = {
+        "seconds": round(elapsed, 3), "files": 1, "elements": n_elements,
+        "files_per_s": rate(1, elapsed), "elements_per_s": rate(n_elements, elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return result
+
+
+def print_result(result: Dict[str, Any]):
+    print(f"{'Этап':<16}{'сек':>10}{'файлов':>10}{'файлов/с':>12}{'элементов/с':>14}{'пик RSS, МБ':>14}")
+    for stage, r in result.items():
+        print(f"{stage:<16}{r['seconds']:>10.3f}{r['files']:>10}{r['files_per_s']:>12.1f}"
+              f"{r['elements_per_s']:>14.1f}{str(r['peak_rss_mb']):>14}")
+        if "retained_mb" in r:
+            print(f"{'':<16}разобранные данные в памяти: {r['retained_mb']} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов парсера HMIWeb")
+    parser.add_argument("--root", "-r", help="Каталог проекта (см. generate_test_project.py)", required=True)
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--executor", "-e", choices=exporter.EXECUTOR_KINDS, default="process")
+    parser.add_argument("--backend", "-b", choices=exporter.BACKENDS, default=exporter.DEFAULT_BACKEND)
+    parser.add_argument("--repeat", help="Количество прогонов (выводится лучший по суммарному времени)",
+                        type=int, default=1)
+    parser.add_argument("--results", help="Дописать результат в JSONL-файл для сравнения запусков", default=None)
+    parser.add_argument("--keep-raw", help="Хранить исходные строки атрибутов (как --keep-raw экспортера)",
+                        action="store_true")
+    parser.add_argument("--trace-memory", help="Замерить объём разобранных данных в памяти (tracemalloc)",
+                        action="store_true")
+    parser.add_argument("--label", help="Метка запуска в JSONL (например, имя ветки/оптимизации)", default="")
+    args = parser.parse_args()
+
+    # Пофайловые сообщения INFO искажают замер
+    logging.getLogger().setLevel(logging.WARNING)
+
+    root = Path(args.root).resolve()
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(max(1, args.repeat)):
+            result = run_once(root, args.workers, args.executor, args.backend, Path(tmp),
+                              args.keep_raw, args.trace_memory)
+            total = sum(r["seconds"] for r in result.values())
+            if best is None or total < best[0]:
+                best = (total, result)
+
+    total, result = best
+    print(f"Проект: {root} | воркеров: {args.workers} ({args.executor}) | движок: {args.backend}")
+    print_result(result)
+    print(f"Итого: {total:.3f} с")
+
+    if args.results:
+        record = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"), "label": args.label, "root": str(root),
+            "workers": args.workers, "executor": args.executor, "backend": args.backend, "keep_raw": args.keep_raw,
+            "total_seconds": round(total, 3), "stages": result,
+        }
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Генератор синтетического проекта HMIWeb (HTM + SHA) для замеров производительности
+"htm to xlsx v2.py" без проприетарных мнемосхем заказчика.
+
+Структура проекта:
+    <out>/Shapes/<lib>/.../shape_NNNN.sha       — общая библиотека форм (вложенность до --depth)
+    <out>/<area>/.../display_NNNNN.htm          — мнемосхемы (вложенность до --depth)
+    <out>/<area>/.../display_NNNNN_files/*.sha  — локальные копии части форм (побайтные дубликаты)
+
+Каталог --out пересоздаётся, только если его создал генератор (файл-метка MARKER_NAME) или он пуст;
+любой другой каталог удаляется лишь с --force — чтобы опечатка в --out не стёрла настоящий проект.
+
+Пример:
+    python generate_test_project.py --out bench_project --displays 4000 --shapes 150 --sha-files 300
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import shutil
+from pathlib import Path
+from typing import List
+
+ENCODINGS = ("cp1251", "cp1252", "utf-8")
+# Файл-метка в корне сгенерированного проекта: такой каталог можно пересоздавать без --force
+MARKER_NAME = ".generated_test_project"
+
+# Текст, представимый в соответствующей кодировке (кириллица не кодируется в cp1252)
+TITLE_WORDS = {
+    "cp1251": ["Установка", "Колонна", "Насосная", "Печь", "Резервуарный парк", "Компрессорная"],
+    "cp1252": ["Unité", "Kolonne", "Pumpenstation", "Four", "Réservoir", "Kompressor"],
+    "utf-8": ["Установка", "Unité", "Колонна", "Kolonne", "Печь", "Réservoir"],
+}
+POINT_PREFIXES = ["FIC", "TIC", "PIC", "LIC", "FI", "TI", "PI", "LI", "XV", "HS", "P", "M"]
+POINT_PARAMS = ["PV", "SP", "OP", "MODE", "PVEUHI", "PVEULO", "STATE"]
+HDX_KEYS = ["fillColor", "lineColor", "x", "y", "rotation", "blink", "visible"]
+
+
+def nested_dir(rng: random.Random, base: Path, prefix: str, depth: int) -> Path:
+    """Случайный вложенный каталог глубиной от 0 до depth."""
+    path = base
+    for level in range(rng.randint(0, depth)):
+        path = path / f"{prefix}{level + 1}_{rng.randint(1, 3)}"
+    return path
+
+
+def sha_text(rng: random.Random, index: int, encoding: str) -> str:
+    """Содержимое SHA: shapefile с параметрами и скриптами."""
+    params = "\n".join(
+        f'  <parameter name="Param{k}" type="{rng.choice(["point", "string", "number"])}" '
+        f'description="{rng.choice(TITLE_WORDS[encoding])} {k}" defaultvalue="{rng.randint(0, 100)}"/>'
+        for k in range(rng.randint(1, 12))
+    )
+    scripts = "\n".join(
+        f'  <script id="s{k}" language="VBScript" event="{rng.choice(["onclick", "onupdate", "ondatachange"])}">'
+        f'<![CDATA[If value > {rng.randint(0, 100)} Then\n    fillColor = "red"\nEnd If]]></script>'
+        for k in range(rng.randint(0, 4))
+    )
+    return (
+        f'<?xml version="1.0" encoding="{encoding}"?>\n'
+        f'<shapefile title="Shape{index:04d}" description="{rng.choice(TITLE_WORDS[encoding])}" '
+        f'width="{rng.randint(10, 200)}px" height="{rng.randint(10, 200)}px">\n'
+        f"{params}\n{scripts}\n</shapefile>\n"
+    )
+
+
+def element_html(rng: random.Random, k: int, src: str, nav_ratio: float) -> str:
+    """Один элемент hsc.shape.1 (тег или навигационная форма) со служебной разметкой вокруг."""
+    hdx = ";".join(f"{key}:{rng.choice(['red', 'green', '#C0C0C0', str(rng.randint(0, 1000))])}"
+                   for key in rng.sample(HDX_KEYS, rng.randint(1, 4))) + ";"
+    tag = rng.choice(["div", "div", "object"])
+    if rng.random() < nav_ratio:
+        params = f"Display?Target:display_{rng.randint(0, 99999):05d};Parameter?Mode:{rng.choice(['popup', 'replace'])}"
+    else:
+        point = f"{rng.choice(POINT_PREFIXES)}{rng.randint(100, 99999)}"
+        params = (f"Point?ItemProperty1:{point}.{rng.choice(POINT_PARAMS)};"
+                  f"Parameter?Itemproperty2:{point}.DESC;Parameter?Data Source:Point;"
+                  f"Server Control:SRV{rng.randint(1, 4)}")
+    shape = (f'<{tag} id="shape{k:04d}" class="hsc.shape.1 shape{k % 7}" src="{src}" '
+             f'linktype="{rng.choice(["Embedded", "Linked"])}" hdxproperties="{hdx}" parameters="{params}" '
+             f'style="position:absolute;left:{rng.randint(0, 1800)}px;top:{rng.randint(0, 1000)}px">'
+             f'<span class="label">{k}</span></{tag}>')
+    # Служебные элементы, которые парсер должен пропускать
+    filler = (f'<div id="text{k:04d}" class="hsc.textbox" style="left:{rng.randint(0, 1800)}px">'
+              f'<p>Text {k}</p></div>'
+              f'<v:line id="line{k:04d}" from="0,0" to="{rng.randint(1, 99)},10"></v:line>')
+    return shape + filler
+
+
+def prepare_out_dir(out: Path, force: bool = False):
+    """Пересоздаёт каталог проекта. Чужой непустой каталог (без метки генератора) — только с force."""
+    if out.exists():
+        if not out.is_dir():
+            raise FileExistsError(f"{out} существует и не является каталогом")
+        if not (out / MARKER_NAME).is_file() and any(out.iterdir()) and not force:
+            raise FileExistsError(f"Каталог {out} не пуст и создан не генератором; для удаления укажите --force")
+        shutil.rmtree(out)
+    out.mkdir(parents=True)
+    (out / MARKER_NAME).write_text("Синтетический проект generate_test_project.py\n", encoding="utf-8")
+
+
+def generate(out: Path, displays: int, shapes: int, sha_files: int, encodings: List[str], depth: int,
+             nav_ratio: float, local_copies: int, seed: int, force: bool = False):
+    rng = random.Random(seed)
+    prepare_out_dir(out, force)
+
+    # Общая библиотека форм
+    library: List[Path] = []
+    for i in range(sha_files):
+        encoding = rng.choice(encodings)
+        path = nested_dir(rng, out / "Shapes", "lib", depth) / f"shape_{i:04d}.sha"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(sha_text(rng, i, encoding), encoding=encoding)
+        library.append(path)
+
+    total_elements = 0
+    for d in range(displays):
+        encoding = rng.choice(encodings)
+        htm = nested_dir(rng, out / f"Area{d % 5 + 1}", "unit", depth) / f"display_{d:05d}.htm"
+        htm.parent.mkdir(parents=True, exist_ok=True)
+
+        # Локальные копии форм в папке <display>_files (побайтные дубликаты библиотечных)
+        local: List[str] = []
+        if local_copies and library:
+            files_dir = htm.parent / f"{htm.stem}_files"
+            files_dir.mkdir(exist_ok=True)
+            for sha in rng.sample(library, min(local_copies, len(library))):
+                shutil.copyfile(sha, files_dir / sha.name)
+                local.append(f"{files_dir.name}/{sha.name}")
+
+        elements = []
+        n_shapes = max(0, int(rng.gauss(shapes, shapes / 4)))
+        for k in range(n_shapes):
+            if local and rng.random() < 0.3:
+                src = rng.choice(local)
+            else:
+                src = Path(os.path.relpath(rng.choice(library), htm.parent)).as_posix()
+            elements.append(element_html(rng, k, src, nav_ratio))
+        total_elements += n_shapes
+
+        title = f"{rng.choice(TITLE_WORDS[encoding])} {d}"
+        html = (
+            '<html xmlns:v="urn:schemas-microsoft-com:vml">\n<head>\n'
+            f'<meta http-equiv="Content-Type" content="text/html; charset={encoding}">\n'
+            f'<meta name="HMIWebTemplateDescription" content="Template{rng.randint(1, 5)}">\n'
+            f"<title>{title}</title>\n"
+            '<style>v\\:* { behavior: url(#default#VML); }</style>\n</head>\n'
+            f'<body style="width: {rng.choice([1280, 1600, 1920])}px; height: {rng.choice([1024, 1200, 1080])}px; '
+            f'background-color: {rng.choice(["#C0C0C0", "black", "rgb(96,96,96)"])}">\n'
+            + "\n".join(elements) +
+            "\n</body>\n</html>\n"
+        )
+        htm.write_text(html, encoding=encoding)
+
+    print(f"Проект создан: {out} (HTM: {displays}, элементов: {total_elements}, SHA в библиотеке: {sha_files})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генератор синтетического проекта HMIWeb для бенчмарков")
+    parser.add_argument("--out", "-o", help="Каталог проекта (будет пересоздан)", default="bench_project")
+    parser.add_argument("--force", help="Удалить --out, даже если он не пуст и создан не генератором",
+                        action="store_true")
+    parser.add_argument("--displays", "-n", help="Количество HTM-мнемосхем", type=int, default=200)
+    parser.add_argument("--shapes", "-s", help="Среднее количество форм на мнемосхему", type=int, default=150)
+    parser.add_argument("--sha-files", help="Количество SHA в общей библиотеке", type=int, default=100)
+    parser.add_argument("--encodings", help="Кодировки файлов через запятую", default=",".join(ENCODINGS))
+    parser.add_argument("--depth", help="Максимальная глубина вложенности каталогов", type=int, default=3)
+    parser.add_argument("--nav-ratio", help="Доля навигационных форм (без ItemProperty1)", type=float, default=0.2)
+    parser.add_argument("--local-copies", help="Копий библиотечных SHA в папке <display>_files", type=int, default=2)
+    parser.add_argument("--seed", help="Зерно генератора случайных чисел", type=int, default=42)
+    args = parser.parse_args()
+
+    encodings = [e.strip() for e in args.encodings.split(",") if e.strip()]
+    unknown = set(encodings) - set(ENCODINGS)
+    if unknown:
+        parser.error(f"Неподдерживаемые кодировки: {', '.join(sorted(unknown))}")
+    try:
+        generate(Path(args.out), args.displays, args.shapes, args.sha_files, encodings, args.depth,
+                 args.nav_ratio, args.local_copies, args.seed, args.force)
+    except FileExistsError as e:
+        parser.error(str(e))
@@ -1,24 +1,44 @@
 from __future__ import annotations
 import argparse
 import concurrent.futures
+import functools
+import hashlib
 import json
 import logging
 import os
 import re
-from dataclasses import dataclass, field
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Any, Tuple, Union
 
 from bs4 import BeautifulSoup
 
 try:
-    import lxml
+    from lxml import etree as lxml_etree, html as lxml_html
     DEFAULT_PARSER = "lxml"
+    DEFAULT_BACKEND = "lxml"
 except Exception:
+    lxml_etree = lxml_html = None
     DEFAULT_PARSER = "html.parser"
+    DEFAULT_BACKEND = "bs4"
+
+# Движки разбора: lxml — XPath/обход только нужных узлов, bs4 — полное дерево BeautifulSoup (запасной)
+BACKENDS = ("lxml", "bs4")
 
 import openpyxl
 
+try:
+    # Необязательная зависимость: уведомления ФС для --watch (иначе — периодический опрос)
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except Exception:
+    FileSystemEventHandler = object
+    Observer = None
+
 # --- Настройка логирования ---
 logging.basicConfig(
     level=logging.INFO,
@@ -27,18 +47,145 @@ logging.basicConfig(
 
 
 # ---------- Структуры данных ----------
+# Кортежи ключей hdxproperties/parameters общие для всех элементов с одинаковым набором ключей
+_KEY_TUPLES: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _intern(value: Any) -> Any:
+    """Интернирует строку (повторяющиеся классы, SRC, имена и значения ключей хранятся в одном экземпляре)."""
+    return sys.intern(str(value)) if isinstance(value, str) else value
+
+
+def _intern_keys(keys: Iterable[str]) -> Tuple[str, ...]:
+    keys = tuple(map(_intern, keys))
+    return _KEY_TUPLES.setdefault(keys, keys)
+
+
 @dataclass
 class HMIElement:
-    """Одна запись элемента, найденного в HTM (до объединения с SHA)."""
+    """
+    Одна запись элемента, найденного в HTM (до объединения с SHA).
+    Компактное представление: __slots__ вместо __dict__, разобранные hdxproperties/parameters хранятся
+    парами кортежей (ключи общие для элементов с тем же набором, строки интернированы).
+    Исходная строка атрибута хранится, если восстановление из разобранных пар её не воспроизводит (пробелы,
+    повторы ключей, ключи без значения и т.п.) или при keep_raw; иначе (обычный случай) она восстанавливается из пар.
+    """
+    __slots__ = ("htm_file", "element_id", "element_class", "src", "link_type",
+                 "hdx_keys", "hdx_values", "param_keys", "param_types", "param_values", "hdx_raw", "params_raw")
+
     htm_file: Path
     element_id: str
     element_class: str
     src: str  # как указано в HTM (относительный/абсолютный)
     link_type: str
-    hdxproperties_raw: str
-    parameters_raw: str
-    hdx_parsed: Dict[str, str] = field(default_factory=dict)
-    parameters_parsed: Dict[str, str] = field(default_factory=dict)
+    hdx_keys: Tuple[str, ...]
+    hdx_values: Tuple[str, ...]
+    param_keys: Tuple[str, ...]
+    param_types: Tuple[str, ...]  # префиксы 'Type?' параметров (для восстановления атрибута)
+    param_values: Tuple[str, ...]
+    hdx_raw: Optional[str]  # исходный атрибут hdxproperties (None — совпадает с восстановленным)
+    params_raw: Optional[str]  # исходный атрибут parameters (None — совпадает с восстановленным)
+
+    @classmethod
+    def create(cls, htm_file: Path, element_id: str, element_class: str, src: str, link_type: str,
+               hdx_parsed: Dict[str, str], parameters_parsed: Dict[str, str], parameter_types: Dict[str, str],
+               hdx_raw: Optional[str] = None, params_raw: Optional[str] = None,
+               keep_raw: bool = False) -> "HMIElement":
+        """
+        Создаёт элемент из разобранных словарей, интернируя строки.
+        Исходные строки отбрасываются, если совпадают с восстановленными из пар (кроме keep_raw).
+        """
+        element = cls(htm_file, _intern(element_id), _intern(element_class), _intern(src), _intern(link_type),
+                      _intern_keys(hdx_parsed), tuple(map(_intern, hdx_parsed.values())),
+                      _intern_keys(parameters_parsed), _intern_keys(parameter_types.values()),
+                      tuple(map(_intern, parameters_parsed.values())), _intern(hdx_raw), _intern(params_raw))
+        if not keep_raw:
+            if element.hdx_raw == element._rebuild_hdxproperties():
+                element.hdx_raw = None
+            if element.params_raw == element._rebuild_parameters():
+                element.params_raw = None
+        return element
+
+    @property
+    def hdx_parsed(self) -> Dict[str, str]:
+        return dict(zip(self.hdx_keys, self.hdx_values))
+
+    @property
+    def parameters_parsed(self) -> Dict[str, str]:
+        return dict(zip(self.param_keys, self.param_values))
+
+    def _rebuild_hdxproperties(self) -> str:
+        return "".join(f"{k}:{v};" for k, v in zip(self.hdx_keys, self.hdx_values))
+
+    def _rebuild_parameters(self) -> str:
+        return ";".join(f"{t}?{k}:{v}" if t else f"{k}:{v}"
+                        for t, k, v in zip(self.param_types, self.param_keys, self.param_values))
+
+    @property
+    def hdxproperties_raw(self) -> str:
+        """Атрибут hdxproperties: исходный или восстановленный из разобранных пар."""
+        return self.hdx_raw if self.hdx_raw is not None else self._rebuild_hdxproperties()
+
+    @property
+    def parameters_raw(self) -> str:
+        """Атрибут parameters: исходный или восстановленный из разобранных пар."""
+        return self.params_raw if self.params_raw is not None else self._rebuild_parameters()
+
+    def has_param(self, key: str) -> bool:
+        return key in self.param_keys
+
+    def to_compact(self) -> Tuple[Any, ...]:
+        """Компактный кортеж без htm_file — для передачи из процесса-воркера."""
+        return (self.element_id, self.element_class, self.src, self.link_type,
+                self.hdx_keys, self.hdx_values, self.param_keys, self.param_types, self.param_values,
+                self.hdx_raw, self.params_raw)
+
+    @classmethod
+    def from_compact(cls, htm_file: Path, data: Tuple[Any, ...]) -> "HMIElement":
+        """Восстанавливает элемент из кортежа to_compact() (строки интернируются заново в этом процессе)."""
+        (element_id, element_class, src, link_type,
+         hdx_keys, hdx_values, param_keys, param_types, param_values, hdx_raw, params_raw) = data
+        return cls(htm_file, _intern(element_id), _intern(element_class), _intern(src), _intern(link_type),
+                   _intern_keys(hdx_keys), tuple(map(_intern, hdx_values)),
+                   _intern_keys(param_keys), _intern_keys(param_types), tuple(map(_intern, param_values)),
+                   hdx_raw, params_raw)
+
+
+@dataclass
+class HTMDisplay:
+    """
+    Результат однократного разбора HTM: метаданные страницы (для General_Info)
+    и список найденных элементов. Файл читается и разбирается ровно один раз.
+    """
+    htm_file: Path
+    title: str = ""
+    hmi_template: str = ""
+    dims: str = ""
+    bg_color: str = "white"
+    readable: bool = True  # False, если файл не удалось прочитать/разобрать
+    elements: List[HMIElement] = field(default_factory=list)
+
+    def general_info_row(self) -> Dict[str, Any]:
+        """Строка листа General_Info."""
+        return {
+            "Файл": str(self.htm_file.name),
+            "Заголовок Мнемосхемы": self.title,
+            "HMIWeb Template": self.hmi_template,
+            "Размеры Фона (Width x Height)": self.dims,
+            "Цвет Фона": self.bg_color
+        }
+
+    def to_compact(self) -> Tuple[Any, ...]:
+        """Компактный кортеж без путей — для передачи из процесса-воркера."""
+        return (self.title, self.hmi_template, self.dims, self.bg_color, self.readable,
+                [el.to_compact() for el in self.elements])
+
+    @classmethod
+    def from_compact(cls, htm_file: Path, data: Tuple[Any, ...]) -> "HTMDisplay":
+        """Восстанавливает запись из кортежа to_compact()."""
+        title, hmi_template, dims, bg_color, readable, compact_elements = data
+        return cls(htm_file, title, hmi_template, dims, bg_color, readable,
+                   [HMIElement.from_compact(htm_file, el) for el in compact_elements])
 
 
 @dataclass
@@ -51,6 +198,8 @@ class SHAMetadata:
     height: Optional[str] = None
     parameters_list: List[Dict[str, str]] = field(default_factory=list)
     scripts_list: List[Dict[str, Any]] = field(default_factory=list)
+    # Другие SHA проекта с побайтно тем же содержимым (заполняется при разборе проекта)
+    duplicates: List[str] = field(default_factory=list)
 
     def to_flat_dict(self) -> Dict[str, Any]:
         """Возвращает сплющенную репрезентацию для записи в таблицу."""
@@ -63,8 +212,18 @@ class SHAMetadata:
             "Параметры (Count)": len(self.parameters_list),
             "Параметры (Name, Type, Default)": json.dumps(self.parameters_list, ensure_ascii=False),
             "Скрипты (Count)": len(self.scripts_list),
+            "Дубликаты": "; ".join(self.duplicates),
         }
 
+    def to_compact(self) -> Tuple[Any, ...]:
+        """Компактный кортеж без abs_path и duplicates — для кэша."""
+        return (self.title, self.description, self.width, self.height, self.parameters_list, self.scripts_list)
+
+    @classmethod
+    def from_compact(cls, abs_path: Path, data: Tuple[Any, ...]) -> "SHAMetadata":
+        """Восстанавливает метаданные из кортежа to_compact()."""
+        return cls(abs_path, *data)
+
 
 # ---------- Утилиты парсинга атрибутов ----------
 def parse_hdxproperties(hdx_str: Optional[str]) -> Dict[str, str]:
@@ -87,45 +246,53 @@ def parse_parameters_attribute(parameters_str: Optional[str]) -> Dict[str, str]:
     Разбирает атрибут parameters формата 'Type?Key:Value;...' и возвращает {Key: Value}.
     Обрабатывает нестандартные случаи аккуратно.
     """
+    return parse_parameters_typed(parameters_str)[0]
+
+
+def parse_parameters_typed(parameters_str: Optional[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """То же, что parse_parameters_attribute, плюс {Key: Type} — префиксы 'Type?' (пустые, если их нет)."""
     result: Dict[str, str] = {}
+    types: Dict[str, str] = {}
     if not parameters_str:
-        return result
+        return result, types
     # разделяем по ';'
     for item in filter(None, parameters_str.split(';')):
         # пробуем найти последний разделитель ':' который отделяет ключ от значения
         if ':' in item:
             left, right = item.rsplit(':', 1)
-            # ключ может быть вида "Type?Key" — берем часть после '?'
-            if '?' in left:
-                _, key = left.split('?', 1)
-            else:
-                key = left
-            key = key.strip()
             value = right.strip()
-            if key:
-                result[key] = value
         else:
             # Если нет ':', возможно вид "Key" или "Type?Key" - ставим пустое значение
-            if '?' in item:
-                _, key = item.split('?', 1)
-            else:
-                key = item
-            key = key.strip()
-            if key:
-                result[key] = ""
-    return result
+            left, value = item, ""
+        # ключ может быть вида "Type?Key" — берем часть после '?'
+        if '?' in left:
+            param_type, key = left.split('?', 1)
+        else:
+            param_type, key = "", left
+        key = key.strip()
+        if key:
+            result[key] = value
+            types[key] = param_type
+    return result, types
 
 
 # ---------- Парсер SHA ----------
+_XML_DECLARATION_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+
 class SHAParser:
     """
     Класс для разбора SHА-файлов (.sha) с возможностью параллельного запуска.
     Разбирает XML-подобный файл и собирает Title, Description, Width, Height,
     список параметров и список скриптов.
+    Движок lxml разбирает строгим XML-парсером, при ошибке — запасной BeautifulSoup.
+    Текст скриптов (CodeSnippet) в отчёт не попадает и сохраняется только при keep_raw.
     """
 
-    def __init__(self, parser: str = DEFAULT_PARSER):
+    def __init__(self, parser: str = DEFAULT_PARSER, backend: str = DEFAULT_BACKEND, keep_raw: bool = False):
         self.parser = parser
+        self.backend = backend
+        self.keep_raw = keep_raw
 
     @staticmethod
     def _read_with_fallback(path: Path) -> Optional[str]:
@@ -148,6 +315,71 @@ class SHAParser:
         if content is None:
             return None
 
+        if self.backend == "lxml" and lxml_etree is not None:
+            try:
+                return self._parse_lxml(sha_abs_path, content)
+            except Exception as exc:
+                # Не строго корректный XML — разбираем терпимым BeautifulSoup
+                logging.debug("lxml не разобрал SHA %s (%s), используется BeautifulSoup", sha_abs_path, exc)
+        return self._parse_bs4(sha_abs_path, content)
+
+    def _make_meta(self, sha_abs_path: Path, title, description, width, height,
+                   parameters_list: List[Dict[str, str]], scripts_list: List[Dict[str, Any]]) -> SHAMetadata:
+        # Типы параметров, языки и события скриптов повторяются — храним по одному экземпляру строки
+        parameters_list = [{k: _intern(v) for k, v in param.items()} for param in parameters_list]
+        scripts_list = [{k: _intern(v) for k, v in script.items() if k != "CodeSnippet" or self.keep_raw}
+                        for script in scripts_list]
+        meta = SHAMetadata(
+            abs_path=sha_abs_path,
+            title=title,
+            description=description,
+            width=str(width).replace("px", "") if width else "",
+            height=str(height).replace("px", "") if height else "",
+            parameters_list=parameters_list,
+            scripts_list=scripts_list
+        )
+        logging.debug("Parsed SHA %s (params=%d scripts=%d)", sha_abs_path, len(parameters_list), len(scripts_list))
+        return meta
+
+    def _parse_lxml(self, sha_abs_path: Path, content: str) -> SHAMetadata:
+        """
+        Быстрый разбор строгим lxml.etree: обходятся только узлы parameter/script внутри shapefile.
+        Исключение (некорректный XML) означает переход на BeautifulSoup.
+        """
+        # lxml не принимает str с объявлением кодировки — текст уже декодирован, объявление лишнее
+        root = lxml_etree.fromstring(_XML_DECLARATION_RE.sub("", content, count=1))
+        shapefile = None
+        for node in root.iter(lxml_etree.Element):
+            if node.tag.lower() == "shapefile":
+                shapefile = node
+                break
+        if shapefile is None:
+            logging.warning("Формат SHА не содержит <shapefile>: %s", sha_abs_path)
+            return SHAMetadata(abs_path=sha_abs_path)
+
+        parameters_list = [{
+            "Name": param.get("name", ""),
+            "Type": param.get("type", ""),
+            "Description": param.get("description", ""),
+            "DefaultValue": param.get("defaultvalue", "")
+        } for param in shapefile.iter("parameter")]
+
+        scripts_list = []
+        for script in shapefile.iter("script"):
+            text = "".join(script.itertext())
+            scripts_list.append({
+                "ID": script.get("id", "N/A"),
+                "Language": script.get("language", "N/A"),
+                "Event": script.get("event", "N/A"),
+                "HasCode": bool(text.strip()),
+                "CodeSnippet": text.strip()
+            })
+
+        return self._make_meta(sha_abs_path, shapefile.get("title", "") or "", shapefile.get("description", "") or "",
+                               shapefile.get("width", ""), shapefile.get("height", ""), parameters_list, scripts_list)
+
+    def _parse_bs4(self, sha_abs_path: Path, content: str) -> SHAMetadata:
+        """Разбор через BeautifulSoup (xml) — медленнее, но терпим к некорректной разметке."""
         try:
             soup = BeautifulSoup(content, "xml")
             shapefile = soup.find("shapefile")
@@ -186,17 +418,7 @@ class SHAParser:
                     "CodeSnippet": (script.text or "").strip()
                 })
 
-            meta = SHAMetadata(
-                abs_path=sha_abs_path,
-                title=title,
-                description=description,
-                width=str(width).replace("px", "") if width else "",
-                height=str(height).replace("px", "") if height else "",
-                parameters_list=parameters_list,
-                scripts_list=scripts_list
-            )
-            logging.debug("Parsed SHA %s (params=%d scripts=%d)", sha_abs_path, len(parameters_list), len(scripts_list))
-            return meta
+            return self._make_meta(sha_abs_path, title, description, width, height, parameters_list, scripts_list)
         except Exception as exc:
             logging.exception("Ошибка парсинга SHА %s: %s", sha_abs_path, exc)
             return SHAMetadata(abs_path=sha_abs_path)
@@ -205,15 +427,119 @@ class SHAParser:
 # ---------- Парсер HTM ----------
 class HTMParser:
     """
-    Разбирает один HTM-файл, находит элементы hsc.shape.1 и собирает список HMIElement.
+    Разбирает один HTM-файл: находит элементы hsc.shape.1 (список HMIElement)
+    и за тот же проход извлекает title, HMIWebTemplate и стиль body.
+    Движок lxml выбирает XPath только div/object с нужным классом, не строя дерево BeautifulSoup;
+    при ошибке lxml файл разбирается запасным BeautifulSoup.
     """
 
-    def __init__(self, parser: str = DEFAULT_PARSER):
+    # div/object, у которых class содержит 'hsc.shape.1' (в порядке документа)
+    _SHAPE_XPATH = "//div[contains(@class, 'hsc.shape.1')] | //object[contains(@class, 'hsc.shape.1')]"
+
+    def __init__(self, parser: str = DEFAULT_PARSER, backend: str = DEFAULT_BACKEND, keep_raw: bool = False):
         self.parser = parser
+        self.backend = backend
+        # Хранить исходные строки hdxproperties/parameters всегда (иначе — только если восстановление из
+        # разобранных пар их не воспроизводит)
+        self.keep_raw = keep_raw
+
+    @staticmethod
+    def _fill_page_info(display: HTMDisplay, title: Optional[str], hmi_template: str, style: str):
+        """Заполняет метаданные страницы: title, meta HMIWebTemplateDescription, body style."""
+        display.title = title.strip() if title is not None else display.htm_file.name
+        display.hmi_template = hmi_template
+        width_m = re.search(r"width:\s*(\d+)px", style)
+        height_m = re.search(r"height:\s*(\d+)px", style)
+        bg_m = re.search(r"background-color:\s*([^;]+)", style)
+        if width_m and height_m:
+            display.dims = f"{width_m.group(1)}x{height_m.group(1)}"
+        display.bg_color = bg_m.group(1).strip() if bg_m else "white"
+
+    def _make_element(self, htm_path: Path, el_id: str, el_class: str, src: str, link_type: str,
+                      hdx_raw: str, params_raw: str) -> HMIElement:
+        parameters_parsed, parameter_types = parse_parameters_typed(params_raw)
+        return HMIElement.create(
+            htm_file=htm_path,
+            element_id=el_id,
+            element_class=str(el_class),
+            src=str(src),
+            link_type=str(link_type),
+            hdx_parsed=parse_hdxproperties(hdx_raw),
+            parameters_parsed=parameters_parsed,
+            parameter_types=parameter_types,
+            hdx_raw=hdx_raw,
+            params_raw=params_raw,
+            keep_raw=self.keep_raw
+        )
+
+    def _parse_lxml(self, raw: str, display: HTMDisplay) -> List[HMIElement]:
+        """Быстрый разбор lxml.html + XPath."""
+        doc = lxml_html.document_fromstring(_XML_DECLARATION_RE.sub("", raw, count=1))
+        try:
+            title_tag = doc.find(".//title")
+            meta = doc.xpath("//meta[@name='HMIWebTemplateDescription']")
+            body = doc.find(".//body")
+            self._fill_page_info(display,
+                                 title_tag.text_content() if title_tag is not None else None,
+                                 meta[0].get("content", "") if meta else "",
+                                 (body.get("style", "") if body is not None else "") or "")
+        except Exception:
+            logging.exception("Ошибка при извлечении General_Info из %s", display.htm_file)
+            display.readable = False
+
+        result: List[HMIElement] = []
+        for el in doc.xpath(self._SHAPE_XPATH):
+            # Берём последнее значение class
+            classes = el.get("class", "").split()
+            result.append(self._make_element(
+                display.htm_file,
+                el.get("id", "N/A"),
+                classes[-1] if classes else "N/A",
+                el.get("src", "N/A"),
+                el.get("linktype", "N/A"),
+                el.get("hdxproperties", "") or "",
+                el.get("parameters", "") or "",
+            ))
+        return result
+
+    def _parse_bs4(self, raw: str, display: HTMDisplay) -> List[HMIElement]:
+        """Разбор полным деревом BeautifulSoup (запасной вариант)."""
+        soup = BeautifulSoup(raw, self.parser)
+        try:
+            title_tag = soup.find("title")
+            hmi_template_tag = soup.find("meta", {"name": "HMIWebTemplateDescription"})
+            body = soup.find("body")
+            self._fill_page_info(display,
+                                 title_tag.text if title_tag else None,
+                                 hmi_template_tag.get("content", "") if hmi_template_tag else "",
+                                 body.get("style", "") if body else "")
+        except Exception:
+            logging.exception("Ошибка при извлечении General_Info из %s", display.htm_file)
+            display.readable = False
+
+        # Ищем все объекты/дивы с классом содержащим 'hsc.shape.1'
+        elements = soup.find_all(lambda tag: tag.name in ("div", "object") and tag.has_attr("class") and "hsc.shape.1" in " ".join(tag.get("class", [])))
+
+        result: List[HMIElement] = []
+        for el in elements:
+            # Берём последнее значение class
+            el_class_attr = el.get("class", [])
+            el_class = el_class_attr[-1] if isinstance(el_class_attr, (list, tuple)) and el_class_attr else (el.get("class") or "N/A")
+            result.append(self._make_element(
+                display.htm_file,
+                el.get("id", "N/A"),
+                el_class,
+                el.get("src", "N/A"),
+                el.get("linktype", "N/A"),
+                el.get("hdxproperties", "") or "",
+                el.get("parameters", "") or "",
+            ))
+        return result
 
-    def parse(self, htm_path: Path) -> List[HMIElement]:
-        """Парсит HTM и возвращает список HMIElement."""
+    def parse(self, htm_path: Path) -> HTMDisplay:
+        """Парсит HTM и возвращает HTMDisplay (элементы + метаданные страницы)."""
         logging.info("Парсинг HTM: %s", htm_path)
+        display = HTMDisplay(htm_file=htm_path)
         try:
             # Попытки открыть с разными кодировками
             raw = None
@@ -225,43 +551,173 @@ class HTMParser:
                     continue
             if raw is None:
                 logging.error("Не удалось прочитать HTM %s", htm_path)
-                return []
-
-            soup = BeautifulSoup(raw, self.parser)
-
-            # Ищем все объекты/дивы с классом содержащим 'hsc.shape.1'
-            elements = soup.find_all(lambda tag: tag.name in ("div", "object") and tag.has_attr("class") and "hsc.shape.1" in " ".join(tag.get("class", [])))
-
-            result: List[HMIElement] = []
-            for el in elements:
-                el_id = el.get("id", "N/A")
-                # Берём последнее значение class
-                el_class_attr = el.get("class", [])
-                el_class = el_class_attr[-1] if isinstance(el_class_attr, (list, tuple)) and el_class_attr else (el.get("class") or "N/A")
-                src = el.get("src", "N/A")
-                link_type = el.get("linktype", "N/A")
-                hdx_raw = el.get("hdxproperties", "") or ""
-                params_raw = el.get("parameters", "") or ""
-
-                parsed_hdx = parse_hdxproperties(hdx_raw)
-                parsed_params = parse_parameters_attribute(params_raw)
-
-                result.append(HMIElement(
-                    htm_file=htm_path,
-                    element_id=el_id,
-                    element_class=str(el_class),
-                    src=str(src),
-                    link_type=str(link_type),
-                    hdxproperties_raw=hdx_raw,
-                    parameters_raw=params_raw,
-                    hdx_parsed=parsed_hdx,
-                    parameters_parsed=parsed_params
-                ))
+                display.readable = False
+                return display
+
+            result = None
+            if self.backend == "lxml" and lxml_html is not None:
+                try:
+                    result = self._parse_lxml(raw, display)
+                except Exception as exc:
+                    logging.debug("lxml не разобрал HTM %s (%s), используется BeautifulSoup", htm_path, exc)
+                    display = HTMDisplay(htm_file=htm_path)
+            if result is None:
+                result = self._parse_bs4(raw, display)
+
             logging.info("  Найдено элементов: %d", len(result))
-            return result
+            display.elements = result
+            return display
         except Exception as e:
             logging.exception("Ошибка при парсинге HTM %s: %s", htm_path, e)
-            return []
+            display.readable = False
+            return display
+
+
+# ---------- Параллельный разбор ----------
+EXECUTOR_KINDS = ("process", "thread")
+
+
+def make_executor(kind: str, max_workers: int) -> concurrent.futures.Executor:
+    """Создаёт пул процессов или потоков по имени ('process' | 'thread')."""
+    if kind == "process":
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    if kind == "thread":
+        return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    raise ValueError(f"Неизвестный тип пула: {kind!r} (ожидается одно из {EXECUTOR_KINDS})")
+
+
+def parallel_map(func, items: List[Any], kind: str, max_workers: int) -> List[Any]:
+    """
+    Применяет func ко всем items и возвращает результаты в порядке items.
+    При max_workers <= 1 или одном элементе работает последовательно (без накладных расходов пула).
+    """
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    # Крупные пакеты снижают накладные расходы на pickle при тысячах мелких файлов
+    chunksize = max(1, len(items) // (max_workers * 4)) if kind == "process" else 1
+    with make_executor(kind, max_workers) as pool:
+        return list(pool.map(func, items, chunksize=chunksize))
+
+
+def _parse_htm_worker(task: Tuple[str, str, str, bool]) -> Tuple[str, Tuple[Any, ...]]:
+    """Воркер: разбирает один HTM и возвращает (путь, компактный HTMDisplay)."""
+    htm_path_str, parser_name, backend, keep_raw = task
+    return htm_path_str, HTMParser(parser_name, backend, keep_raw).parse(Path(htm_path_str)).to_compact()
+
+
+def _parse_sha_worker(task: Tuple[str, str, str, bool]) -> Tuple[str, Optional[SHAMetadata]]:
+    """Воркер: разбирает один SHA (файл может отсутствовать на диске)."""
+    sha_path_str, parser_name, backend, keep_raw = task
+    sha_path = Path(sha_path_str)
+    if not sha_path.exists():
+        logging.warning("Ссылка на SHA отсутствует на диске: %s", sha_path)
+        return sha_path_str, None
+    return sha_path_str, SHAParser(parser_name, backend, keep_raw).parse(sha_path)
+
+
+# ---------- Кэш результатов разбора ----------
+def file_digest(path: Path) -> str:
+    """SHA-1 содержимого файла (для проверки изменений и поиска дубликатов)."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """
+    Персистентный кэш разобранных HTM/SHA в SQLite (обычно рядом с выходным XLSX).
+    Ключ — (вид, путь), запись актуальна при совпадении размера и mtime файла.
+    С use_hash=True при изменившемся mtime (копирование, checkout) дополнительно сравнивается
+    SHA-1 содержимого: если он совпал, запись считается актуальной.
+    """
+
+    SCHEMA_VERSION = "3"
+
+    def __init__(self, db_path: Path, use_hash: bool = False):
+        self.db_path = db_path
+        self.use_hash = use_hash
+        self.hits = 0
+        self.misses = 0
+        # Состояние файла на момент промаха: put() сохраняет именно его,
+        # чтобы правка файла во время разбора не закэшировала устаревший результат
+        self._pending: Dict[Tuple[str, str], Tuple[int, int, Optional[str]]] = {}
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " kind TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " digest TEXT, payload TEXT NOT NULL, PRIMARY KEY (kind, path))"
+        )
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != self.SCHEMA_VERSION:
+            # Формат записей изменился — старые данные непригодны
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (self.SCHEMA_VERSION,))
+        self.conn.commit()
+
+    def get(self, kind: str, path: Path) -> Optional[Any]:
+        """Возвращает сохранённый компактный результат или None, если файл изменился/не найден."""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        key = (kind, str(path))
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, digest, payload FROM entries WHERE kind = ? AND path = ?", key
+        ).fetchone()
+        digest = None
+        if row is not None and row[0] == st.st_size:
+            if row[1] == st.st_mtime_ns:
+                self.hits += 1
+                return json.loads(row[3])
+            if self.use_hash and row[2]:
+                digest = file_digest(path)
+                if digest == row[2]:
+                    self.conn.execute("UPDATE entries SET mtime_ns = ? WHERE kind = ? AND path = ?",
+                                      (st.st_mtime_ns, *key))
+                    self.hits += 1
+                    return json.loads(row[3])
+        if self.use_hash and digest is None:
+            digest = file_digest(path)
+        self.misses += 1
+        self._pending[key] = (st.st_size, st.st_mtime_ns, digest)
+        return None
+
+    def put(self, kind: str, path: Path, payload: Any):
+        """Сохраняет компактный результат разбора (после промаха get())."""
+        key = (kind, str(path))
+        state = self._pending.pop(key, None)
+        if state is None:
+            try:
+                st = path.stat()
+            except OSError:
+                return
+            state = (st.st_size, st.st_mtime_ns, file_digest(path) if self.use_hash else None)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (kind, path, size, mtime_ns, digest, payload) VALUES (?, ?, ?, ?, ?, ?)",
+            (*key, *state, json.dumps(payload, ensure_ascii=False))
+        )
+
+    def delete(self, kind: str, path: Path):
+        """Удаляет запись о файле."""
+        self.conn.execute("DELETE FROM entries WHERE kind = ? AND path = ?", (kind, str(path)))
+
+    def prune(self, kind: str, keep_paths: Set[Path]):
+        """Удаляет записи о файлах, которых больше нет в проекте."""
+        keep = {str(p) for p in keep_paths}
+        stale = [(kind, p) for (p,) in self.conn.execute("SELECT path FROM entries WHERE kind = ?", (kind,))
+                 if p not in keep]
+        self.conn.executemany("DELETE FROM entries WHERE kind = ? AND path = ?", stale)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        total = self.hits + self.misses
+        if total:
+            logging.info("Кэш %s: попаданий %d из %d (%.0f%%)", self.db_path, self.hits, total,
+                         100.0 * self.hits / total)
 
 
 # ---------- Сканер проекта ----------
@@ -270,53 +726,278 @@ class ProjectScanner:
     Сканирует корневую папку и находит HTM-файлы.
     Для каждого HTM собирает элементы и формирует список абсолютных путей SHA,
     разрешая относительные SRC относительно папки HTM.
+    HTM разбираются пулом процессов или потоков (executor), порядок результатов детерминирован.
     """
 
-    def __init__(self, root_dir: Path, htm_parser: HTMParser):
+    def __init__(self, root_dir: Path, htm_parser: HTMParser, max_workers: int = 1, executor: str = "process",
+                 cache: Optional[ParseCache] = None):
         self.root_dir = root_dir
         self.htm_parser = htm_parser
+        self.max_workers = max_workers
+        self.executor = executor
+        self.cache = cache
+        # (size, mtime_ns, sha1) уже хэшированных SHA — повторный parse_shas не перечитывает неизменившиеся файлы
+        self._sha_digests: Dict[Path, Tuple[int, int, str]] = {}
 
     def find_htm_files(self) -> List[Path]:
-        """Рекурсивно ищем .htm и .html файлы."""
-        found = list(self.root_dir.rglob("*.htm")) + list(self.root_dir.rglob("*.html"))
+        """Рекурсивно ищем .htm и .html файлы (в отсортированном порядке)."""
+        found = sorted(set(self.root_dir.rglob("*.htm")) | set(self.root_dir.rglob("*.html")))
         logging.info("Найдено HTM файлов в %s: %d", self.root_dir, len(found))
         return found
 
-    def collect_elements_and_shas(self) -> (Dict[Path, List[HMIElement]], Dict[Path, Set[Path]]):
+    @property
+    def htm_cache_kind(self) -> str:
+        """Вид записей кэша HTM: результат разбора зависит от парсера, движка и сохранения сырых атрибутов."""
+        return f"htm:{self.htm_parser.parser}:{self.htm_parser.backend}{':raw' if self.htm_parser.keep_raw else ''}"
+
+    def parse_all(self, htm_files: List[Path], prune: bool = True) -> Dict[Path, HTMDisplay]:
+        """
+        Разбирает HTM-файлы (параллельно при max_workers > 1) с сохранением порядка htm_files.
+        Неизменившиеся файлы берутся из кэша, если он подключён.
+        prune=False — htm_files лишь часть проекта (инкрементальный разбор), кэш не очищается.
+        """
+        kind = self.htm_cache_kind
+        displays: Dict[Path, HTMDisplay] = {}
+        todo: List[Path] = []
+        for htm in htm_files:
+            cached = self.cache.get(kind, htm) if self.cache else None
+            if cached is not None:
+                displays[htm] = HTMDisplay.from_compact(htm, cached)
+            else:
+                todo.append(htm)
+
+        tasks = [(str(htm), self.htm_parser.parser, self.htm_parser.backend, self.htm_parser.keep_raw)
+                 for htm in todo]
+        for htm_str, data in parallel_map(_parse_htm_worker, tasks, self.executor, self.max_workers):
+            htm = Path(htm_str)
+            displays[htm] = HTMDisplay.from_compact(htm, data)
+            # Нечитаемые файлы не кэшируем — ошибка может быть временной
+            if self.cache and displays[htm].readable:
+                self.cache.put(kind, htm, data)
+
+        if self.cache and prune:
+            self.cache.prune(kind, set(htm_files))
+        return {htm: displays[htm] for htm in htm_files}
+
+    def parse_shas(self, sha_paths: List[Path], sha_parser: SHAParser) -> Dict[Path, Optional[SHAMetadata]]:
+        """
+        Разбирает SHA-файлы тем же типом пула (с учётом кэша); результат упорядочен как sha_paths.
+        Сначала содержимое всех SHA хэшируется: побайтно одинаковые копии разбираются один раз,
+        результат раздаётся всем путям, а в duplicates каждого пути записываются остальные копии.
+        """
+        metas: Dict[Path, Optional[SHAMetadata]] = {}
+        groups: Dict[str, List[Path]] = {}
+        for p in sha_paths:
+            try:
+                digest = self._sha_digest(p)
+            except OSError:
+                logging.warning("Ссылка на SHA отсутствует на диске: %s", p)
+                metas[p] = None
+                continue
+            groups.setdefault(digest, []).append(p)
+        logging.info("SHA-файлов: %d, различных по содержимому: %d", len(sha_paths) - len(metas), len(groups))
+
+        parsed = self._parse_sha_files([group[0] for group in groups.values()], sha_parser)
+        for group in groups.values():
+            meta = parsed[group[0]]
+            for p in group:
+                if meta is None:
+                    metas[p] = None
+                elif len(group) == 1:
+                    metas[p] = meta
+                else:
+                    metas[p] = replace(meta, abs_path=p, duplicates=[str(other) for other in group if other != p])
+        return {p: metas[p] for p in sha_paths}
+
+    def _sha_digest(self, path: Path) -> str:
+        """SHA-1 содержимого SHA; при неизменных размере и mtime берётся из памяти."""
+        st = path.stat()
+        known = self._sha_digests.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        digest = file_digest(path)
+        self._sha_digests[path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def _parse_sha_files(self, sha_paths: List[Path], sha_parser: SHAParser) -> Dict[Path, Optional[SHAMetadata]]:
+        """Разбирает SHA-файлы пулом, неизменившиеся берутся из кэша."""
+        kind = f"sha:{sha_parser.parser}:{sha_parser.backend}{':raw' if sha_parser.keep_raw else ''}"
+        metas: Dict[Path, Optional[SHAMetadata]] = {}
+        todo: List[Path] = []
+        for p in sha_paths:
+            cached = self.cache.get(kind, p) if self.cache else None
+            if cached is not None:
+                metas[p] = SHAMetadata.from_compact(p, cached)
+            else:
+                todo.append(p)
+
+        tasks = [(str(p), sha_parser.parser, sha_parser.backend, sha_parser.keep_raw) for p in todo]
+        for p_str, meta in parallel_map(_parse_sha_worker, tasks, self.executor, self.max_workers):
+            p = Path(p_str)
+            metas[p] = meta
+            if self.cache and meta is not None:
+                self.cache.put(kind, p, meta.to_compact())
+
+        if self.cache:
+            self.cache.prune(kind, set(sha_paths))
+        return metas
+
+    @staticmethod
+    def sha_refs(htm: Path, elements: List[HMIElement]) -> Set[Path]:
+        """Абсолютные пути SHA, на которые ссылаются элементы HTM."""
+        sha_paths: Set[Path] = set()
+        htm_dir = htm.parent
+        for el in elements:
+            src = el.src or ""
+            # Если src отсутствует или не .sha — пропускаем
+            if not src or not isinstance(src, str):
+                continue
+            # Некоторые src могут быть javascript вызовами или пустыми
+            src_clean = src.replace("\\", "/").strip().strip('"').strip("'")
+            if not src_clean:
+                continue
+            # Если src содержит data: или http(s): - пропускаем (не локальные sha)
+            if src_clean.startswith("data:") or re.match(r"^https?:/", src_clean, flags=re.I):
+                continue
+            # Нормализуем путь относительно папки HTM
+            sha_abs = (htm_dir / Path(src_clean)).resolve()
+            sha_paths.add(sha_abs)
+        return sha_paths
+
+    def collect_elements_and_shas(self) -> (Dict[Path, HTMDisplay], Dict[Path, Set[Path]]):
         """
         Возвращает:
-         - mapping_htm_to_elements: Map[htm_path -> List[HMIElement]]
+         - mapping_htm_to_display: Map[htm_path -> HTMDisplay] (элементы + метаданные страницы)
          - mapping_htm_to_sha_paths: Map[htm_path -> Set[absolute sha paths]]
         """
-        mapping_htm_to_elements: Dict[Path, List[HMIElement]] = {}
         mapping_htm_to_sha_paths: Dict[Path, Set[Path]] = {}
 
         htm_files = self.find_htm_files()
+        mapping_htm_to_display = self.parse_all(htm_files)
         for htm in htm_files:
-            elements = self.htm_parser.parse(htm)
-            mapping_htm_to_elements[htm] = elements
-            sha_paths: Set[Path] = set()
-            htm_dir = htm.parent
-
-            for el in elements:
-                src = el.src or ""
-                # Если src отсутствует или не .sha — пропускаем
-                if not src or not isinstance(src, str):
-                    continue
-                # Некоторые src могут быть javascript вызовами или пустыми
-                src_clean = src.replace("\\", "/").strip().strip('"').strip("'")
-                if not src_clean:
-                    continue
-                # Если src содержит data: или http(s): - пропускаем (не локальные sha)
-                if src_clean.startswith("data:") or re.match(r"^https?:/", src_clean, flags=re.I):
-                    continue
-                # Нормализуем путь относительно папки HTM
-                sha_abs = (htm_dir / Path(src_clean)).resolve()
-                sha_paths.add(sha_abs)
+            sha_paths = self.sha_refs(htm, mapping_htm_to_display[htm].elements)
             mapping_htm_to_sha_paths[htm] = sha_paths
             logging.info("  HTM %s -> ссылок на SHA: %d", htm.name, len(sha_paths))
 
-        return mapping_htm_to_elements, mapping_htm_to_sha_paths
+        return mapping_htm_to_display, mapping_htm_to_sha_paths
+
+
+@functools.lru_cache(maxsize=65536)
+def _resolve_sha(htm_dir: Path, src: str) -> Path:
+    # resolve() обращается к файловой системе, а пар (папка HTM, SRC) в проекте немного
+    return (htm_dir / src).resolve()
+
+
+def element_sha_path(htm_path: Path, el: HMIElement) -> Optional[Path]:
+    """Абсолютный путь SHA, на который ссылается элемент (None, если SRC не .sha)."""
+    src = el.src.strip()
+    if not (src and src.lower().endswith(".sha")):
+        return None
+    return _resolve_sha(htm_path.parent, src)
+
+
+# Источник строк листа: готовый список или функция, каждый вызов которой заново выдаёт строки
+RowSource = Union[List[Dict[str, Any]], Callable[[], Iterable[Dict[str, Any]]]]
+
+
+class ReportRows:
+    """
+    Ленивое формирование строк листов отчёта из разобранных HTM и SHA.
+    Каждый метод iter_* при вызове заново генерирует строки, не накапливая их в памяти.
+    """
+
+    def __init__(self, displays: Dict[Path, HTMDisplay], sha_meta_by_path: Dict[Path, Optional[SHAMetadata]]):
+        self.displays = displays
+        self.sha_meta_by_path = sha_meta_by_path
+        # Поля SHA одинаковы для всех ссылающихся на него элементов — формируем их один раз на SHA
+        self._sha_fields: Dict[Path, Dict[str, Any]] = {}
+
+    def iter_general_info(self) -> Iterator[Dict[str, Any]]:
+        """Общая информация (из HTM <title>, HMIWebTemplate, body style) — уже извлечена при разборе HTM."""
+        for display in self.displays.values():
+            if display.readable:
+                yield display.general_info_row()
+
+    def _add_sha_fields(self, row: Dict[str, Any], htm_path: Path, el: HMIElement):
+        """Добавляет поля SHA, на который ссылается элемент (пустые, если SHA отсутствует или не разобран)."""
+        sha_abs = element_sha_path(htm_path, el)
+        if sha_abs is None:
+            return
+        fields = self._sha_fields.get(sha_abs)
+        if fields is None:
+            sha_meta = self.sha_meta_by_path.get(sha_abs)
+            if sha_meta:
+                fields = {
+                    "Title": sha_meta.title,
+                    "Description": sha_meta.description,
+                    "Width": sha_meta.width or "",
+                    "Height": sha_meta.height or "",
+                    "Параметры (Count)": len(sha_meta.parameters_list),
+                    "Параметры (Name, Type, Default)": json.dumps(sha_meta.parameters_list, ensure_ascii=False),
+                    "Скрипты (Count)": len(sha_meta.scripts_list),
+                }
+            else:
+                fields = dict.fromkeys(("Title", "Description", "Width", "Height", "Параметры (Count)",
+                                        "Параметры (Name, Type, Default)", "Скрипты (Count)"), "")
+            self._sha_fields[sha_abs] = fields
+        row.update(fields)
+
+    @staticmethod
+    def _base_row(htm_path: Path, el: HMIElement) -> Dict[str, Any]:
+        """Базовые поля элемента + динамические hdx поля."""
+        base = {
+            "Файл": str(htm_path),  # полный путь, ExcelWriter может менять/обрабатывать
+            "ID": el.element_id,
+            "Тип Элемента (Class)": el.element_class,
+            "Источник Формы (SRC)": el.src,
+            "Link Type": el.link_type,
+            "hdxproperties": el.hdxproperties_raw,
+        }
+        for k, v in zip(el.hdx_keys, el.hdx_values):
+            base[f"hdxproperties - {k}"] = v
+        return base
+
+    def iter_hmi_rows(self) -> Iterator[Dict[str, Any]]:
+        """Строки HMI_Tags: элементы, среди параметров которых есть ItemProperty1."""
+        for htm_path, display in self.displays.items():
+            for el in display.elements:
+                if not el.has_param("ItemProperty1"):
+                    continue
+                params = el.parameters_parsed
+                row = self._base_row(htm_path, el)
+                # HMI_Tags: включаем статические поля ItemProperty1, Itemproperty2, Data Source, Сервер
+                row.update({
+                    "ItemProperty1": params.get("ItemProperty1", ""),
+                    "Itemproperty2": params.get("Itemproperty2", ""),
+                    "Data Source": params.get("Data Source", ""),
+                    "Сервер": params.get("Server Control", "")
+                })
+                self._add_sha_fields(row, htm_path, el)
+                yield row
+
+    def iter_nav_rows(self) -> Iterator[Dict[str, Any]]:
+        """Строки Navigation_Shapes: все остальные элементы."""
+        for htm_path, display in self.displays.items():
+            for el in display.elements:
+                if el.has_param("ItemProperty1"):
+                    continue
+                row = self._base_row(htm_path, el)
+                row["Параметры (Parameters)"] = el.parameters_raw
+                # добавляем parsed params prefixed
+                for k, v in zip(el.param_keys, el.param_values):
+                    row[f"Параметры - {k}"] = v
+                self._add_sha_fields(row, htm_path, el)
+                yield row
+
+    def iter_shape_defs(self) -> Iterator[Dict[str, Any]]:
+        """Shape_Definitions: словари, содержащие Shape_Flat и Scripts_Detail."""
+        for meta in self.sha_meta_by_path.values():
+            if meta is None:
+                continue
+            yield {
+                "Shape_Flat": meta.to_flat_dict(),
+                "Scripts_Detail": meta.scripts_list,
+            }
 
 
 class ExcelWriter:
@@ -327,6 +1008,8 @@ class ExcelWriter:
      - Navigation_Shapes
      - Shape_Definitions
     Заголовки формируются частично динамически (hdx keys, параметры).
+    Книга пишется в потоковом режиме openpyxl (write_only): строки сразу уходят на диск,
+    поэтому потребление памяти не зависит от размера проекта.
     """
 
     def __init__(self, output_path: Path):
@@ -345,80 +1028,80 @@ class ExcelWriter:
                 return str(v)
         return str(v)
 
+    @staticmethod
+    def _iter_rows(source: RowSource) -> Iterable[Dict[str, Any]]:
+        return source() if callable(source) else source
+
     def write(self,
-              general_info: List[Dict[str, Any]],
-              hmi_rows: List[Dict[str, Any]],
-              nav_rows: List[Dict[str, Any]],
-              shape_defs: List[Dict[str, Any]]):
+              general_info: RowSource,
+              hmi_rows: RowSource,
+              nav_rows: RowSource,
+              shape_defs: RowSource):
         """
         Записывает все листы в XLSX.
-        Заголовки для HMI_Tags и Navigation_Shapes собираются по ключам данных.
+        Заголовки для HMI_Tags и Navigation_Shapes собираются отдельным проходом по ключам данных
+        до записи первой строки, затем строки формируются и записываются по одной.
         """
-        wb = openpyxl.Workbook()
-        if 'Sheet' in wb.sheetnames:
-            wb.remove(wb['Sheet'])
+        wb = openpyxl.Workbook(write_only=True)
 
         # --- General_Info ---
         sheet = wb.create_sheet("General_Info")
         general_headers = ["Файл", "Заголовок Мнемосхемы", "HMIWeb Template", "Размеры Фона (Width x Height)", "Цвет Фона"]
         sheet.append(general_headers)
-        for row in general_info:
+        for row in self._iter_rows(general_info):
             sheet.append([self._safe_value(row.get(h, "")) for h in general_headers])
 
         # --- HMI_Tags ---
-        if hmi_rows:
-            hmi_headers = self._collect_headers(hmi_rows, base_static=[
-                "Файл", "ID", "Тип Элемента (Class)", "ItemProperty1", "Itemproperty2", "Data Source", "Сервер",
-                "Link Type", "hdxproperties", "Источник Формы (SRC)"
-            ])
+        hmi_headers = self._collect_headers(self._iter_rows(hmi_rows), base_static=[
+            "Файл", "ID", "Тип Элемента (Class)", "ItemProperty1", "Itemproperty2", "Data Source", "Сервер",
+            "Link Type", "hdxproperties", "Источник Формы (SRC)"
+        ])
+        if hmi_headers:
             hmi_sheet = wb.create_sheet("HMI_Tags")
             hmi_sheet.append(hmi_headers)
-            for r in hmi_rows:
+            for r in self._iter_rows(hmi_rows):
                 hmi_sheet.append([self._safe_value(r.get(h, "")) for h in hmi_headers])
 
         # --- Navigation_Shapes ---
-        if nav_rows:
-            nav_headers = self._collect_headers(nav_rows, base_static=[
-                "Файл", "ID", "Тип Элемента (Class)", "Параметры (Parameters)", "Link Type", "hdxproperties",
-                "Источник Формы (SRC)"
-            ])
+        nav_headers = self._collect_headers(self._iter_rows(nav_rows), base_static=[
+            "Файл", "ID", "Тип Элемента (Class)", "Параметры (Parameters)", "Link Type", "hdxproperties",
+            "Источник Формы (SRC)"
+        ])
+        if nav_headers:
             nav_sheet = wb.create_sheet("Navigation_Shapes")
             nav_sheet.append(nav_headers)
-            for r in nav_rows:
+            for r in self._iter_rows(nav_rows):
                 nav_sheet.append([self._safe_value(r.get(h, "")) for h in nav_headers])
 
         # --- Shape_Definitions ---
-        if shape_defs:
-            shape_headers = ["Файл SHAPE (SRC)", "Title", "Description", "Width", "Height",
-                             "Параметры (Count)", "Параметры (Name, Type, Default)",
-                             "Скрипты (Count)", "Скрипты (ID)", "Скрипты (Language)", "Скрипты (Event)",
-                             "Скрипты (HasCode)"]
-            sd_sheet = wb.create_sheet("Shape_Definitions")
-            sd_sheet.append(shape_headers)
-            for meta_row in shape_defs:
-                # scripts detail может быть списком — сплющим в строки
-                scripts = meta_row.get("Scripts_Detail", [])
-                if scripts:
-                    for s in scripts:
-                        row = []
-                        # основные поля
-                        flat = meta_row.get("Shape_Flat", {})
-                        for h in shape_headers[:7]:
-                            row.append(self._safe_value(flat.get(h, "")))
-                        # Скриптовые поля
-                        row.append(self._safe_value(len(scripts)))
-                        row.append(self._safe_value(s.get("ID", "")))
-                        row.append(self._safe_value(s.get("Language", "")))
-                        row.append(self._safe_value(s.get("Event", "")))
-                        row.append(self._safe_value(s.get("HasCode", "")))
-                        sd_sheet.append(row)
-                else:
-                    row = []
-                    flat = meta_row.get("Shape_Flat", {})
-                    for h in shape_headers[:7]:
-                        row.append(self._safe_value(flat.get(h, "")))
-                    row += ["", "", "", "", ""]
-                    sd_sheet.append(row)
+        shape_headers = ["Файл SHAPE (SRC)", "Title", "Description", "Width", "Height",
+                         "Параметры (Count)", "Параметры (Name, Type, Default)",
+                         "Скрипты (Count)", "Скрипты (ID)", "Скрипты (Language)", "Скрипты (Event)",
+                         "Скрипты (HasCode)", "Дубликаты"]
+        sd_sheet = None
+        for meta_row in self._iter_rows(shape_defs):
+            if sd_sheet is None:
+                # Лист создаётся только при наличии хотя бы одной строки
+                sd_sheet = wb.create_sheet("Shape_Definitions")
+                sd_sheet.append(shape_headers)
+            # scripts detail может быть списком — сплющим в строки
+            scripts = meta_row.get("Scripts_Detail", [])
+            flat = meta_row.get("Shape_Flat", {})
+            base = [self._safe_value(flat.get(h, "")) for h in shape_headers[:7]]
+            duplicates = self._safe_value(flat.get("Дубликаты", ""))
+            if scripts:
+                for s in scripts:
+                    # основные поля + скриптовые поля
+                    sd_sheet.append(base + [
+                        self._safe_value(len(scripts)),
+                        self._safe_value(s.get("ID", "")),
+                        self._safe_value(s.get("Language", "")),
+                        self._safe_value(s.get("Event", "")),
+                        self._safe_value(s.get("HasCode", "")),
+                        duplicates,
+                    ])
+            else:
+                sd_sheet.append(base + ["", "", "", "", "", duplicates])
 
         # Попытка сохранить
         try:
@@ -428,218 +1111,375 @@ class ExcelWriter:
             logging.exception("Ошибка сохранения Excel: %s", e)
 
     @staticmethod
-    def _collect_headers(rows: List[Dict[str, Any]], base_static: List[str]) -> List[str]:
-        """Собирает итоговые заголовки: base_static + все ключи из rows (в порядке)"""
-        dynamic_keys: List[str] = []
+    def _collect_headers(rows: Iterable[Dict[str, Any]], base_static: List[str]) -> List[str]:
+        """
+        Собирает итоговые заголовки: base_static + все ключи из rows (в порядке появления).
+        Возвращает пустой список, если строк нет.
+        """
+        static = set(base_static)
+        dynamic_keys: Dict[str, None] = {}
+        has_rows = False
         for r in rows:
+            has_rows = True
             for k in r.keys():
-                if k not in base_static and k not in dynamic_keys:
-                    dynamic_keys.append(k)
+                if k not in static:
+                    dynamic_keys.setdefault(k)
+        if not has_rows:
+            return []
         # Перемещаем SRC в конец, если присутствует
         headers = [h for h in base_static if h != "Источник Формы (SRC)"]
-        headers += dynamic_keys
+        headers += list(dynamic_keys)
         headers += ["Источник Формы (SRC)"]
         return headers
 
 
-def main(root_dir: str, output_filename: str, max_workers: int = 8):
-    root = Path(root_dir).resolve()
-    logging.info("Запуск. Корень: %s", root)
+class SQLiteIndexWriter:
+    """
+    Формирует индекс перекрёстных ссылок проекта в SQLite (для быстрых запросов
+    "тег -> мнемосхемы", "форма -> мнемосхемы", "мнемосхема -> теги"):
+     - display — мнемосхемы (HTM) и их общая информация
+     - element — элементы hsc.shape.1 (sheet: HMI_Tags / Navigation_Shapes)
+     - tag_ref — значения параметров (kind = 'parameter') и hdxproperties (kind = 'hdx') элементов;
+       point — имя точки без параметра (FIC101 для FIC101.PV)
+     - shape — формы SHA (exists = 0, если файл не найден на диске)
+    Существующий файл индекса пересоздаётся. Индексы строятся после загрузки данных.
+    """
 
-    htm_parser = HTMParser()
-    scanner = ProjectScanner(root, htm_parser)
+    SCHEMA = """
+        CREATE TABLE display (
+            id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, name TEXT NOT NULL,
+            title TEXT, template TEXT, dims TEXT, bg_color TEXT);
+        CREATE TABLE shape (
+            id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, name TEXT NOT NULL, exists_on_disk INTEGER NOT NULL,
+            title TEXT, description TEXT, width TEXT, height TEXT, param_count INTEGER, script_count INTEGER);
+        CREATE TABLE element (
+            id INTEGER PRIMARY KEY, display_id INTEGER NOT NULL REFERENCES display(id),
+            element_id TEXT, element_class TEXT, src TEXT, link_type TEXT, sheet TEXT NOT NULL,
+            hdxproperties TEXT, parameters TEXT, shape_id INTEGER REFERENCES shape(id));
+        CREATE TABLE tag_ref (
+            element_id INTEGER NOT NULL REFERENCES element(id), display_id INTEGER NOT NULL REFERENCES display(id),
+            kind TEXT NOT NULL, key TEXT NOT NULL, tag TEXT NOT NULL, point TEXT NOT NULL);
+    """
 
-    # 1) Собираем элементы и список всех sha, на которые есть ссылки (по HTM)
-    mapping_htm_to_elements, mapping_htm_to_sha_paths = scanner.collect_elements_and_shas()
+    INDEXES = """
+        CREATE INDEX ix_display_name ON display(name COLLATE NOCASE);
+        CREATE INDEX ix_shape_name ON shape(name COLLATE NOCASE);
+        CREATE INDEX ix_shape_title ON shape(title COLLATE NOCASE);
+        CREATE INDEX ix_element_display ON element(display_id);
+        CREATE INDEX ix_element_shape ON element(shape_id);
+        CREATE INDEX ix_tag_ref_tag ON tag_ref(tag COLLATE NOCASE);
+        CREATE INDEX ix_tag_ref_point ON tag_ref(point COLLATE NOCASE);
+        CREATE INDEX ix_tag_ref_display ON tag_ref(display_id);
+    """
 
-    # 2) ПАРАЛЛЕЛЬНО парсим все уникальные SHA пути (в пределах абсолютных путей)
-    # ВАЖНО: вы просили анализировать повторы: если два HTM ссылаются на разные абсолютные пути — оба будут разобраны.
-    unique_sha_paths: Set[Path] = set()
-    for sha_set in mapping_htm_to_sha_paths.values():
-        unique_sha_paths.update(sha_set)
+    def __init__(self, output_path: Path):
+        self.output_path = output_path
 
-    logging.info("Уникальных абсолютных SHA-путей для разбора: %d", len(unique_sha_paths))
+    def write(self, displays: Dict[Path, HTMDisplay], sha_meta_by_path: Dict[Path, Optional[SHAMetadata]]):
+        if self.output_path.exists():
+            self.output_path.unlink()
+        conn = sqlite3.connect(str(self.output_path))
+        try:
+            conn.executescript(self.SCHEMA)
+
+            shape_ids: Dict[Path, int] = {}
+            for shape_id, (sha_path, meta) in enumerate(sha_meta_by_path.items(), start=1):
+                shape_ids[sha_path] = shape_id
+                conn.execute(
+                    "INSERT INTO shape VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (shape_id, str(sha_path), sha_path.name, int(meta is not None),
+                     meta.title if meta else None, meta.description if meta else None,
+                     meta.width if meta else None, meta.height if meta else None,
+                     len(meta.parameters_list) if meta else None, len(meta.scripts_list) if meta else None)
+                )
+
+            element_id = 0
+            for display_id, (htm_path, display) in enumerate(displays.items(), start=1):
+                conn.execute(
+                    "INSERT INTO display VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (display_id, str(htm_path), htm_path.name, display.title, display.hmi_template,
+                     display.dims, display.bg_color)
+                )
+                element_rows = []
+                ref_rows = []
+                for el in display.elements:
+                    element_id += 1
+                    params = el.parameters_parsed
+                    sha_abs = element_sha_path(htm_path, el)
+                    element_rows.append((
+                        element_id, display_id, el.element_id, el.element_class, el.src, el.link_type,
+                        "HMI_Tags" if "ItemProperty1" in params else "Navigation_Shapes",
+                        el.hdxproperties_raw, el.parameters_raw, shape_ids.get(sha_abs) if sha_abs else None
+                    ))
+                    for kind, values in (("parameter", params), ("hdx", el.hdx_parsed)):
+                        for key, value in values.items():
+                            if value:
+                                ref_rows.append((element_id, display_id, kind, key, value, value.split(".", 1)[0]))
+                conn.executemany("INSERT INTO element VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", element_rows)
+                conn.executemany("INSERT INTO tag_ref VALUES (?, ?, ?, ?, ?, ?)", ref_rows)
+
+            conn.executescript(self.INDEXES)
+            conn.commit()
+            logging.info("Индекс ссылок сохранён в %s (мнемосхем: %d, элементов: %d, форм: %d)",
+                         self.output_path, len(displays), element_id, len(shape_ids))
+        finally:
+            conn.close()
+
+
+def write_outputs(displays: Dict[Path, HTMDisplay], sha_meta_by_path: Dict[Path, Optional[SHAMetadata]],
+                  output_filename: str, index_path: Optional[str], write_xlsx: bool):
+    """Формирует XLSX (потоково) и, при необходимости, индекс ссылок SQLite."""
+    # 3) Формируем строки лениво и 4) записываем их в XLSX потоково
+    if write_xlsx:
+        report = ReportRows(displays, sha_meta_by_path)
+        writer = ExcelWriter(Path(output_filename))
+        writer.write(
+            general_info=report.iter_general_info,
+            hmi_rows=report.iter_hmi_rows,
+            nav_rows=report.iter_nav_rows,
+            shape_defs=report.iter_shape_defs
+        )
+
+    # 5) Индекс перекрёстных ссылок SQLite
+    if index_path:
+        SQLiteIndexWriter(Path(index_path)).write(displays, sha_meta_by_path)
+
+
+# ---------- Режим наблюдения ----------
+HTM_SUFFIXES = (".htm", ".html")
+
+
+def _is_htm(path: Path) -> bool:
+    # Без учёта регистра, как _is_sha: в проектах Windows встречаются DISPLAY.HTM и *.Html
+    return path.name.lower().endswith(HTM_SUFFIXES)
+
+
+def _is_sha(path: Path) -> bool:
+    return path.name.lower().endswith(".sha")
+
+
+class _ChangeCollector(FileSystemEventHandler):
+    """Обработчик watchdog: накапливает пути изменившихся HTM/SHA между циклами."""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.paths: Set[Path] = set()
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for attr in ("src_path", "dest_path"):
+            path = getattr(event, attr, None)
+            if path:
+                p = Path(os.fsdecode(path))
+                if _is_htm(p) or _is_sha(p):
+                    with self.lock:
+                        self.paths.add(p)
+
+    def take(self) -> Set[Path]:
+        with self.lock:
+            paths, self.paths = self.paths, set()
+        return paths
+
+
+class ProjectWatcher:
+    """
+    Режим --watch: после полного разбора следит за деревом --root и обновляет отчёты инкрементально.
+    Повторно разбираются только созданные/изменённые HTM; удалённые исключаются из отчёта.
+    SHA заново хэшируются и разбираются только при изменении размера/mtime (остальное — из памяти и кэша).
+    Изменения берутся из уведомлений ФС (watchdog, если установлен) или периодическим опросом mtime.
+    """
 
-    sha_parser = SHAParser()
-    sha_meta_by_path: Dict[Path, Optional[SHAMetadata]] = {}
-
-    # Парсим SHA параллельно, но аккуратно — файл может не существовать
-    def parse_one(sha_path: Path) -> (Path, Optional[SHAMetadata]):
-        if not sha_path.exists():
-            logging.warning("Ссылка на SHA отсутствует на диске: %s", sha_path)
-            return sha_path, None
-        meta = sha_parser.parse(sha_path)
-        return sha_path, meta
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as exc:
-        futures = {exc.submit(parse_one, p): p for p in unique_sha_paths}
-        for fut in concurrent.futures.as_completed(futures):
-            p = futures[fut]
+    def __init__(self, scanner: ProjectScanner, sha_parser: SHAParser,
+                 on_update: Callable[[Dict[Path, HTMDisplay], Dict[Path, Optional[SHAMetadata]]], None],
+                 interval: float = 2.0, use_polling: bool = False):
+        self.scanner = scanner
+        self.sha_parser = sha_parser
+        self.on_update = on_update
+        self.interval = interval
+        self.use_polling = use_polling or Observer is None
+        self.displays: Dict[Path, HTMDisplay] = {}
+        self.htm_to_sha: Dict[Path, Set[Path]] = {}
+        self.sha_meta: Dict[Path, Optional[SHAMetadata]] = {}
+        self._snapshot: Dict[Path, Tuple[int, int]] = {}
+
+    def _referenced_shas(self) -> List[Path]:
+        return sorted(set().union(*self.htm_to_sha.values())) if self.htm_to_sha else []
+
+    def _take_snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        """(size, mtime_ns) всех HTM/SHA под --root и SHA вне его, на которые есть ссылки."""
+        snapshot: Dict[Path, Tuple[int, int]] = {}
+        candidates: List[Path] = []
+        for dirpath, _, filenames in os.walk(self.scanner.root_dir):
+            for name in filenames:
+                p = Path(dirpath) / name
+                if _is_htm(p) or _is_sha(p):
+                    candidates.append(p)
+        candidates += self._referenced_shas()
+        for p in dict.fromkeys(candidates):
             try:
-                sha_path, meta = fut.result()
-                sha_meta_by_path[sha_path] = meta
-            except Exception as e:
-                logging.exception("Ошибка при парсинге SHA %s: %s", p, e)
-                sha_meta_by_path[p] = None
-
-    # 3) Формируем результирующие таблицы
-    general_info_rows = []
-    hmi_tags_rows = []
-    nav_rows = []
-    shape_definitions_rows = []
-
-    # Общая информация (из HTM <title>, HMIWebTemplate, body style)
-    for htm_path, elements in mapping_htm_to_elements.items():
-        # Общая информация: парсим файл для title + meta HMIWebTemplateDescription + body style
-        try:
-            raw = None
-            for enc in ("windows-1252", "windows-1251", "utf-8", "latin-1"):
-                try:
-                    raw = htm_path.read_text(encoding=enc)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            if raw is None:
+                st = p.stat()
+            except OSError:
                 continue
-            soup = BeautifulSoup(raw, DEFAULT_PARSER)
-            title_tag = soup.find("title")
-            title = title_tag.text.strip() if title_tag else htm_path.name
-            hmi_template_tag = soup.find("meta", {"name": "HMIWebTemplateDescription"})
-            hmi_template = hmi_template_tag.get("content", "") if hmi_template_tag else ""
-            body = soup.find("body")
-            style = body.get("style", "") if body else ""
-            width_m = re.search(r"width:\s*(\d+)px", style)
-            height_m = re.search(r"height:\s*(\d+)px", style)
-            bg_m = re.search(r"background-color:\s*([^;]+)", style)
-            dims = ""
-            if width_m and height_m:
-                dims = f"{width_m.group(1)}x{height_m.group(1)}"
-            bg_color = bg_m.group(1).strip() if bg_m else "white"
-            general_info_rows.append({
-                "Файл": str(htm_path.name),
-                "Заголовок Мнемосхемы": title,
-                "HMIWeb Template": hmi_template,
-                "Размеры Фона (Width x Height)": dims,
-                "Цвет Фона": bg_color
-            })
-        except Exception:
-            logging.exception("Ошибка при извлечении General_Info из %s", htm_path)
+            snapshot[p] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def _poll_changes(self) -> Set[Path]:
+        snapshot = self._take_snapshot()
+        changed = {p for p, state in snapshot.items() if self._snapshot.get(p) != state}
+        changed |= self._snapshot.keys() - snapshot.keys()
+        self._snapshot = snapshot
+        return changed
+
+    def build(self, displays: Dict[Path, HTMDisplay], htm_to_sha: Dict[Path, Set[Path]],
+              sha_meta: Dict[Path, Optional[SHAMetadata]]):
+        """Исходное состояние — результат полного разбора проекта."""
+        self.displays, self.htm_to_sha, self.sha_meta = displays, htm_to_sha, sha_meta
+        if self.use_polling:
+            self._snapshot = self._take_snapshot()
+
+    def apply(self, changed: Set[Path]) -> bool:
+        """Применяет изменения файлов; возвращает True, если отчёт нужно переписать."""
+        htm_changed = sorted(p for p in changed if _is_htm(p) and p.exists())
+        htm_deleted = [p for p in changed if _is_htm(p) and not p.exists() and p in self.displays]
+        sha_touched = any(_is_sha(p) for p in changed)
+        if not (htm_changed or htm_deleted or sha_touched):
+            return False
+
+        for htm in htm_deleted:
+            logging.info("Удалена мнемосхема: %s", htm)
+            self.displays.pop(htm, None)
+            self.htm_to_sha.pop(htm, None)
+            if self.scanner.cache:
+                self.scanner.cache.delete(self.scanner.htm_cache_kind, htm)
+        if htm_changed:
+            logging.info("Изменено мнемосхем: %d", len(htm_changed))
+            for htm, display in self.scanner.parse_all(htm_changed, prune=False).items():
+                self.displays[htm] = display
+                self.htm_to_sha[htm] = self.scanner.sha_refs(htm, display.elements)
+            # Порядок строк отчёта — как при полном разборе
+            self.displays = dict(sorted(self.displays.items()))
+        self.sha_meta = self.scanner.parse_shas(self._referenced_shas(), self.sha_parser)
+        return True
+
+    def run(self):
+        """Цикл наблюдения (до Ctrl+C)."""
+        observer = collector = None
+        if not self.use_polling:
+            collector = _ChangeCollector()
+            observer = Observer()
+            observer.schedule(collector, str(self.scanner.root_dir), recursive=True)
+            observer.start()
+        logging.info("Наблюдение за %s (%s, интервал %.1f с). Ctrl+C — выход.", self.scanner.root_dir,
+                     "опрос" if self.use_polling else "watchdog", self.interval)
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = self._poll_changes() if self.use_polling else collector.take()
+                if changed and self.apply(changed):
+                    start = time.perf_counter()
+                    self.on_update(self.displays, self.sha_meta)
+                    if self.scanner.cache:
+                        self.scanner.cache.conn.commit()
+                    logging.info("Отчёт обновлён (%.2f с)", time.perf_counter() - start)
+        except KeyboardInterrupt:
+            logging.info("Наблюдение остановлено.")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+
+def main(root_dir: str, output_filename: str, max_workers: int = 8, executor: str = "process",
+         cache_path: Optional[str] = None, cache_hash: bool = False, backend: str = DEFAULT_BACKEND,
+         index_path: Optional[str] = None, write_xlsx: bool = True,
+         watch: bool = False, watch_interval: float = 2.0, watch_polling: bool = False, keep_raw: bool = False):
+    root = Path(root_dir).resolve()
+    logging.info("Запуск. Корень: %s (пул: %s, воркеров: %d, движок: %s)", root, executor, max_workers, backend)
+
+    cache = ParseCache(Path(cache_path), use_hash=cache_hash) if cache_path else None
+    if watch and cache is None:
+        # В режиме наблюдения кэш нужен для инкрементального разбора SHA, даже если файловый отключён
+        cache = ParseCache(Path(":memory:"), use_hash=cache_hash)
+    try:
+        _run(root, output_filename, max_workers, executor, cache, backend, index_path, write_xlsx,
+             watch, watch_interval, watch_polling, keep_raw)
+    finally:
+        if cache:
+            cache.close()
+
+
+def _run(root: Path, output_filename: str, max_workers: int, executor: str, cache: Optional[ParseCache],
+         backend: str, index_path: Optional[str], write_xlsx: bool,
+         watch: bool = False, watch_interval: float = 2.0, watch_polling: bool = False, keep_raw: bool = False):
+    htm_parser = HTMParser(backend=backend, keep_raw=keep_raw)
+    scanner = ProjectScanner(root, htm_parser, max_workers=max_workers, executor=executor, cache=cache)
 
-    # Для каждого HTM -> элемента формируем строки в HMI_Tags или Navigation_Shapes
-    for htm_path, elements in mapping_htm_to_elements.items():
-        for el in elements:
-            # базовые поля
-            base = {
-                "Файл": str(htm_path),  # полный путь, ExcelWriter может менять/обрабатывать
-                "ID": el.element_id,
-                "Тип Элемента (Class)": el.element_class,
-                "Источник Формы (SRC)": el.src,
-                "Link Type": el.link_type,
-                "hdxproperties": el.hdxproperties_raw,
-            }
-            # добавляем динамические hdx поля
-            for k, v in el.hdx_parsed.items():
-                base[f"hdxproperties - {k}"] = v
+    # 1) Собираем элементы и список всех sha, на которые есть ссылки (по HTM)
+    mapping_htm_to_display, mapping_htm_to_sha_paths = scanner.collect_elements_and_shas()
 
-            # если среди параметров есть ItemProperty1 — считаем что это HMI_Tags
-            params = el.parameters_parsed or {}
-            if "ItemProperty1" in params:
-                # HMI_Tags: включаем статические поля ItemProperty1, Itemproperty2, Data Source, Сервер
-                row = dict(base)
-                row.update({
-                    "ItemProperty1": params.get("ItemProperty1", ""),
-                    "Itemproperty2": params.get("Itemproperty2", ""),
-                    "Data Source": params.get("Data Source", ""),
-                    "Сервер": params.get("Server Control", "")
-                })
-                # добавим sha-merge поля если есть соответствующий sha
-                # разрешим абс путь
-                src = el.src.strip()
-                if src and src.lower().endswith(".sha"):
-                    sha_abs = (htm_path.parent / src).resolve()
-                    sha_meta = sha_meta_by_path.get(sha_abs)
-                    if sha_meta:
-                        # добавляем non-script поля
-                        row["Title"] = sha_meta.title
-                        row["Description"] = sha_meta.description
-                        row["Width"] = sha_meta.width or ""
-                        row["Height"] = sha_meta.height or ""
-                        row["Параметры (Count)"] = len(sha_meta.parameters_list)
-                        row["Параметры (Name, Type, Default)"] = json.dumps(sha_meta.parameters_list, ensure_ascii=False)
-                        row["Скрипты (Count)"] = len(sha_meta.scripts_list)
-                        # добавляем первые скриптовые поля (скрипты конкретно добавляются в merge step в Excel)
-                        # Но оставим отдельное поле для удобства
-                    else:
-                        # sha отсутствует или не разобран
-                        row["Title"] = ""
-                        row["Description"] = ""
-                        row["Width"] = ""
-                        row["Height"] = ""
-                        row["Параметры (Count)"] = ""
-                        row["Параметры (Name, Type, Default)"] = ""
-                        row["Скрипты (Count)"] = ""
-                hmi_tags_rows.append(row)
-            else:
-                # Navigation_Shapes
-                row = dict(base)
-                row["Параметры (Parameters)"] = el.parameters_raw
-                # добавляем parsed params prefixed
-                for k, v in params.items():
-                    row[f"Параметры - {k}"] = v
-                # добавляем sha merge fields если есть
-                src = el.src.strip()
-                if src and src.lower().endswith(".sha"):
-                    sha_abs = (htm_path.parent / src).resolve()
-                    sha_meta = sha_meta_by_path.get(sha_abs)
-                    if sha_meta:
-                        row["Title"] = sha_meta.title
-                        row["Description"] = sha_meta.description
-                        row["Width"] = sha_meta.width or ""
-                        row["Height"] = sha_meta.height or ""
-                        row["Параметры (Count)"] = len(sha_meta.parameters_list)
-                        row["Параметры (Name, Type, Default)"] = json.dumps(sha_meta.parameters_list, ensure_ascii=False)
-                        row["Скрипты (Count)"] = len(sha_meta.scripts_list)
-                    else:
-                        row["Title"] = ""
-                        row["Description"] = ""
-                        row["Width"] = ""
-                        row["Height"] = ""
-                        row["Параметры (Count)"] = ""
-                        row["Параметры (Name, Type, Default)"] = ""
-                        row["Скрипты (Count)"] = ""
-                # добавить hdx парсинг
-                for k, v in el.hdx_parsed.items():
-                    row[f"hdxproperties - {k}"] = v
-                nav_rows.append(row)
-
-    # --- Shape_Definitions: формируем список словарей, содержащих Shape_Flat и Scripts_Detail
-    for sha_path, meta in sha_meta_by_path.items():
-        if meta is None:
-            continue
-        shape_row = {
-            "Shape_Flat": meta.to_flat_dict(),
-            "Scripts_Detail": meta.scripts_list,
-        }
-        shape_definitions_rows.append(shape_row)
+    # 2) ПАРАЛЛЕЛЬНО (процессами или потоками) парсим все уникальные SHA пути (в пределах абсолютных путей)
+    # Разные абсолютные пути с побайтно одинаковым содержимым разбираются один раз (см. ProjectScanner.parse_shas),
+    # но в отчёт попадают все пути — с перечнем копий в колонке "Дубликаты".
+    unique_sha_paths: Set[Path] = set()
+    for sha_set in mapping_htm_to_sha_paths.values():
+        unique_sha_paths.update(sha_set)
 
-    # 4) Запись в XLSX
-    writer = ExcelWriter(Path(output_filename))
-    writer.write(
-        general_info=general_info_rows,
-        hmi_rows=hmi_tags_rows,
-        nav_rows=nav_rows,
-        shape_defs=shape_definitions_rows
-    )
+    logging.info("Уникальных абсолютных SHA-путей для разбора: %d", len(unique_sha_paths))
+
+    sha_parser = SHAParser(backend=backend, keep_raw=keep_raw)
+    # Сортировка — детерминированный порядок листа Shape_Definitions
+    sha_meta_by_path: Dict[Path, Optional[SHAMetadata]] = scanner.parse_shas(sorted(unique_sha_paths), sha_parser)
 
+    write_outputs(mapping_htm_to_display, sha_meta_by_path, output_filename, index_path, write_xlsx)
     logging.info("Готово.")
 
+    if watch:
+        if cache:
+            cache.conn.commit()
+        watcher = ProjectWatcher(
+            scanner, sha_parser,
+            on_update=lambda displays, metas: write_outputs(displays, metas, output_filename, index_path, write_xlsx),
+            interval=watch_interval, use_polling=watch_polling
+        )
+        watcher.build(mapping_htm_to_display, mapping_htm_to_sha_paths, sha_meta_by_path)
+        watcher.run()
+
 
 # ---------- CLI ----------
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Парсер HTM+SHA -> XLSX")
     parser.add_argument("--root", "-r", help="Корневая папка с мнемосхемами (по умолчанию текущая)", default=".")
     parser.add_argument("--output", "-o", help="Имя выходного файла Excel", default="Result_improved.xlsx")
-    parser.add_argument("--workers", "-w", help="Число потоков для разбора SHA", type=int, default=8)
+    parser.add_argument("--workers", "-w", help="Число воркеров для разбора HTM и SHA (1 - последовательно)",
+                        type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--executor", "-e", help="Тип пула: process (по ядрам CPU) или thread",
+                        choices=EXECUTOR_KINDS, default="process")
+    parser.add_argument("--cache", help="Файл кэша разбора SQLite (по умолчанию <output>.cache.sqlite рядом с отчетом)",
+                        default=None)
+    parser.add_argument("--no-cache", help="Не использовать кэш разбора", action="store_true")
+    parser.add_argument("--cache-hash", help="Сверять содержимое (SHA-1) файлов, у которых изменился только mtime",
+                        action="store_true")
+    parser.add_argument("--backend", "-b", help="Движок разбора: lxml (быстрый, XPath) или bs4 (BeautifulSoup)",
+                        choices=BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument("--index", "-i", help="Дополнительно записать индекс ссылок SQLite (см. tag_index_query.py)",
+                        default=None)
+    parser.add_argument("--no-xlsx", help="Не формировать XLSX (например, только --index)", action="store_true")
+    parser.add_argument("--watch", help="После разбора следить за --root и обновлять отчеты инкрементально",
+                        action="store_true")
+    parser.add_argument("--watch-interval", help="Период проверки изменений в режиме --watch, с",
+                        type=float, default=2.0)
+    parser.add_argument("--watch-polling", help="Опрос mtime вместо уведомлений ФС (watchdog)", action="store_true")
+    parser.add_argument("--keep-raw", help="Хранить исходные строки hdxproperties/parameters всех элементов и текст "
+                                           "скриптов SHA (иначе исходная строка хранится, только если не совпадает "
+                                           "с восстановленной из разобранных пар, что экономит память)",
+                        action="store_true")
     args = parser.parse_args()
 
-    main(root_dir=args.root, output_filename=args.output, max_workers=args.workers)
+    cache_file = None if args.no_cache else (args.cache or str(Path(args.output).with_suffix(".cache.sqlite")))
+    main(root_dir=args.root, output_filename=args.output, max_workers=args.workers, executor=args.executor,
+         cache_path=cache_file, cache_hash=args.cache_hash, backend=args.backend,
+         index_path=args.index, write_xlsx=not args.no_xlsx,
+         watch=args.watch, watch_interval=args.watch_interval, watch_polling=args.watch_polling,
+         keep_raw=args.keep_raw)
@@ -0,0 +1,93 @@
+"""
+Запросы к индексу перекрёстных ссылок HMIWeb (SQLite), который формирует
+"htm to xlsx v2.py --index <файл>".
+
+Примеры:
+    python tag_index_query.py index.sqlite tag FIC101.PV     # тег (или точка FIC101) -> мнемосхемы
+    python tag_index_query.py index.sqlite shape valve.sha   # форма (имя файла, путь или Title) -> мнемосхемы
+    python tag_index_query.py index.sqlite display d1.htm    # мнемосхема -> теги
+"""
+from __future__ import annotations
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+
+def tag_to_displays(conn: sqlite3.Connection, tag: str, include_hdx: bool = False) -> List[Tuple]:
+    """Мнемосхемы, ссылающиеся на тег. Совпадение по полному значению (FIC101.PV) или по точке (FIC101)."""
+    kind_filter = "" if include_hdx else "AND r.kind = 'parameter'"
+    return conn.execute(f"""
+        SELECT d.path, r.tag, r.key, COUNT(*) AS refs
+        FROM tag_ref r JOIN display d ON d.id = r.display_id
+        WHERE (r.tag = :q COLLATE NOCASE OR r.point = :q COLLATE NOCASE) {kind_filter}
+        GROUP BY d.path, r.tag, r.key
+        ORDER BY d.path, r.tag
+    """, {"q": tag}).fetchall()
+
+
+def shape_to_displays(conn: sqlite3.Connection, shape: str) -> List[Tuple]:
+    """Мнемосхемы, использующие форму SHA (по имени файла, полному пути или Title)."""
+    return conn.execute("""
+        SELECT d.path, s.path, COUNT(*) AS elements
+        FROM shape s
+        JOIN element e ON e.shape_id = s.id
+        JOIN display d ON d.id = e.display_id
+        WHERE s.name = :q COLLATE NOCASE OR s.path = :q OR s.title = :q COLLATE NOCASE
+        GROUP BY d.path, s.path
+        ORDER BY d.path, s.path
+    """, {"q": shape}).fetchall()
+
+
+def display_to_tags(conn: sqlite3.Connection, display: str, include_hdx: bool = False) -> List[Tuple]:
+    """Теги, на которые ссылается мнемосхема (по имени файла или полному пути)."""
+    kind_filter = "" if include_hdx else "AND r.kind = 'parameter'"
+    return conn.execute(f"""
+        SELECT r.tag, r.key, COUNT(*) AS refs
+        FROM display d JOIN tag_ref r ON r.display_id = d.id
+        WHERE (d.name = :q COLLATE NOCASE OR d.path = :q) {kind_filter}
+        GROUP BY r.tag, r.key
+        ORDER BY r.tag, r.key
+    """, {"q": display}).fetchall()
+
+
+def print_rows(headers: Sequence[str], rows: List[Tuple]):
+    """Печатает строки результата через табуляцию."""
+    print("\t".join(headers))
+    for row in rows:
+        print("\t".join("" if v is None else str(v) for v in row))
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Запросы к индексу ссылок HMIWeb (SQLite)")
+    parser.add_argument("index", help="Файл индекса, созданный htm to xlsx v2.py --index")
+    parser.add_argument("--hdx", help="Учитывать также значения hdxproperties", action="store_true")
+    sub = parser.add_subparsers(dest="query", required=True)
+    sub.add_parser("tag", help="Тег -> мнемосхемы").add_argument("value")
+    sub.add_parser("shape", help="Форма SHA -> мнемосхемы").add_argument("value")
+    sub.add_parser("display", help="Мнемосхема -> теги").add_argument("value")
+    args = parser.parse_args(argv)
+
+    # URI из пути: символы "?", "#", "%" в имени файла экранируются
+    conn = sqlite3.connect(Path(args.index).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        start = time.perf_counter()
+        if args.query == "tag":
+            headers, rows = ("Мнемосхема", "Тег", "Параметр", "Ссылок"), tag_to_displays(conn, args.value, args.hdx)
+        elif args.query == "shape":
+            headers, rows = ("Мнемосхема", "Форма", "Элементов"), shape_to_displays(conn, args.value)
+        else:
+            headers, rows = ("Тег", "Параметр", "Ссылок"), display_to_tags(conn, args.value, args.hdx)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+    print_rows(headers, rows)
+    print(f"Найдено строк: {len(rows)} ({elapsed_ms:.1f} мс)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
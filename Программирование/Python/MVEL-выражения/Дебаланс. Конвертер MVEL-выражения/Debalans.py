@@ -1,13 +1,46 @@
+'''
+Конвертер MVEL-выражения для расчета дебаланса с добавлением проверки на значения Bad.
+
+Интерактивный режим (без аргументов): выражение вводится в консоль, результат выводится в консоль.
+Пакетный режим: список выражений или выгрузка ОМ ZIIoT (xlsx, CSV, JSONL) обрабатывается целиком, результат
+записывается в новый столбец.
+    python Debalans.py balance.xlsx --column Configuration -o balance_debalans.xlsx
+    python Debalans.py balance.csv --column MVEL --workers 8
+    python Debalans.py expressions.csv --column MVEL --delimiter ";"
+'''
+import argparse
+import concurrent.futures
+import csv
+import io
+import json
+import os
 import re
+import sys
+from typing import Any, Dict, List, Optional
+
+# Регулярные выражения компилируются один раз для всех выражений
+RE_SPACES = re.compile(r'\s+')
+# Части выражения: до '=', между '=' и ';', после ';'
+RE_PARTS = re.compile(r'(.*?=)(.*?;)(.*)')
+# Переменная (атрибут) выражения
+RE_VAR = re.compile(r'(?<!\w)([A-Za-z][A-Za-z0-9]*)(?!\w)')
+# Разделитель для чтения CSV из одного столбца: символ, которого нет в тексте (строка читается целиком)
+S_NO_DELIMITER = '\x1f'
 
-while True:
-    s_MVEL: str = input('Введите MVEL-выражение: ')
 
+def def_debalans(s_MVEL: str, s_separator: str = '\n') -> str:
+    '''
+    Функция добавления в MVEL-выражение проверки каждой переменной на значение Bad
+
+    :param s_MVEL: MVEL-выражение вида "Double Debalance = F219 + ... + (F15 + ... + LOSKON) * (-1); Debalance"
+    :param s_separator: Разделитель блоков проверки и итогового выражения
+    :return: MVEL-выражение с проверками
+    '''
     # Удаляем лишние пробелы
-    s_MVEL = re.sub(r'\s+', ' ', s_MVEL).strip()
+    s_MVEL = RE_SPACES.sub(' ', s_MVEL).strip()
 
     # Извлекаем части выражения
-    re_match = re.match(r'(.*?=)(.*?;)(.*)', s_MVEL)
+    re_match = RE_PARTS.match(s_MVEL)
     if not re_match:
         raise ValueError("Не удалось разделить выражение на части.")
 
@@ -15,14 +48,8 @@ while True:
     s_MVEL_expression_only = re_match.group(2).strip(';')  # Выражение между '=' и ';' -> r'(.*?;)'. Пример: (F943 + ... + FT23402)  * (1) + (F14401 + ... + FT2451) * (-1)
     s_MVEL_expression_after = re_match.group(3).strip()  # Часть после ';' -> r'(.*)'. Пример: ; Debalance
 
-    re_pattern = r'(?<!\w)([A-Za-z][A-Za-z0-9]*)(?!\w)'
-    list_var: list = re.findall(re_pattern, s_MVEL_expression_only)
-
     # Убираем дубликаты переменных, сохраняя порядок
-    list_unique_var = []
-    for var in list_var:
-            if var not in list_unique_var:
-                list_unique_var.append(var)
+    list_unique_var: list = list(dict.fromkeys(RE_VAR.findall(s_MVEL_expression_only)))
 
     # Формируем блоки проверки
     list_block: list = []
@@ -34,8 +61,150 @@ while True:
         list_block.append(s_block)
 
     # Заменяем переменные в выражении
-    s_MVEL_expression_change: str = re.sub(re_pattern, lambda match: f"D{match.group(1)}", s_MVEL_expression_only)
+    s_MVEL_expression_change: str = RE_VAR.sub(lambda match: f"D{match.group(1)}", s_MVEL_expression_only)
     # Объединяем части
     s_MVEL_new: str = f"{s_MVEL_expression_before}{s_MVEL_expression_change}; {s_MVEL_expression_after}"
-    s_result: str = "\n".join(list_block) + "\n" + s_MVEL_new
-    print(s_result)
\ No newline at end of file
+    return s_separator.join(list_block) + s_separator + s_MVEL_new
+
+
+def def_debalans_item(s_text: str) -> str:
+    '''
+    Воркер пакетного режима: MVEL-выражение или Json-запись выгрузки ОМ ZIIoT (заменяется поле "expression").
+    Результат записывается в одну строку, чтобы его можно было сразу загрузить обратно
+
+    :param s_text: Текст ячейки
+    :return: Выражение (Json-запись) с проверками или текст ошибки
+    '''
+    try:
+        dict_json = json.loads(s_text)
+    except ValueError:
+        dict_json = None
+    try:
+        if isinstance(dict_json, dict) and 'expression' in dict_json:
+            dict_json['expression'] = def_debalans(str(dict_json['expression']), ' ')
+            return json.dumps(dict_json, ensure_ascii=False)
+        return def_debalans(s_text, ' ')
+    except ValueError as e:
+        return f'Ошибка: {e}'
+
+
+def def_debalans_all(list_text: List[str], i_workers: int) -> List[str]:
+    '''
+    Функция обработки списка выражений в параллельных процессах с сохранением порядка
+
+    :param list_text: Тексты ячеек (пустые пропускаются)
+    :param i_workers: Количество процессов (1 - последовательная обработка)
+    :return: Результаты в порядке list_text
+    '''
+    # Одинаковые выражения обрабатываются один раз
+    list_unique: List[str] = [s for s in dict.fromkeys(list_text) if s.strip()]
+    if i_workers <= 1 or len(list_unique) <= 1:
+        list_result = list(map(def_debalans_item, list_unique))
+    else:
+        i_chunksize: int = max(1, len(list_unique) // (i_workers * 8))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=i_workers) as pool:
+            list_result = list(pool.map(def_debalans_item, list_unique, chunksize=i_chunksize))
+    dict_result: Dict[str, str] = dict(zip(list_unique, list_result))
+    return [dict_result.get(s, '') for s in list_text]
+
+
+def def_batch_xlsx(s_path: str, s_output: str, s_column: str, s_sheet: Optional[str], i_workers: int) -> int:
+    import openpyxl
+
+    # Макросы .xlsm сохраняются: без keep_vba Excel не откроет результат
+    wb = openpyxl.load_workbook(s_path, keep_vba=s_path.lower().endswith('.xlsm'))
+    ws = wb[s_sheet] if s_sheet else wb.active
+    list_header: List[str] = [str(cell.value).strip() if cell.value is not None else '' for cell in ws[1]]
+    if s_column not in list_header:
+        raise SystemExit(f'Столбец "{s_column}" не найден на листе "{ws.title}"')
+    i_col: int = list_header.index(s_column) + 1
+    list_text: List[str] = [str(value) if value is not None else ''
+                            for (value,) in ws.iter_rows(min_row=2, min_col=i_col, max_col=i_col, values_only=True)]
+    i_col_out: int = len(list_header) + 1
+    ws.cell(row=1, column=i_col_out, value=f'{s_column} (Debalans)')
+    for i_row, s_result in enumerate(def_debalans_all(list_text, i_workers), start=2):
+        if s_result:
+            ws.cell(row=i_row, column=i_col_out, value=s_result)
+    wb.save(s_output)
+    return len(list_text)
+
+
+def def_batch_csv(s_path: str, s_output: str, s_column: str, i_workers: int, s_delimiter: Optional[str]) -> int:
+    with open(s_path, 'r', encoding='utf-8-sig', newline='') as file:
+        s_data: str = file.read()
+    s_read_delimiter: Optional[str] = s_delimiter
+    if not s_delimiter:
+        # Разделитель CSV: ";" (Excel с русской локалью), "," или табуляция. Определяется только по строке
+        # заголовков: в самих выражениях встречаются ";" и ","
+        try:
+            s_delimiter = s_read_delimiter = csv.Sniffer().sniff(s_data.split('\n', 1)[0], delimiters=';,\t').delimiter
+        except csv.Error:
+            # Один столбец (список выражений): строки читаются целиком, результат записывается через ";"
+            s_delimiter, s_read_delimiter = ';', S_NO_DELIMITER
+    list_rows: List[List[str]] = list(csv.reader(io.StringIO(s_data), delimiter=s_read_delimiter))
+    if not list_rows or s_column not in list_rows[0]:
+        raise SystemExit(f'Столбец "{s_column}" не найден в {s_path}')
+    i_col: int = list_rows[0].index(s_column)
+    list_text: List[str] = [row[i_col] if i_col < len(row) else '' for row in list_rows[1:]]
+    list_result: List[str] = def_debalans_all(list_text, i_workers)
+    with open(s_output, 'w', encoding='utf-8-sig', newline='') as file:
+        writer = csv.writer(file, delimiter=s_delimiter)
+        writer.writerow(list_rows[0] + [f'{s_column} (Debalans)'])
+        for row, s_result in zip(list_rows[1:], list_result):
+            writer.writerow(row + [s_result])
+    return len(list_text)
+
+
+def def_batch_jsonl(s_path: str, s_output: str, s_column: str, i_workers: int) -> int:
+    with open(s_path, 'r', encoding='utf-8') as file:
+        list_lines: List[Any] = [json.loads(s_line) for s_line in file if s_line.strip()]
+
+    def def_text(value: Any) -> str:
+        if isinstance(value, dict) and s_column in value:
+            value = value[s_column]
+        return json.dumps(value, ensure_ascii=False) if isinstance(value, dict) else str(value or '')
+
+    list_text: List[str] = [def_text(value) for value in list_lines]
+    list_result: List[str] = def_debalans_all(list_text, i_workers)
+    with open(s_output, 'w', encoding='utf-8') as file:
+        for value, s_result in zip(list_lines, list_result):
+            dict_out: Dict[str, Any] = value if isinstance(value, dict) and s_column in value else {s_column: value}
+            dict_out[f'{s_column} (Debalans)'] = s_result
+            file.write(json.dumps(dict_out, ensure_ascii=False) + '\n')
+    return len(list_text)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Добавление проверки на значения Bad в MVEL-выражения дебаланса')
+    parser.add_argument('input', help='Список выражений или выгрузка ОМ ZIIoT: .xlsx, .csv или .jsonl')
+    parser.add_argument('--output', '-o', help='Файл с результатом (по умолчанию <имя>_debalans.<расширение>)')
+    parser.add_argument('--column', '-c', help='Столбец (ключ JSONL) с MVEL-выражением или Json-записью',
+                        default='Configuration')
+    parser.add_argument('--sheet', '-s', help='Лист xlsx (по умолчанию активный)', default=None)
+    parser.add_argument('--delimiter', '-d', help='Разделитель столбцов CSV (по умолчанию по строке заголовков)',
+                        default=None)
+    parser.add_argument('--workers', '-w', help='Количество процессов (1 - последовательно)',
+                        type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args(argv)
+
+    s_name, s_ext = os.path.splitext(args.input)
+    s_output: str = args.output or f'{s_name}_debalans{s_ext}'
+    if s_ext.lower() in ('.xlsx', '.xlsm'):
+        i_count = def_batch_xlsx(args.input, s_output, args.column, args.sheet, args.workers)
+    elif s_ext.lower() == '.csv':
+        i_count = def_batch_csv(args.input, s_output, args.column, args.workers, args.delimiter)
+    elif s_ext.lower() in ('.jsonl', '.json'):
+        i_count = def_batch_jsonl(args.input, s_output, args.column, args.workers)
+    else:
+        raise SystemExit(f'Неподдерживаемый формат: {args.input} (ожидается .xlsx, .csv или .jsonl)')
+    print(f'Обработано строк: {i_count}. Результат: {s_output}')
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    while True:
+        s_MVEL: str = input('Введите MVEL-выражение: ')
+        print(def_debalans(s_MVEL))
@@ -0,0 +1,258 @@
+'''
+Пакетная обработка MVEL-выражений из выгрузки объектной модели ZIIoT.
+
+Читает выгрузку (xlsx со столбцом "Configuration" или JSONL), обрабатывает каждое выражение ядром mvel_engine
+в параллельных процессах и записывает один сводный отчет (xlsx, JSONL или txt) с исправленным и отформатированным
+кодом, списками переменных и диагностикой по каждому тегу. Промежуточные файлы input.txt / output_*.txt
+не используются.
+
+Примеры:
+    python mvel_batch.py export.xlsx -o report.xlsx
+    python mvel_batch.py export.xlsx --column Configuration --sheet Tags -o report.jsonl --workers 8
+    python mvel_batch.py expressions.jsonl -o report.txt --cache mvel_cache.sqlite
+'''
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from mvel_cache import MVELCache
+from mvel_engine import MVELConfig, MVELEngine, MVELResult
+
+# Ограничение длины текста в ячейке Excel
+I_EXCEL_CELL_MAX: int = 32767
+# Столбцы сводного отчета xlsx: (заголовок, функция получения значения из результата)
+LST_XLSX_COLUMNS: List[Tuple[str, Any]] = [
+    ('tagId', lambda r: r.config.tag_id if r.config else ''),
+    ('Требует внимания', lambda r: 'Да' if r.has_errors else ''),
+    ('MVEL-выражение', lambda r: r.code),
+    ('Отформатированное выражение', lambda r: r.code_formatted),
+    ('Атрибуты выражения', lambda r: r.var_global),
+    ('Локальные переменные', lambda r: r.var_local.strip()),
+    ('Без явно указанного типа данных', lambda r: ', '.join(r.undefined_var)),
+    ('Нигде не объявлены', lambda r: ', '.join(r.not_declared_var)),
+    ('Результат работы выражения', lambda r: r.mvel_result),
+    ('Ошибки в вещественных числах', lambda r: r.incorrect_numbers),
+    ('Несовпадение скобок', lambda r: r.brackets.strip()),
+    ('Несовпадение кавычек', lambda r: r.quotes.strip()),
+    ('Присваивание в условии if', lambda r: r.if_assign.strip()),
+    ('Скобки на краях условия if', lambda r: r.if_edge_brackets.strip()),
+    ('Скобки внутри условия if', lambda r: r.if_inner_brackets.strip()),
+    ('Ошибка обработки', lambda r: r.error),
+]
+
+def def_analyze_item(s_code: str) -> Dict[str, Any]:
+    '''
+    Воркер: анализ текста одного выражения (результат не зависит от атрибутов тега)
+
+    :param s_code: MVEL-выражение
+    :return: Результат MVELEngine.analyze_expression
+    '''
+    return MVELEngine.analyze_expression(s_code)
+
+
+def def_read_xlsx(s_path: str, s_column: str, s_sheet: Optional[str]) -> Iterator[Tuple[int, str]]:
+    '''
+    Чтение выгрузки ОМ ZIIoT из xlsx
+
+    :param s_path: Путь к файлу
+    :param s_column: Заголовок столбца с MVEL-выражением или Json-записью
+    :param s_sheet: Имя листа (по умолчанию активный)
+    :return: Пары (номер строки, текст) для непустых ячеек
+    '''
+    import openpyxl
+
+    wb = openpyxl.load_workbook(s_path, read_only=True, data_only=True)
+    try:
+        ws = wb[s_sheet] if s_sheet else wb.active
+        rows = ws.iter_rows(values_only=True)
+        lst_header = [str(v).strip() if v is not None else '' for v in next(rows, ())]
+        if s_column not in lst_header:
+            raise SystemExit(f'Столбец "{s_column}" не найден на листе "{ws.title}". '
+                             f'Заголовки: {", ".join(h for h in lst_header if h)}')
+        i_col = lst_header.index(s_column)
+        for i_row, row in enumerate(rows, start=2):
+            if i_col < len(row) and row[i_col] is not None and str(row[i_col]).strip():
+                yield i_row, str(row[i_col])
+    finally:
+        wb.close()
+
+
+def def_read_jsonl(s_path: str, s_column: str) -> Iterator[Tuple[int, str]]:
+    '''
+    Чтение выгрузки из JSONL. Строка файла может быть:
+        - объектом со столбцом s_column (строка или объект с Json-записью),
+        - самой Json-записью (объект с ключом "expression"),
+        - строкой Json с MVEL-выражением.
+
+    :param s_path: Путь к файлу
+    :param s_column: Ключ с MVEL-выражением или Json-записью
+    :return: Пары (номер строки, текст)
+    '''
+    with open(s_path, 'r', encoding='utf-8') as file:
+        for i_row, s_line in enumerate(file, start=1):
+            if not s_line.strip():
+                continue
+            value = json.loads(s_line)
+            if isinstance(value, dict) and s_column in value:
+                value = value[s_column]
+            if isinstance(value, dict):
+                yield i_row, json.dumps(value, ensure_ascii=False)
+            elif value is not None:
+                yield i_row, str(value)
+
+
+def def_read_input(s_path: str, s_column: str, s_sheet: Optional[str]) -> List[Tuple[int, str]]:
+    if s_path.lower().endswith(('.xlsx', '.xlsm')):
+        return list(def_read_xlsx(s_path, s_column, s_sheet))
+    if s_path.lower().endswith(('.jsonl', '.json')):
+        return list(def_read_jsonl(s_path, s_column))
+    raise SystemExit(f'Неподдерживаемый формат выгрузки: {s_path} (ожидается .xlsx или .jsonl)')
+
+
+def def_analyze_all(lst_items: List[Tuple[int, str]], i_workers: int,
+                    cache: MVELCache) -> Iterator[Tuple[int, MVELResult]]:
+    '''
+    Обрабатывает выражения с сохранением порядка выгрузки. Одинаковые выражения (с точностью до пробелов)
+    анализируются один раз, выражения из кэша не анализируются; остальные - в параллельных процессах
+
+    :param lst_items: Пары (номер строки, текст)
+    :param i_workers: Количество процессов (1 - последовательная обработка)
+    :param cache: Кэш результатов анализа выражений
+    '''
+    engine = MVELEngine(cache)
+    # Результаты анализа по ключу кэша и выражения, которые нужно проанализировать
+    dict_payloads: Dict[str, Dict[str, Any]] = {}
+    dict_pending: Dict[str, str] = {}
+    # (номер строки, текст, запись выгрузки, ключ кэша, повтор выражения в пакете)
+    lst_plan: List[Tuple[int, str, Optional[MVELConfig], str, bool]] = []
+    for i_row, s_text in lst_items:
+        config: Optional[MVELConfig] = MVELConfig.from_text(s_text)
+        s_code: str = config.expression if config is not None else s_text
+        if not s_code.strip():
+            lst_plan.append((i_row, s_text, config, '', False))
+            continue
+        s_key: str = cache.key(s_code)
+        b_repeat: bool = s_key in dict_payloads or s_key in dict_pending
+        if not b_repeat:
+            dict_payload = cache.get(s_code)
+            if dict_payload is None:
+                dict_pending[s_key] = s_code
+            else:
+                dict_payloads[s_key] = dict_payload
+        lst_plan.append((i_row, s_text, config, s_key, b_repeat))
+
+    lst_codes: List[str] = list(dict_pending.values())
+    if i_workers <= 1 or len(lst_codes) <= 1:
+        lst_payloads = map(def_analyze_item, lst_codes)
+        pool = None
+    else:
+        # Крупные пакеты снижают накладные расходы на передачу тысяч коротких выражений между процессами
+        i_chunksize: int = max(1, len(lst_codes) // (i_workers * 8))
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=i_workers)
+        lst_payloads = pool.map(def_analyze_item, lst_codes, chunksize=i_chunksize)
+    try:
+        for s_key, s_code, dict_payload in zip(dict_pending, lst_codes, lst_payloads):
+            cache.put(s_code, dict_payload)
+            dict_payloads[s_key] = dict_payload
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for i_row, s_text, config, s_key, b_repeat in lst_plan:
+        if not s_key:
+            yield i_row, engine.analyze(s_text, config)
+            continue
+        if b_repeat:
+            cache.record_hit(dict_payloads[s_key])
+        yield i_row, engine.make_result(s_text, config, dict_payloads[s_key])
+
+
+def def_cell(value: Any) -> str:
+    s_value: str = '' if value is None else str(value)
+    return s_value if len(s_value) <= I_EXCEL_CELL_MAX else s_value[:I_EXCEL_CELL_MAX - 3] + '...'
+
+
+class ReportWriter:
+    '''
+    Сводный отчет по всем выражениям. Формат определяется расширением файла: .xlsx, .jsonl или .txt
+    '''
+
+    def __init__(self, s_path: str):
+        self.s_path = s_path
+        self.s_format = os.path.splitext(s_path)[1].lower().lstrip('.')
+        if self.s_format not in ('xlsx', 'jsonl', 'txt'):
+            raise SystemExit(f'Неподдерживаемый формат отчета: {s_path} (ожидается .xlsx, .jsonl или .txt)')
+        self._wb = self._ws = self._file = None
+
+    def __enter__(self) -> 'ReportWriter':
+        if self.s_format == 'xlsx':
+            import openpyxl
+            # Потоковая запись: строки сразу уходят в файл
+            self._wb = openpyxl.Workbook(write_only=True)
+            self._ws = self._wb.create_sheet('MVEL')
+            self._ws.append(['Строка выгрузки'] + [s_title for s_title, _ in LST_XLSX_COLUMNS])
+        else:
+            self._file = open(self.s_path, 'w', encoding='utf-8')
+        return self
+
+    def write(self, i_row: int, result: MVELResult):
+        if self.s_format == 'xlsx':
+            self._ws.append([i_row] + [def_cell(get_value(result)) for _, get_value in LST_XLSX_COLUMNS])
+        elif self.s_format == 'jsonl':
+            dict_out: Dict[str, Any] = {'row': i_row}
+            dict_out.update(result.to_dict())
+            self._file.write(json.dumps(dict_out, ensure_ascii=False) + '\n')
+        else:
+            s_tag: str = f' ({result.config.tag_id})' if result.config and result.config.tag_id else ''
+            self._file.write(f'{"=" * 24} Строка {i_row}{s_tag} {"=" * 24}\n')
+            self._file.write(result.info_text())
+            if result.code_formatted:
+                self._file.write('Отформатированное выражение:\n' + result.code_formatted + '\n')
+
+    def __exit__(self, *exc):
+        if self._wb is not None:
+            self._wb.save(self.s_path)
+        if self._file is not None:
+            self._file.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Пакетная обработка MVEL-выражений из выгрузки ОМ ZIIoT')
+    parser.add_argument('input', help='Выгрузка: .xlsx или .jsonl')
+    parser.add_argument('--output', '-o', help='Сводный отчет: .xlsx, .jsonl или .txt', default='mvel_report.xlsx')
+    parser.add_argument('--column', '-c', help='Столбец (ключ JSONL) с MVEL-выражением или Json-записью',
+                        default='Configuration')
+    parser.add_argument('--sheet', '-s', help='Лист xlsx (по умолчанию активный)', default=None)
+    parser.add_argument('--workers', '-w', help='Количество процессов (1 - последовательно)',
+                        type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--cache', help='Файл SQLite для хранения результатов анализа между запусками', default=None)
+    args = parser.parse_args(argv)
+
+    f_start: float = time.perf_counter()
+    lst_items = def_read_input(args.input, args.column, args.sheet)
+    print(f'Выражений в выгрузке: {len(lst_items)}')
+
+    i_errors: int = 0
+    cache = MVELCache(args.cache)
+    try:
+        with ReportWriter(args.output) as writer:
+            for i_row, result in def_analyze_all(lst_items, args.workers, cache):
+                writer.write(i_row, result)
+                i_errors += result.has_errors
+    finally:
+        cache.close()
+
+    f_elapsed: float = time.perf_counter() - f_start
+    f_rate: float = len(lst_items) / f_elapsed if f_elapsed > 0 else 0.0
+    print(f'Готово за {f_elapsed:.1f} с ({f_rate:.0f} выражений/с). Требуют внимания: {i_errors}. '
+          f'Отчет: {args.output}')
+    print(cache.stats_text())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
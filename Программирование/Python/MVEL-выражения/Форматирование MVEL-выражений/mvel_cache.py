@@ -0,0 +1,121 @@
+'''
+Кэш результатов анализа MVEL-выражений.
+
+В объектной модели ZIIoT тысячи расчетных тегов используют одно и то же выражение и отличаются только атрибутами
+в "variables". Результат анализа самого выражения (исправленный и отформатированный код, переменные, результат
+работы, диагностика) от атрибутов не зависит, поэтому сохраняется по хэшу нормализованного текста выражения:
+выражения, отличающиеся только пробелами и переводами строк, анализируются один раз.
+
+Кэш хранится в памяти и, при указании файла, в SQLite - тогда он используется и между запусками.
+
+Пример:
+    cache = MVELCache('mvel_cache.sqlite')
+    engine = MVELEngine(cache=cache)
+    ...
+    print(cache.stats_text())
+    cache.close()
+'''
+import hashlib
+import json
+import sqlite3
+from typing import Any, Dict, Optional
+
+from mvel_lexer import def_render, def_tokenize
+
+
+def def_cache_key(s_code: str) -> str:
+    '''
+    Функция вычисления ключа кэша: SHA-1 нормализованной однострочной записи выражения
+
+    :param s_code: Строка с MVEL-выражением
+    :return: Ключ кэша
+    '''
+    return hashlib.sha1(def_render(def_tokenize(s_code)).encode('utf-8')).hexdigest()
+
+
+class MVELCache:
+    '''
+    Кэш результатов анализа выражений (см. MVELEngine.analyze_expression) в памяти и, при необходимости, в SQLite.
+    При изменении алгоритма анализа нужно увеличить SCHEMA_VERSION: сохраненные записи станут недействительными.
+    '''
+
+    SCHEMA_VERSION = '1'
+
+    def __init__(self, s_db_path: Optional[str] = None):
+        self.s_db_path = s_db_path
+        self.hits: int = 0
+        self.misses: int = 0
+        # Суммарное время анализа выражений, которые были взяты из кэша, с
+        self.f_saved: float = 0.0
+        # Ключ по нормализованному тексту -> результат анализа
+        self._dict_memory: Dict[str, Dict[str, Any]] = {}
+        # Исходный текст -> ключ (повторная нормализация одинаковых строк не требуется)
+        self._dict_keys: Dict[str, str] = {}
+        self.conn: Optional[sqlite3.Connection] = None
+        if s_db_path:
+            self.conn = sqlite3.connect(s_db_path)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, payload TEXT NOT NULL)')
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != self.SCHEMA_VERSION:
+                # Алгоритм анализа изменился - старые результаты непригодны
+                self.conn.execute('DELETE FROM entries')
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                                  (self.SCHEMA_VERSION,))
+            self.conn.commit()
+
+    def key(self, s_code: str) -> str:
+        s_key: Optional[str] = self._dict_keys.get(s_code)
+        if s_key is None:
+            s_key = self._dict_keys[s_code] = def_cache_key(s_code)
+        return s_key
+
+    def get(self, s_code: str) -> Optional[Dict[str, Any]]:
+        '''
+        Возвращает сохраненный результат анализа выражения или None
+        '''
+        s_key: str = self.key(s_code)
+        dict_payload: Optional[Dict[str, Any]] = self._dict_memory.get(s_key)
+        if dict_payload is None and self.conn is not None:
+            row = self.conn.execute('SELECT payload FROM entries WHERE key = ?', (s_key,)).fetchone()
+            if row is not None:
+                dict_payload = self._dict_memory[s_key] = json.loads(row[0])
+        if dict_payload is None:
+            self.misses += 1
+            return None
+        self.record_hit(dict_payload)
+        return dict_payload
+
+    def record_hit(self, dict_payload: Dict[str, Any]):
+        '''
+        Учитывает повторное использование результата анализа (в том числе повтор выражения в пакете)
+        '''
+        self.hits += 1
+        self.f_saved += dict_payload.get('seconds', 0.0)
+
+    def put(self, s_code: str, dict_payload: Dict[str, Any]):
+        '''
+        Сохраняет результат анализа выражения (результаты с ошибкой обработки не сохраняются)
+        '''
+        if dict_payload.get('error'):
+            return
+        s_key: str = self.key(s_code)
+        self._dict_memory[s_key] = dict_payload
+        if self.conn is not None:
+            self.conn.execute('INSERT OR REPLACE INTO entries (key, payload) VALUES (?, ?)',
+                              (s_key, json.dumps(dict_payload, ensure_ascii=False)))
+
+    @property
+    def hit_rate(self) -> float:
+        i_total: int = self.hits + self.misses
+        return self.hits / i_total if i_total else 0.0
+
+    def stats_text(self) -> str:
+        return (f'Кэш: попаданий {self.hits} из {self.hits + self.misses} ({self.hit_rate:.1%}), '
+                f'сэкономлено {self.f_saved:.2f} с анализа')
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
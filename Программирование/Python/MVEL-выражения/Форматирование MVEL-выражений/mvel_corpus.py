@@ -0,0 +1,380 @@
+'''
+Корпус MVEL-выражений для бенчмарка и регрессионной проверки обработки.
+
+Корпус генерируется детерминированно (одинаково при каждом запуске) по сетке параметров: глубина вложенности
+if / else, количество переменных, комментарии, строковые литералы, обертка в Json-запись выгрузки ОМ ZIIoT.
+В выражения с заданной вероятностью вносятся типовые ошибки (запятая в вещественном числе, "=" в условии if,
+пропущенные или лишние скобки условия, кавычка без пары), чтобы эталон покрывал и диагностику.
+
+Эталон (mvel_golden.jsonl) - результат MVELEngine.analyze по каждому выражению корпуса (MVELResult.to_dict).
+Длинные значения хранятся в виде хэша. Проверка сравнивает текущий результат с эталоном и завершается с кодом 1
+при расхождении: так ловятся изменения поведения при переписывании обработки.
+
+Бенчмарк замеряет функции обработки (команда "1") и этапы работы с лексемами на всем корпусе. С --sizes те же
+замеры выполняются на выражениях заданного размера, собранных тем же генератором без ошибок: при линейной сложности
+время на килобайт не растет с увеличением длины выражения.
+
+Примеры:
+    python mvel_corpus.py --update                     # записать эталон
+    python mvel_corpus.py                              # сравнить с эталоном
+    python mvel_corpus.py --bench --repeat 5           # выражений/с и время функций обработки
+    python mvel_corpus.py --bench --record bench.jsonl # то же с сохранением замера в историю
+    python mvel_corpus.py --sizes 1 4 16 64            # время на килобайт для выражений разной длины
+'''
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from mvel_engine import (DICT_TRIGGERTYPE_RUS, MVELConfig, MVELEngine, def_check_balance, def_code_correct,
+                         def_code_formatting, def_find_if_tokens, def_fix_numbers, def_format_tokens,
+                         def_pre_change_text, def_scan_identifiers, def_var_all)
+from mvel_lexer import def_render, def_tokenize
+
+# Сетка параметров корпуса
+LST_DEPTHS: List[int] = [0, 1, 3, 6]
+LST_VARIABLES: List[int] = [1, 8, 32]
+# Вероятность внести ошибку в число или условие if
+F_ERROR_RATE: float = 0.15
+# Эталон по умолчанию (рядом с программой)
+S_GOLDEN_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mvel_golden.jsonl')
+# Значения длиннее этого хранятся в эталоне в виде хэша
+I_GOLDEN_INLINE: int = 200
+LST_TYPES: List[str] = ['Double', 'Int', 'Long', 'Boolean', 'String']
+
+
+class _Generator:
+    '''
+    Генератор одного выражения корпуса
+    '''
+
+    def __init__(self, rnd: random.Random, i_variables: int, b_comments: bool, b_strings: bool,
+                 f_error_rate: float = F_ERROR_RATE):
+        self.rnd = rnd
+        self.i_variables = i_variables
+        self.b_comments = b_comments
+        self.b_strings = b_strings
+        self.f_error_rate = f_error_rate
+        self.i_comment: int = 0
+
+    def number(self) -> str:
+        s_number: str = f'{self.rnd.randint(0, 999)}.{self.rnd.randint(1, 99)}'
+        # Ошибка в десятичном разделителе
+        return s_number.replace('.', ',') if self.rnd.random() < self.f_error_rate else s_number
+
+    def local(self) -> str:
+        return f'V{self.rnd.randrange(self.i_variables)}'
+
+    def attribute(self) -> str:
+        return f'F{self.rnd.randrange(self.i_variables)}'
+
+    def comment(self) -> str:
+        if not self.b_comments or self.rnd.random() < 0.5:
+            return ''
+        self.i_comment += 1
+        if self.rnd.random() < 0.3:
+            return f'// комментарий {self.i_comment}\n'
+        return f'/* комментарий {self.i_comment}: a = b; if {{}} */ '
+
+    def declaration(self, i: int) -> str:
+        s_type: str = self.rnd.choice(LST_TYPES if self.b_strings else LST_TYPES[:-1])
+        if s_type == 'String':
+            s_value: str = self.rnd.choice([f"'строка {i}; {{x}}'", f'"значение = {i}"', "'it''s'"])
+        elif s_type == 'Boolean':
+            s_value = f'F{i} > {self.number()}'
+        else:
+            s_value = self.rnd.choice([f"Fn.avg($F{i}, '*-1h', '*') * {self.number()}", f'F{i} + {self.number()}',
+                                       f"Fn.badVal($F{i}, '*') ? 0 : F{i}"])
+        return f'{self.comment()}{s_type} V{i} = {s_value};'
+
+    def condition(self) -> str:
+        s_op: str = self.rnd.choice(['>', '<', '>=', '!=', '=='])
+        s_text: str = f'{self.local()} {s_op} {self.number()}'
+        if self.rnd.random() < 0.5:
+            s_text += f' {self.rnd.choice(["&&", "||"])} ({self.attribute()} != 0)'
+        if self.rnd.random() < self.f_error_rate:
+            # Присваивание вместо сравнения
+            s_text = s_text.replace(' == ', ' = ', 1).replace(' != ', ' = ', 1)
+        f_error: float = self.rnd.random()
+        if f_error < self.f_error_rate:
+            # Пропущены скобки на краях условия
+            return f'if {s_text} '
+        if f_error < self.f_error_rate * 1.3:
+            # Лишняя открывающая скобка
+            return f'if (({s_text}) '
+        return f'if ({s_text}) '
+
+    def statement(self) -> str:
+        if self.b_strings and self.rnd.random() < 0.3:
+            # Изредка - кавычка без пары
+            s_quote: str = '' if self.rnd.random() < self.f_error_rate * 0.3 else '"'
+            return f'R = "{self.local()} = нет данных; }}{s_quote};'
+        return f'R = {self.local()} {self.rnd.choice(["+", "-", "*", "/"])} {self.attribute()};'
+
+    def block_if(self, i_depth: int) -> str:
+        '''
+        Цепочка if / else if / else с вложенностью i_depth
+        '''
+        def body() -> str:
+            return self.block_if(i_depth - 1) if i_depth > 1 else self.statement()
+
+        s_text: str = f'{self.comment()}{self.condition()}{{{body()}}}'
+        for _ in range(self.rnd.randint(0, 2)):
+            s_text += f' else {self.condition()}{{{body()}}}'
+        if self.rnd.random() < 0.7:
+            s_text += f' else {{{body()}}}'
+        return s_text + ';'
+
+    def expression(self, i_depth: int) -> str:
+        lst_parts: List[str] = [self.declaration(i) for i in range(self.i_variables)]
+        lst_parts.append('Double R = 0;')
+        if i_depth:
+            lst_parts.append(self.block_if(i_depth))
+        lst_parts.append('R')
+        return ' '.join(lst_parts)
+
+
+def def_json_wrapper(rnd: random.Random, s_name: str, s_code: str, i_variables: int) -> str:
+    '''
+    Функция обертки выражения в Json-запись выгрузки ОМ ZIIoT (поле "Configuration")
+    '''
+    s_trigger: str = rnd.choice(list(DICT_TRIGGERTYPE_RUS))
+    dict_json: Dict[str, Any] = {
+        'tagId': f'CORPUS.{s_name}',
+        # Часть атрибутов выгрузки не используется в выражении, часть атрибутов выражения отсутствует в выгрузке
+        'variables': [{'type': 'propertyId', 'alias': f'F{i}', 'value': f'Модель\\Цех\\Тег {i}|Значение',
+                       'isTrigger': i == 0} for i in range(i_variables + 1) if rnd.random() < 0.9],
+        'expression': s_code,
+        'isFlowCalc': rnd.random() < 0.5,
+        'triggerType': s_trigger,
+        'calculationType': 'mvelExpression',
+    }
+    if s_trigger == 'Periodic':
+        dict_json['offsetInSeconds'] = rnd.choice([0, 300, 75900])
+        dict_json['periodInSeconds'] = rnd.choice([60, 3600, 86400])
+    return json.dumps(dict_json, ensure_ascii=False)
+
+
+def def_make_corpus() -> List[Tuple[str, str]]:
+    '''
+    Функция генерации корпуса по сетке параметров
+
+    :return: Пары (имя, MVEL-выражение или Json-запись). Имя кодирует параметры: d<глубина>_v<переменные>,
+             "c" - комментарии, "s" - строки, "j" - Json-запись
+    '''
+    lst_corpus: List[Tuple[str, str]] = []
+    for i_depth, i_variables, b_comments, b_strings, b_json in itertools.product(
+            LST_DEPTHS, LST_VARIABLES, (False, True), (False, True), (False, True)):
+        s_name: str = (f'd{i_depth}_v{i_variables}' + '_c' * b_comments + '_s' * b_strings + '_j' * b_json)
+        # Генератор инициализируется именем: выражение не зависит от состава и порядка корпуса
+        rnd = random.Random(s_name)
+        s_code: str = _Generator(rnd, i_variables, b_comments, b_strings).expression(i_depth)
+        lst_corpus.append((s_name, def_json_wrapper(rnd, s_name, s_code, i_variables) if b_json else s_code))
+    return lst_corpus
+
+
+def def_make_sized_expression(i_size_kb: int) -> str:
+    '''
+    Функция сборки выражения заданного размера из выражений генератора корпуса (без ошибок, чтобы непарная
+    кавычка или скобка не превращала остаток текста в одну лексему)
+
+    :param i_size_kb: Размер в килобайтах
+    :return: Строка MVEL-выражения
+    '''
+    lst_parts: List[str] = []
+    i_len: int = 0
+    while i_len < i_size_kb * 1024:
+        s_name: str = f'size_{len(lst_parts)}'
+        # Результат ("R" в конце) - только у последнего выражения
+        s_part: str = _Generator(random.Random(s_name), 8, True, True, 0.0).expression(3)[:-1]
+        lst_parts.append(s_part)
+        i_len += len(s_part)
+    return ''.join(lst_parts) + 'R'
+
+
+def def_digest(value: Any) -> Any:
+    '''
+    Функция приведения значения к виду для эталона: длинные значения заменяются хэшем
+    '''
+    s_json: str = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    if len(s_json) <= I_GOLDEN_INLINE:
+        return value
+    return 'sha1:' + hashlib.sha1(s_json.encode('utf-8')).hexdigest()
+
+
+def def_golden_record(s_name: str, s_text: str, engine: MVELEngine) -> Dict[str, Any]:
+    '''
+    Функция формирования записи эталона
+
+    :param s_name: Имя выражения корпуса
+    :param s_text: MVEL-выражение или Json-запись
+    :param engine: Ядро обработки
+    :return: Имя, хэш исходной строки и поля результата обработки
+    '''
+    dict_result: Dict[str, Any] = engine.analyze(s_text).to_dict()
+    return {'name': s_name, 'source': def_digest(s_text),
+            'result': {key: def_digest(value) for key, value in dict_result.items()}}
+
+
+def def_check(lst_corpus: List[Tuple[str, str]], s_path: str) -> int:
+    '''
+    Функция сравнения результатов обработки корпуса с эталоном
+
+    :return: Количество выражений с расхождениями
+    '''
+    with open(s_path, 'r', encoding='utf-8') as file:
+        dict_golden: Dict[str, Dict[str, Any]] = {d['name']: d for d in map(json.loads, file) if d}
+    engine = MVELEngine()
+    i_failed: int = 0
+    for s_name, s_text in lst_corpus:
+        dict_expected: Optional[Dict[str, Any]] = dict_golden.pop(s_name, None)
+        dict_actual: Dict[str, Any] = def_golden_record(s_name, s_text, engine)
+        if dict_expected is None:
+            print(f'{s_name}: нет в эталоне')
+            i_failed += 1
+            continue
+        if dict_expected['source'] != dict_actual['source']:
+            print(f'{s_name}: изменился текст выражения корпуса (обновите эталон: --update)')
+            i_failed += 1
+            continue
+        lst_fields: List[str] = [key for key in dict_expected['result'].keys() | dict_actual['result'].keys()
+                                 if dict_expected['result'].get(key) != dict_actual['result'].get(key)]
+        if lst_fields:
+            print(f'{s_name}: расхождение в полях {", ".join(sorted(lst_fields))}')
+            i_failed += 1
+    for s_name in dict_golden:
+        print(f'{s_name}: нет в корпусе')
+        i_failed += 1
+    return i_failed
+
+
+def def_stages(lst_corpus: List[Tuple[str, str]]) -> Dict[str, Tuple[Callable, List[str]]]:
+    '''
+    Функции обработки и их входные данные по всему корпусу (каждая получает результат предыдущих этапов,
+    как в команде "1")
+    '''
+    lst_sources: List[str] = [s_text for _, s_text in lst_corpus]
+    lst_codes: List[str] = [config.expression if config is not None else s_text
+                            for s_text, config in zip(lst_sources, map(MVELConfig.from_text, lst_sources))]
+    lst_correct: List[str] = [def_code_correct(s_code)[0] for s_code in lst_codes]
+    lst_tokens: List[list] = list(map(def_tokenize, lst_codes))
+    lst_tokens_if: List[list] = [def_find_if_tokens(def_fix_list(tokens))[0] for tokens in lst_tokens]
+    engine = MVELEngine()
+    return {
+        'def_pre_change_text': (def_pre_change_text, lst_codes),
+        'def_code_correct': (def_code_correct, lst_codes),
+        'def_var_all': (def_var_all, lst_correct),
+        'def_code_formatting': (def_code_formatting, lst_correct),
+        'MVELEngine.analyze': (engine.analyze, lst_sources),
+        # Этапы работы с лексемами
+        'def_tokenize': (def_tokenize, lst_codes),
+        'def_check_balance': (def_check_balance, lst_tokens),
+        'def_fix_numbers': (def_fix_list, lst_tokens),
+        'def_find_if_tokens': (def_find_if_tokens, lst_tokens),
+        'def_format_tokens': (def_format_tokens, lst_tokens_if),
+        'def_render': (def_render, lst_tokens_if),
+        'def_scan_identifiers': (def_scan_identifiers, lst_tokens_if),
+    }
+
+
+def def_fix_list(lst_tokens: list) -> list:
+    '''
+    Функция исправления чисел в копии списка лексем (def_fix_numbers изменяет список)
+    '''
+    lst_tokens = list(lst_tokens)
+    def_fix_numbers(lst_tokens)
+    return lst_tokens
+
+
+def def_bench(lst_corpus: List[Tuple[str, str]], i_repeat: int) -> Dict[str, Dict[str, float]]:
+    '''
+    Функция замера времени функций обработки на корпусе (лучшее из i_repeat прогонов по всему корпусу)
+
+    :return: Для каждой функции: время прогона, с, выражений/с и мкс на килобайт текста корпуса
+    '''
+    dict_out: Dict[str, Dict[str, float]] = {}
+    # Размер считается по тексту корпуса: на вход части функций подаются лексемы
+    f_kb: float = sum(len(s_text) for _, s_text in lst_corpus) / 1024
+    for s_stage, (func, lst_input) in def_stages(lst_corpus).items():
+        f_best: float = float('inf')
+        for _ in range(i_repeat):
+            f_start: float = time.perf_counter()
+            for s_text in lst_input:
+                func(s_text)
+            f_best = min(f_best, time.perf_counter() - f_start)
+        dict_out[s_stage] = {'seconds': f_best, 'expr_per_s': len(lst_input) / f_best if f_best else 0.0,
+                             'us_per_kb': f_best * 1e6 / f_kb if f_kb else 0.0}
+    return dict_out
+
+
+def def_bench_sizes(lst_sizes: List[int], i_repeat: int) -> Dict[str, List[float]]:
+    '''
+    Функция замера времени на килобайт для выражений разного размера (см. def_make_sized_expression)
+
+    :return: Для каждой функции: мкс на килобайт в порядке lst_sizes
+    '''
+    dict_out: Dict[str, List[float]] = {}
+    for i_size_kb in lst_sizes:
+        lst_corpus: List[Tuple[str, str]] = [(f'size_{i_size_kb}', def_make_sized_expression(i_size_kb))]
+        for s_stage, dict_value in def_bench(lst_corpus, i_repeat).items():
+            dict_out.setdefault(s_stage, []).append(dict_value['us_per_kb'])
+    return dict_out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Корпус MVEL-выражений: проверка по эталону и бенчмарк')
+    parser.add_argument('--golden', help='Файл эталона (JSONL)', default=S_GOLDEN_PATH)
+    parser.add_argument('--update', help='Записать эталон по текущим результатам', action='store_true')
+    parser.add_argument('--bench', help='Замерить время функций обработки', action='store_true')
+    parser.add_argument('--repeat', help='Количество прогонов бенчмарка (выводится лучшее время)', type=int, default=3)
+    parser.add_argument('--sizes', help='Замерить время на килобайт для выражений заданных размеров, КБ',
+                        type=int, nargs='+', default=None)
+    parser.add_argument('--record', help='Дописать результат бенчмарка в файл истории (JSONL)', default=None)
+    args = parser.parse_args(argv)
+
+    lst_corpus: List[Tuple[str, str]] = def_make_corpus()
+    i_size: int = sum(len(s_text) for _, s_text in lst_corpus)
+    print(f'Корпус: {len(lst_corpus)} выражений, {i_size / 1024:.0f} КБ')
+
+    if args.update:
+        engine = MVELEngine()
+        with open(args.golden, 'w', encoding='utf-8') as file:
+            for s_name, s_text in lst_corpus:
+                file.write(json.dumps(def_golden_record(s_name, s_text, engine), ensure_ascii=False) + '\n')
+        print(f'Эталон записан: {args.golden}')
+    else:
+        i_failed: int = def_check(lst_corpus, args.golden)
+        print(f'Расхождений с эталоном: {i_failed} из {len(lst_corpus)}')
+        if i_failed:
+            return 1
+
+    dict_record: Dict[str, Any] = {}
+    if args.bench:
+        dict_bench: Dict[str, Dict[str, float]] = def_bench(lst_corpus, args.repeat)
+        print(f'{"Функция":<22}{"Время, мс":>12}{"Выражений/с":>14}{"мкс/КБ":>10}')
+        for s_stage, dict_value in dict_bench.items():
+            print(f'{s_stage:<22}{dict_value["seconds"] * 1000:>12.1f}{dict_value["expr_per_s"]:>14.0f}'
+                  f'{dict_value["us_per_kb"]:>10.1f}')
+        dict_record.update(expressions=len(lst_corpus), bytes=i_size, stages=dict_bench)
+    if args.sizes:
+        dict_sizes: Dict[str, List[float]] = def_bench_sizes(args.sizes, args.repeat)
+        print('Время на 1 КБ выражения, мкс (при линейной сложности не растет с размером)')
+        print(f'{"Функция":<22}' + ''.join(f'{str(i) + " КБ":>12}' for i in args.sizes))
+        for s_stage, lst_values in dict_sizes.items():
+            print(f'{s_stage:<22}' + ''.join(f'{f_value:>12.1f}' for f_value in lst_values))
+        dict_record.update(sizes_kb=args.sizes, us_per_kb_by_size=dict_sizes)
+    if args.record and dict_record:
+        with open(args.record, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                   'python': platform.python_version(), **dict_record}, ensure_ascii=False) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
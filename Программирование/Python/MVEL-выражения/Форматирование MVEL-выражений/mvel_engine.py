@@ -0,0 +1,868 @@
+'''
+Реентерабельное ядро анализа и форматирования MVEL-выражений.
+
+Содержит тот же алгоритм, что и интерактивная программа "MVEL_formatting v1.1.0 (11.08.2024).py", но без
+глобальных переменных и файлового ввода-вывода: результат обработки одного выражения (исправленный код,
+отформатированный код, списки переменных и диагностика) возвращается объектом MVELResult.
+Это позволяет обрабатывать тысячи выражений подряд или параллельно в нескольких процессах (см. mvel_batch.py).
+
+Пример:
+    engine = MVELEngine()
+    result = engine.analyze("Double X = A + B*2,5; X")
+    print(result.info_text())
+'''
+# Для работы с регулярными выражениями
+import re
+# Для работы с выгрузкой из ОМ ZIIoT, которая имеет запись в формате Json
+import json
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+# Лексический анализ MVEL-выражений
+# Кэш результатов анализа выражений
+from mvel_cache import MVELCache
+from mvel_lexer import CLOSE, COMMENT, NAME, NUMBER, OP, OPEN, STRING, UNTERMINATED, Token, def_render, def_tokenize
+
+# Типы данных локальных переменных (в нижнем регистре)
+LST_DATA_TYPES: List[str] = ['boolean', 'byte', 'char', 'double', 'float', 'int', 'long', 'short', 'string']
+# Ключевые слова, которые не являются переменными (в нижнем регистре)
+SET_KEYWORDS: frozenset = frozenset(LST_DATA_TYPES + ['else', 'false', 'if', 'null', 'return', 'true', 'and', 'or',
+                                                     'import'])
+# Строка-рамка вокруг сообщений, требующих внимания пользователя
+S_ERROR_FRAME: str = '▼▲' * 24
+# Перевод типа запуска выражения из выгрузки ОМ ZIIoT
+DICT_TRIGGERTYPE_RUS: Dict[str, str] = {'Periodic': 'Периодический',
+                                        'ListenData': 'Потоковый (по изменению любого атрибута)',
+                                        'ByTrigger': 'По триггеру (по изменению выбранных атрибутов)',
+                                        'OnDemand': 'По запросу'}
+# Поля MVELResult, которые зависят только от текста выражения (сохраняются в кэше)
+LST_EXPRESSION_FIELDS: List[str] = ['code', 'code_formatted', 'var_all', 'var_local', 'dict_var_local', 'mvel_result',
+                                    'incorrect_numbers', 'brackets', 'quotes', 'if_assign', 'if_edge_brackets',
+                                    'if_inner_brackets']
+# Экспонента в записи числа: "1.5e3" -> "1.5E3"
+_RE_EXPONENT = re.compile(r'([0-9])e([+-]?\d+)')
+
+
+# ---------------------
+# Структуры данных
+# ---------------------
+@dataclass
+class MVELConfig:
+    '''
+    Запись из выгрузки ОМ ZIIoT (поле "Configuration") с MVEL-выражением расчетного тега
+    '''
+    tag_id: str = ''
+    variables: List[Dict[str, Any]] = field(default_factory=list)
+    expression: str = ''
+    is_flow_calc: bool = False
+    trigger_type: str = ''
+    offset_in_seconds: int = 0
+    period_in_seconds: int = 0
+
+    @classmethod
+    def from_dict(cls, dict_json: Dict[str, Any]) -> 'MVELConfig':
+        return cls(tag_id=dict_json.get('tagId') or '',
+                   variables=dict_json.get('variables') or [],
+                   expression=dict_json.get('expression') or '',
+                   is_flow_calc=bool(dict_json.get('isFlowCalc', False)),
+                   trigger_type=dict_json.get('triggerType') or '',
+                   offset_in_seconds=dict_json.get('offsetInSeconds') or 0,
+                   period_in_seconds=dict_json.get('periodInSeconds') or 0)
+
+    @classmethod
+    def from_text(cls, s_text: str) -> Optional['MVELConfig']:
+        '''
+        Разбирает строку выгрузки ОМ ZIIoT
+
+        :param s_text: Строка, предположительно, с Json
+        :return: MVELConfig или None, если строка не является Json-объектом
+        '''
+        try:
+            dict_json = json.loads(s_text)
+        except ValueError:
+            return None
+        return cls.from_dict(dict_json) if isinstance(dict_json, dict) else None
+
+    def triggertype_rus(self) -> str:
+        '''
+        Тип запуска выражения на русском языке (для периодического запуска - с периодом и сдвигом)
+        '''
+        s_text: str = DICT_TRIGGERTYPE_RUS.get(self.trigger_type, self.trigger_type)
+        if self.trigger_type == 'Periodic':
+            s_text += (' [Период: ' + def_second_to_str(self.period_in_seconds) +
+                       '; Сдвиг: ' + def_second_to_str(self.offset_in_seconds) + ']')
+        return s_text
+
+
+@dataclass
+class MVELIdentifiers:
+    '''
+    Индекс идентификаторов MVEL-выражения: в каких ролях встречается каждое имя (строится за один проход по лексемам)
+    '''
+    # Встречается как значение (не вызов функции и не ключевое слово)
+    used: Set[str] = field(default_factory=set)
+    # Стоит слева или справа от точки (Fn.max, x.y)
+    member: Set[str] = field(default_factory=set)
+    # Вызов функции: имя перед "("
+    call: Set[str] = field(default_factory=set)
+    # Присваивание: имя перед "="
+    assigned: Set[str] = field(default_factory=set)
+    # Объявленные локальные переменные с группировкой по типу данных
+    dict_declared: Dict[str, Set[str]] = field(default_factory=lambda: {key: set() for key in LST_DATA_TYPES})
+
+    @property
+    def declared(self) -> Set[str]:
+        return set().union(*self.dict_declared.values())
+
+    @property
+    def var_all(self) -> List[str]:
+        '''
+        Все переменные выражения, кроме членов объектов, отсортированные без учета регистра
+        '''
+        return sorted(self.used - self.member, key=lambda s: (s.lower(), s))
+
+    def dict_var_local(self) -> Dict[str, List[str]]:
+        '''
+        Словарь локальных переменных по типам данных (имена отсортированы)
+        '''
+        return {key: sorted(value) for key, value in self.dict_declared.items()}
+
+    def update(self, other: 'MVELIdentifiers'):
+        '''
+        Объединение с индексом другой части выражения
+        '''
+        self.used |= other.used
+        self.member |= other.member
+        self.call |= other.call
+        self.assigned |= other.assigned
+        for key, value in other.dict_declared.items():
+            self.dict_declared[key] |= value
+
+
+class IfCondition(NamedTuple):
+    '''
+    Результат проверки логического выражения одного блока if
+    '''
+    # Исходное и исправленное логическое выражение
+    text: str
+    text_fixed: str
+    # Оператор присваивания вместо сравнения
+    b_assign: bool
+    # Пропущенная скобка на краях условия
+    b_edge: bool
+    # Пропущенные скобки внутри условия по видам
+    brackets: str
+
+
+@dataclass
+class MVELResult:
+    '''
+    Результат обработки одного MVEL-выражения
+    '''
+    # Исходная строка (MVEL-выражение или запись из выгрузки ОМ ZIIoT)
+    source: str = ''
+    config: Optional[MVELConfig] = None
+    # Исправленное однострочное выражение
+    code: str = ''
+    # Отформатированное выражение (содержимое output_format.txt)
+    code_formatted: str = ''
+    # Все переменные выражения
+    var_all: str = ''
+    # Атрибуты выражения (глобальные переменные)
+    var_global: str = ''
+    # Локальные переменные, объявленные явно (текст и словарь по типам данных)
+    var_local: str = ''
+    dict_var_local: Dict[str, List[str]] = field(default_factory=dict)
+    # Переменные без явно указанного типа данных
+    undefined_var: List[str] = field(default_factory=list)
+    # Переменные, которые нигде не объявлены
+    not_declared_var: List[str] = field(default_factory=list)
+    # Результат работы выражения
+    mvel_result: str = ''
+    # Диагностика: ошибки в вещественных числах, скобках, кавычках и условиях if
+    incorrect_numbers: str = ''
+    brackets: str = ''
+    quotes: str = ''
+    if_assign: str = ''
+    if_edge_brackets: str = ''
+    if_inner_brackets: str = ''
+    # Ошибка обработки (исключение или отсутствие выражения)
+    error: str = ''
+
+    @property
+    def has_errors(self) -> bool:
+        '''
+        Есть сообщения, требующие внимания пользователя (выводятся в рамке)
+        '''
+        return bool(self.incorrect_numbers or self.brackets or self.quotes or self.if_assign or
+                    self.not_declared_var or self.error)
+
+    def info_text(self) -> str:
+        '''
+        Обобщенная статистика по выражению (содержимое output_info.txt)
+        '''
+        lst_out: List[str] = ['MVEL-выражение:\n', self.code, '\n\n']
+        if self.has_errors:
+            lst_out.append(S_ERROR_FRAME + '\n')
+        if self.error:
+            lst_out += ['░ ► Ошибка обработки:\n', '░\t' + self.error, '\n░\n']
+        if self.incorrect_numbers:
+            lst_out += ['░ ► [Исправлено] Обнаружены ошибки в десятичном разделителе вещественных числах:\n',
+                        '░\t' + self.incorrect_numbers, '\n░\n']
+        for s_title, s_text in (('░ ► Обнаружено несовпадение количества скобок:\n', self.brackets),
+                                ('░ ► Обнаружено несовпадение количества кавычек:\n', self.quotes),
+                                ('░ ► [Исправлено] Обнаружен оператор присваивания вместо сравнения в логических '
+                                 'выражениях:\n', self.if_assign),
+                                ('░ ► [Исправлено] Обнаружены пропущенные скобки на краях логических выражений:\n',
+                                 self.if_edge_brackets),
+                                ('░ ► Обнаружены пропущенные скобки внутри логических выражений:\n',
+                                 self.if_inner_brackets)):
+            if s_text:
+                lst_out += [s_title, '\n'.join(f'░\t{line}' for line in s_text.splitlines()), '\n░\n']
+        if self.not_declared_var:
+            lst_out += ['░ ► Переменные, которые нигде не объявлены:\n',
+                        '░\t' + ', '.join(self.not_declared_var), '\n░\n']
+        if self.has_errors:
+            lst_out.append(S_ERROR_FRAME + '\n\n')
+
+        if self.config and self.config.tag_id:
+            lst_out += ['Запись в тег:\n', '\t' + self.config.tag_id, '\n\n']
+        if self.config and self.config.trigger_type:
+            lst_out += ['Тип запуска:\n', '\t' + self.config.triggertype_rus(), '\n\n']
+        if self.var_global:
+            if self.config is not None:
+                s_var_global = '\n'.join(f'\t{line}' for line in self.var_global.splitlines())
+            else:
+                s_var_global = '\t' + self.var_global
+            lst_out += ['Атрибуты выражения:\n', s_var_global, '\n\n']
+        if self.var_local:
+            lst_out += ['Локальные переменные:\n', self.var_local, '\n\n']
+        if self.undefined_var:
+            lst_out += ['Локальные переменные без явно указанного типа данных:\n',
+                        '\t' + ', '.join(self.undefined_var), '\n\n']
+        if self.mvel_result:
+            lst_out += ['Результат работы выражения:\n', '\t' + self.mvel_result, '\n\n']
+        return ''.join(lst_out)
+
+    def to_dict(self) -> Dict[str, Any]:
+        '''
+        Словарь для сериализации в Json (без исходной строки)
+        '''
+        dict_out = asdict(self)
+        dict_out.pop('source')
+        dict_out['has_errors'] = self.has_errors
+        return dict_out
+
+
+# ---------------------
+# Функции обработки
+# ---------------------
+def def_pre_change_text(s_text: str) -> str:
+    '''
+    Функция для предварительной обработки строки: однострочная запись с единообразными пробелами вокруг операторов
+    и скобок. Текст внутри кавычек и комментариев не изменяется.
+
+    :param s_text: Исходная строка
+    :return: Возвращает измененную строку
+    '''
+    return def_render(def_tokenize(s_text))
+
+
+def def_count_balance(lst_tokens: List[Token]) -> Dict[str, int]:
+    '''
+    Функция подсчета скобок и кавычек по видам (скобки внутри строк и комментариев не учитываются)
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Количество каждой скобки и кавычки
+    '''
+    dict_count: Dict[str, int] = dict.fromkeys('()[]{}"\'', 0)
+    for token in lst_tokens:
+        if token.kind in (OPEN, CLOSE, UNTERMINATED):
+            dict_count[token.text] += 1
+        elif token.kind == STRING:
+            dict_count[token.text[0]] += 2
+    return dict_count
+
+
+def def_check_balance(lst_tokens: List[Token]) -> Tuple[str, str]:
+    '''
+    Функция проверки парности скобок и кавычек
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Количество пропущенных скобок по видам, количество кавычек
+    '''
+    return def_balance_text(def_count_balance(lst_tokens))
+
+
+def def_balance_text(dict_count: Dict[str, int]) -> Tuple[str, str]:
+    '''
+    Функция формирования текста о непарных скобках и кавычках
+
+    :param dict_count: Количество скобок и кавычек (см. def_count_balance)
+    :return: Количество пропущенных скобок по видам, количество кавычек
+    '''
+    s_brackets: str = ''
+    for s_name, s_open, s_close in (('Круглые', '(', ')'), ('Квадратные', '[', ']'), ('Фигурные', '{', '}')):
+        if dict_count[s_open] != dict_count[s_close]:
+            s_brackets += f'{s_name} скобки: {dict_count[s_open]} / {dict_count[s_close]}\n'
+
+    s_quotes: str = ''
+    for s_name, s_quote in (('Двойные', '"'), ('Одинарные', "'")):
+        if dict_count[s_quote] % 2 != 0:
+            s_quotes += f'{s_name} кавычки: {dict_count[s_quote]} / {dict_count[s_quote] + 1}\n'
+    return s_brackets, s_quotes
+
+
+def def_fix_numbers(lst_tokens: List[Token]) -> str:
+    '''
+    Функция исправления записи вещественных чисел: разделитель "," -> "." и экспонента "e" -> "E".
+    Лексемы исправляются на месте
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Список вещественных чисел с ошибками в разделителе
+    '''
+    lst_incorrect_numbers: List[str] = []
+    for i, token in enumerate(lst_tokens):
+        if token.kind != NUMBER:
+            continue
+        s_text: str = token.text
+        if ',' in s_text:
+            # Знак "минус" вплотную к числу указывается в сообщении вместе с числом
+            b_minus: bool = i > 0 and lst_tokens[i - 1].text == '-' and not token.space
+            lst_incorrect_numbers.append('-' + s_text if b_minus else s_text)
+            s_text = s_text.replace(',', '.')
+        if 'e' in s_text:
+            s_text = _RE_EXPONENT.sub(r'\1E\2', s_text)
+        if s_text != token.text:
+            lst_tokens[i] = token._replace(text=s_text)
+    return ', '.join(lst_incorrect_numbers)
+
+
+def def_code_correct(s_code: str) -> Tuple[str, str, str, str]:
+    '''
+    Функция для обработки текста и удаления лишних пробелов
+
+    :param s_code: Строка для обработки
+    :return: Исправленная строка, список вещественных чисел с ошибками, количество пропущенных скобок по видам,
+             количество кавычек
+    '''
+    # Проверка строки на источник. Если это выгрузка из ОМ ZIIoT, то выделить из неё MVEL-выражение
+    if def_json_valid(s_code):
+        s_code = def_value_of_key(s_code, 'expression')
+
+    lst_tokens: List[Token] = def_tokenize(s_code)
+    s_brackets, s_quotes = def_check_balance(lst_tokens)
+    s_incorrect_numbers: str = def_fix_numbers(lst_tokens)
+    return def_render(lst_tokens), s_incorrect_numbers, s_brackets, s_quotes
+
+
+def def_is_wrapped(lst_tokens: List[Token]) -> Optional[bool]:
+    '''
+    Функция проверки, что логическое выражение целиком заключено в круглые скобки
+
+    :param lst_tokens: Лексемы логического выражения
+    :return: True - заключено; False - не заключено; None - первая скобка не закрыта (пропущена скобка в конце)
+    '''
+    if not lst_tokens or lst_tokens[0].text != '(':
+        return False
+    i_depth: int = 0
+    for i, token in enumerate(lst_tokens):
+        if token.text == '(':
+            i_depth += 1
+        elif token.text == ')':
+            i_depth -= 1
+            if i_depth == 0:
+                return i == len(lst_tokens) - 1
+    return None
+
+
+def def_fix_condition(lst_block_if: List[Token]) -> Tuple[List[Token], IfCondition]:
+    '''
+    Функция для проверки и исправления одного логического выражения (от "if" до "{")
+
+    :param lst_block_if: Лексемы логического выражения
+    :return: Исправленные лексемы и результат проверки
+    '''
+    s_block_if: str = def_render(lst_block_if)
+
+    # Оператор присваивания вместо сравнения
+    b_assign: bool = any(t.kind == OP and t.text == '=' for t in lst_block_if)
+    if b_assign:
+        lst_block_if = [t._replace(text='==') if t.kind == OP and t.text == '=' else t for t in lst_block_if]
+
+    # Пропущенная скобка вначале или в конце
+    b_wrapped = def_is_wrapped(lst_block_if)
+    if not b_wrapped:
+        if b_wrapped is None:
+            # Добавляем скобку в конце блока с условием
+            lst_block_if = lst_block_if + [Token(CLOSE, ')')]
+        else:
+            # Заключаем все условие в скобки
+            b_space: bool = lst_block_if[0].space if lst_block_if else True
+            lst_block_if = [Token(OPEN, '(', b_space)] + lst_block_if + [Token(CLOSE, ')')]
+
+    # Пропущенные скобки в составе логического выражения
+    s_block_brackets: str = ''
+    for s_name, s_open, s_close in (('Круглые', '(', ')'), ('Квадратные', '[', ']'), ('Фигурные', '{', '}')):
+        i_open: int = sum(1 for t in lst_block_if if t.text == s_open and t.kind == OPEN)
+        i_close: int = sum(1 for t in lst_block_if if t.text == s_close and t.kind == CLOSE)
+        if i_open != i_close:
+            s_block_brackets += f'\t{s_name} скобки: {i_open} / {i_close}\n'
+    s_block_fixed: str = def_render(lst_block_if) if s_block_brackets else ''
+    return lst_block_if, IfCondition(s_block_if, s_block_fixed, b_assign, not b_wrapped, s_block_brackets)
+
+
+def def_fix_if_tokens(lst_tokens: List[Token]) -> Tuple[List[Token], List[IfCondition]]:
+    '''
+    Функция для исправления всех логических выражений в блоках с условием
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Исправленные лексемы и результаты проверки условий по порядку
+    '''
+    lst_out: List[Token] = []
+    lst_conditions: List[IfCondition] = []
+    i: int = 0
+    i_len: int = len(lst_tokens)
+    while i < i_len:
+        token = lst_tokens[i]
+        lst_out.append(token)
+        i += 1
+        if token.kind != NAME or token.text != 'if':
+            continue
+        # Логическое выражение до ближайшей "{"
+        j: int = i
+        while j < i_len and lst_tokens[j].text != '{':
+            j += 1
+        if j == i_len:
+            continue
+        lst_block_if, condition = def_fix_condition(lst_tokens[i:j])
+        lst_conditions.append(condition)
+        lst_out.extend(lst_block_if)
+        i = j
+    return lst_out, lst_conditions
+
+
+def def_if_reports(lst_conditions: List[IfCondition]) -> Tuple[str, str, str]:
+    '''
+    Функция формирования текстов ошибок в условиях (условия нумеруются по порядку в выражении)
+
+    :param lst_conditions: Результаты проверки условий
+    :return: Оператор присваивания в условии, пропущенные скобки на краях условия, пропущенные скобки внутри условия
+    '''
+    s_if_assign: str = ''
+    s_if_edge: str = ''
+    s_if_inner: str = ''
+    for i_block, condition in enumerate(lst_conditions, start=1):
+        if condition.b_assign:
+            s_if_assign += f'Условие №{i_block}: {condition.text}\n'
+        if condition.b_edge:
+            s_if_edge += f'Условие №{i_block}: {condition.text}\n'
+        if condition.brackets:
+            s_if_inner += f'Условие №{i_block}: {condition.text_fixed}\n' + condition.brackets
+    return s_if_assign, s_if_edge, s_if_inner
+
+
+def def_find_if_tokens(lst_tokens: List[Token]) -> Tuple[List[Token], str, str, str]:
+    '''
+    Функция для поиска и исправления ошибок во всех блоках с условием (логическое выражение от "if" до "{")
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Исправленные лексемы и тексты ошибок: оператор присваивания в условии, пропущенные скобки на краях
+             условия, пропущенные скобки внутри условия
+    '''
+    lst_out, lst_conditions = def_fix_if_tokens(lst_tokens)
+    return (lst_out,) + def_if_reports(lst_conditions)
+
+
+def def_find_if(s_code: str) -> Tuple[str, str, str, str]:
+    '''
+    Функция для поиска и исправления ошибок во всех блоках с условием
+
+    :param s_code: Строка с MVEL-выражением
+    :return: Исправленная строка и тексты ошибок: оператор присваивания в условии, пропущенные скобки на краях
+             условия, пропущенные скобки внутри условия
+    '''
+    lst_tokens, s_if_assign, s_if_edge, s_if_inner = def_find_if_tokens(def_tokenize(s_code))
+    return def_render(lst_tokens), s_if_assign, s_if_edge, s_if_inner
+
+
+def def_scan_identifiers(lst_tokens: List[Token]) -> MVELIdentifiers:
+    '''
+    Функция классификации идентификаторов MVEL-выражения за один проход по лексемам. Строки и комментарии
+    являются отдельными лексемами, поэтому имена внутри них не учитываются
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Индекс идентификаторов по ролям
+    '''
+    identifiers = MVELIdentifiers()
+    i_last: int = len(lst_tokens) - 1
+    for i, token in enumerate(lst_tokens):
+        if token.kind != NAME:
+            continue
+        s_name: str = token.text
+        token_next: Optional[Token] = lst_tokens[i + 1] if i < i_last else None
+        s_next: str = token_next.text if token_next is not None else ''
+        if s_next == '.' or (i > 0 and lst_tokens[i - 1].text == '.'):
+            identifiers.member.add(s_name)
+
+        s_lower: str = s_name.lower()
+        if s_lower in SET_KEYWORDS:
+            # Объявление локальной переменной: тип данных, за которым следует имя
+            if s_lower in identifiers.dict_declared and token_next is not None and token_next.kind == NAME:
+                identifiers.dict_declared[s_lower].add(s_next)
+            continue
+        if s_next == '(':
+            identifiers.call.add(s_name)
+            continue
+        identifiers.used.add(s_name)
+        if s_next == '=' and token_next.kind == OP:
+            identifiers.assigned.add(s_name)
+    return identifiers
+
+
+def def_var_local_text(dict_var_local: Dict[str, List[str]]) -> str:
+    '''
+    Функция формирования текста со списком локальных переменных по типам данных
+
+    :param dict_var_local: Словарь локальных переменных по типам данных
+    :return: Текст для вывода
+    '''
+    s_out: str = ''
+    for data_type, variables in dict_var_local.items():
+        if variables:
+            s_out += '\t' + data_type + ": " + ', '.join(variables) + '\n'
+    return s_out
+
+
+def def_var_local(s_code: str) -> Tuple[str, Dict[str, List[str]]]:
+    '''
+    Функция для формирования статистики: перечень всех локальных переменных, объявленных явно
+
+    :param s_code: Строка с MVEL-выражением
+    :return: Текст для вывода и словарь локальных переменных с группировкой по типу данных
+    '''
+    dict_var_local: Dict[str, List[str]] = def_scan_identifiers(def_tokenize(s_code)).dict_var_local()
+    return def_var_local_text(dict_var_local), dict_var_local
+
+
+def def_clear_sub_str_type_2(s_str: str) -> str:
+    '''
+    Функция для удаления подстроки между /* и */
+
+    :param s_str: Строка MVEL-выражения для поиска и удаления блоков с комментариями
+    :return: Строка MVEL-выражения без комментариев
+    '''
+    return re.sub(r'/\*.*?\*/', '', s_str)
+
+
+def def_var_all(s_code: str) -> str:
+    '''
+    Функция для поиска всех переменных в MVEL-выражении
+
+    :param s_code: Строка с MVEL-выражением
+    :return: строку в виде перечисления всех найденных переменных
+    '''
+    return ', '.join(def_scan_identifiers(def_tokenize(s_code)).var_all)
+
+
+def def_var_del_matches(s_var_all: str, dict_var_local: Dict[str, List[str]], lst_json_variables: List[Dict],
+                        b_input_is_json: bool, s_code_correct: str,
+                        set_assigned: Optional[Set[str]] = None) -> Tuple[str, List[str], List[str]]:
+    '''
+    Функция для удаления локальных переменных из общего списка всех переменных для получения списка глобальных
+
+    :param s_var_all: Cтрока со всеми обнаруженными переменными
+    :param dict_var_local: Словарь локальных переменных (см. def_var_local)
+    :param lst_json_variables: Атрибуты из выгрузки ОМ ZIIoT
+    :param b_input_is_json: На вход была передана выгрузка ОМ ZIIoT
+    :param s_code_correct: Исправленное MVEL-выражение
+    :param set_assigned: Переменные с присваиванием (если None, определяются по s_code_correct)
+    :return: Текст со списком глобальных переменных, переменные без типа данных, необъявленные переменные
+    '''
+    # Список всех переменных без локальных (порядок сортировки s_var_all сохраняется)
+    set_var_local: Set[str] = set().union(*dict_var_local.values())
+    lst_str_1: List[str] = [s for s in s_var_all.split(', ') if s and s not in set_var_local]
+
+    # Если это выгрузка из ОМ ZIIoT в формате json, то глобальные переменные (атрибуты) берем из конфигурации json,
+    # а не анализируем само выражение. Список lst_str_1 используем для определения неопределенных переменных.
+    # Если это не выгрузка, то просто выводим список lst_str_1.
+    if not b_input_is_json:
+        return ', '.join(lst_str_1), [], []
+
+    s_buf: str = ''
+    # Определение максимальной длины ключа для выравнивания описания атрибутов
+    i_max_len_key: int = max((len(dict_var.get('alias', '')) for dict_var in lst_json_variables), default=0)
+    set_alias: Set[str] = set()
+    for dict_var in lst_json_variables:
+        s_alias: str = dict_var.get('alias', '')
+        # Фрагменты пути к свойству атрибута в ОМ ZIIoT: "Путь|Свойство"
+        s_path, _, s_property = str(dict_var.get('value', '')).partition('|')
+        s_desc: str = f'{s_property} [{s_path}]' if s_property else s_path
+        set_alias.add(s_alias)
+        s_buf += f'{s_alias} {" " * (i_max_len_key - len(s_alias))}- {s_desc}\n'
+
+    # Переменные, не являющиеся атрибутами: с присваиванием - локальные без типа данных, иначе - нигде не объявлены
+    if set_assigned is None:
+        set_assigned = def_scan_identifiers(def_tokenize(s_code_correct)).assigned
+    lst_other: List[str] = [s for s in lst_str_1 if s not in set_alias]
+    lst_undefined_var: List[str] = [s for s in lst_other if s in set_assigned]
+    lst_not_declared_var: List[str] = [s for s in lst_other if s not in set_assigned]
+    return s_buf, lst_undefined_var, lst_not_declared_var
+
+
+def def_find_MVEL_result(s_code: str) -> str:
+    '''
+    Функция для получения списка результатов работы выражения MVEL.
+    Извлекает текст между ";" и "}", проверяя, что нет символа "="
+
+    :param s_code: строка с MVEL-выражением
+    :return:
+    '''
+    # Удаление подстрок между символами /* и */. Кавычки удалять нельзя, иначе нарушится содержимое строки
+    s_buf: str = def_clear_sub_str_type_2(s_code)
+    # Если выражение сложное, то разбиваем на части через регулярное выражение, иначе сразу передаем как результат
+    if s_buf.count('=') + s_buf.count('if (') + s_buf.count('{'):
+        # Поиск внутри выражения
+        lst_result_1 = re.findall(r';([^=}]*)}', s_buf)
+        # Поиск с правого края выражения
+        lst_result_2 = sorted(set(re.findall(r';([^=}]*)[}]?$', s_buf)))
+        # Поиск одиночных выражений внутри { }
+        lst_result_3 = sorted(set(re.findall(r'{([^=},]*)}', s_buf)))
+
+        for s_result in lst_result_2 + lst_result_3:
+            if s_result not in lst_result_1:
+                lst_result_1.append(s_result)
+        # Удаление символа ";" и пробелов по краям результатов выражений, удаление дубликатов и сортировка
+        return ', '.join(sorted({s_result.replace(';', '').strip() for s_result in lst_result_1}))
+    return s_buf
+
+
+def def_format_tokens(lst_tokens: List[Token]) -> str:
+    '''
+    Функция для форматирования MVEL-выражения: перевод строки после ";", "{" и "}", отступы по вложенности блоков,
+    комментарии - на отдельных строках без отступа
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Отформатированное выражение
+    '''
+    lst_out: List[str] = []
+    lst_line: List[Token] = []
+    i_tab_lvl: int = 0
+    s_tab_char: str = "    "  # 4 пробела
+
+    i: int = 0
+    i_len: int = len(lst_tokens)
+    while i < i_len:
+        token = lst_tokens[i]
+        if token.kind == COMMENT or token.text in ('{', '}', ';'):
+            if token.text == ';':
+                lst_line.append(token)
+            if lst_line:
+                lst_out.append(s_tab_char * i_tab_lvl + def_render(lst_line) + '\n')
+                lst_line = []
+            # Комментарии имеют нулевую вложенность
+            if token.kind == COMMENT:
+                lst_out.append(token.text + '\n')
+            elif token.text == '{':
+                lst_out.append(s_tab_char * i_tab_lvl + '{\n')
+                i_tab_lvl += 1
+            elif token.text == '}':
+                i_tab_lvl -= 1
+                # Символ ";" после "}" остается на той же строке
+                if i + 1 < i_len and lst_tokens[i + 1].text == ';':
+                    lst_out.append(s_tab_char * i_tab_lvl + '};\n')
+                    i += 1
+                else:
+                    lst_out.append(s_tab_char * i_tab_lvl + '}\n')
+        else:
+            lst_line.append(token)
+        i += 1
+    if lst_line:
+        lst_out.append(s_tab_char * i_tab_lvl + def_render(lst_line) + '\n')
+    return ''.join(lst_out)
+
+
+def def_code_formatting(s_code: str) -> str:
+    '''
+    Функция для форматирования MVEL-выражения
+
+    :param s_code: строка с MVEL-выражением
+    :return:
+    '''
+    return def_format_tokens(def_tokenize(s_code))
+
+
+def def_json_valid(s_text: str) -> bool:
+    '''
+    Функция для проверки строки на формат записи Json.
+    Если результат True, то с ней можно работать как со словарем
+
+    :param s_text: строка для проверки
+    :return: True или False
+    '''
+    try:
+        json.loads(s_text)
+        return True
+    except ValueError:
+        return False
+
+
+def def_value_of_key(s_text: str, s_json_key: str) -> str:
+    '''
+    Функция для возврата значения по ключу из json выгрузки ОМ ZIIoT
+
+    :param s_text: Строка из таблицы с выгрузкой ОМ из платформы ZIIoT
+    :return: Возвращает MVEL-выражение из общей строки выгрузки
+    '''
+    try:
+        dict_json_text = json.loads(s_text)
+    except ValueError:
+        return s_text
+    if isinstance(dict_json_text, dict) and s_json_key in dict_json_text:
+        return dict_json_text.get(s_json_key)
+    return s_text
+
+
+def def_second_to_str(i_time_sec: int) -> str:
+    '''
+    Функция преобразования секунд в строку из полных часов, минут и секунд
+
+    :param i_time_sec: Количество секунд
+    :return:
+    '''
+    i_h: int = i_time_sec // 3600
+    i_m: int = (i_time_sec % 3600) // 60
+    i_sec: int = i_time_sec % 60
+
+    lst_time_parts = []
+    if i_h > 0:
+        lst_time_parts.append(f"{i_h} ч")
+    if i_m > 0:
+        lst_time_parts.append(f"{i_m} мин")
+    if i_sec > 0 or not lst_time_parts:  # выводим "0 сек", если нет других частей
+        lst_time_parts.append(f"{i_sec} сек")
+    return ' '.join(lst_time_parts)
+
+
+def def_analyze_code(s_code: str) -> Dict[str, Any]:
+    '''
+    Функция анализа текста MVEL-выражения (без учета атрибутов тега)
+
+    :param s_code: Строка с MVEL-выражением
+    :return: Словарь полей MVELResult из LST_EXPRESSION_FIELDS и список переменных с присваиванием ("assigned")
+    '''
+    dict_out: Dict[str, Any] = {}
+    # Лексический анализ выполняется один раз: исправление, проверки и форматирование работают с лексемами
+    lst_tokens: List[Token] = def_tokenize(s_code)
+    # Проверяем парность скобок и кавычек, исправляем запись чисел
+    dict_out['brackets'], dict_out['quotes'] = def_check_balance(lst_tokens)
+    dict_out['incorrect_numbers'] = def_fix_numbers(lst_tokens)
+    # Поиск ошибок в блоках условия if (в самих логических выражениях)
+    lst_tokens, dict_out['if_assign'], dict_out['if_edge_brackets'], dict_out['if_inner_brackets'] = \
+        def_find_if_tokens(lst_tokens)
+    dict_out['code'] = s_code = def_render(lst_tokens)
+
+    # Форматируем код
+    dict_out['code_formatted'] = def_format_tokens(lst_tokens)
+    # Список всех и локальных переменных по индексу идентификаторов
+    identifiers: MVELIdentifiers = def_scan_identifiers(lst_tokens)
+    dict_out['var_all'] = ', '.join(identifiers.var_all)
+    dict_out['dict_var_local'] = identifiers.dict_var_local()
+    dict_out['var_local'] = def_var_local_text(dict_out['dict_var_local'])
+    dict_out['assigned'] = sorted(identifiers.assigned)
+    # Список результатов выражения
+    dict_out['mvel_result'] = def_find_MVEL_result(s_code)
+    return dict_out
+
+
+# ---------------------
+# Движок
+# ---------------------
+class MVELEngine:
+    '''
+    Реентерабельный обработчик MVEL-выражений: всё состояние обработки одного выражения хранится в MVELResult,
+    поэтому один объект можно использовать для любого количества выражений (в том числе в разных процессах).
+
+    Обработка разделена на две части: анализ текста выражения (analyze_expression), результат которого можно
+    сохранить в кэше MVELCache и использовать для всех тегов с таким же выражением, и сборка результата с учетом
+    атрибутов конкретного тега (make_result).
+    '''
+
+    def __init__(self, cache: Optional[MVELCache] = None):
+        self.cache = cache
+
+    def analyze(self, s_input: str, config: Optional[MVELConfig] = None) -> MVELResult:
+        '''
+        Обрабатывает одно MVEL-выражение или запись из выгрузки ОМ ZIIoT
+
+        :param s_input: MVEL-выражение или Json-запись из выгрузки ОМ ZIIoT (поле "Configuration")
+        :param config: Уже разобранная запись выгрузки (если None, s_input проверяется на Json)
+        :return: Результат обработки
+        '''
+        if config is None:
+            config = MVELConfig.from_text(s_input)
+        s_code: str = config.expression if config is not None else s_input
+        if not s_code.strip():
+            return MVELResult(source=s_input, config=config, error='MVEL-выражение не найдено')
+
+        dict_expression: Optional[Dict[str, Any]] = self.cache.get(s_code) if self.cache is not None else None
+        if dict_expression is None:
+            dict_expression = self.analyze_expression(s_code)
+            if self.cache is not None:
+                self.cache.put(s_code, dict_expression)
+        return self.make_result(s_input, config, dict_expression)
+
+    @staticmethod
+    def analyze_expression(s_code: str) -> Dict[str, Any]:
+        '''
+        Анализ текста выражения без учета атрибутов тега
+
+        :param s_code: Строка с MVEL-выражением
+        :return: Словарь полей MVELResult из LST_EXPRESSION_FIELDS, список переменных с присваиванием ("assigned")
+                 и время анализа, с ("seconds"); при исключении - словарь с ключом "error"
+        '''
+        f_start: float = time.perf_counter()
+        try:
+            dict_out: Dict[str, Any] = def_analyze_code(s_code)
+        except Exception as e:
+            return {'error': f'{type(e).__name__}: {e}'}
+        dict_out['seconds'] = time.perf_counter() - f_start
+        return dict_out
+
+    @staticmethod
+    def make_result(s_input: str, config: Optional[MVELConfig], dict_expression: Dict[str, Any]) -> MVELResult:
+        '''
+        Сборка результата обработки по результату анализа выражения и атрибутам тега
+
+        :param s_input: Исходная строка (MVEL-выражение или Json-запись)
+        :param config: Запись выгрузки ОМ ZIIoT или None
+        :param dict_expression: Результат analyze_expression (в том числе из кэша)
+        :return: Результат обработки
+        '''
+        result = MVELResult(source=s_input, config=config, error=dict_expression.get('error', ''))
+        if result.error:
+            return result
+        try:
+            for s_field in LST_EXPRESSION_FIELDS:
+                setattr(result, s_field, dict_expression[s_field])
+            # Словарь из кэша общий для всех тегов с этим выражением
+            result.dict_var_local = {key: list(value) for key, value in result.dict_var_local.items()}
+
+            # Готовим список глобальных переменных
+            lst_json_variables = config.variables if config else []
+            if (result.var_all and result.var_local) or lst_json_variables:
+                result.var_global, result.undefined_var, result.not_declared_var = def_var_del_matches(
+                    result.var_all, result.dict_var_local, lst_json_variables, config is not None, result.code,
+                    set(dict_expression['assigned']))
+            else:
+                result.var_global = result.var_all
+
+            # Подмена пустого результата на найденные переменные
+            if not result.mvel_result and result.undefined_var:
+                result.mvel_result = '[Предварительно] ' + ','.join(result.undefined_var)
+            if not result.mvel_result and not result.undefined_var and result.var_local:
+                result.mvel_result = '[Предварительно] ' + result.var_local
+        except Exception as e:
+            result.error = f'{type(e).__name__}: {e}'
+        return result
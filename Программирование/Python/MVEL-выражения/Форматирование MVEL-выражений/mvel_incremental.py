@@ -0,0 +1,191 @@
+'''
+Инкрементальный анализ MVEL-выражения для повторной обработки после правки (команда "2").
+
+После запуска сохраняются текст выражения, его лексемы и результаты анализа каждого блока верхнего уровня
+(инструкция до ";" или цепочка if / else if / else до закрывающей "}"): исправленные лексемы, числа с ошибками,
+условия if, однострочный и отформатированный текст, индекс идентификаторов. При следующем запуске лексический
+анализ выполняется только для измененного фрагмента текста (см. def_retokenize), заново анализируются только блоки,
+текст которых изменился, а результат всего выражения собирается из блоков.
+
+Итог совпадает с def_analyze_code. Если выражение нельзя разбить на независимые блоки (непарные скобки или кавычки,
+условие if без "{"), выполняется полный анализ.
+
+Пример:
+    incremental = MVELIncremental()
+    dict_out = incremental.analyze_code(s_code)   # полный анализ
+    dict_out = incremental.analyze_code(s_edited) # анализ только измененных блоков
+    print(incremental.stats_text())
+'''
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from mvel_engine import (IfCondition, MVELIdentifiers, def_analyze_code, def_balance_text, def_count_balance,
+                         def_find_MVEL_result, def_fix_if_tokens, def_fix_numbers, def_format_tokens, def_if_reports,
+                         def_scan_identifiers, def_var_local_text)
+from mvel_lexer import CLOSE, NAME, OPEN, UNTERMINATED, Token, TokenStream, def_render
+
+# Лексемы, перед которыми не ставится пробел при склейке блоков (см. def_render)
+_SET_NO_SPACE: frozenset = frozenset({',', '.', ';'})
+_DICT_PAIRS: Dict[str, str] = {')': '(', ']': '[', '}': '{'}
+
+
+class BlockAnalysis(NamedTuple):
+    '''
+    Результат анализа одного блока верхнего уровня
+    '''
+    # Лексемы после исправления чисел и условий if
+    tokens: List[Token]
+    # Количество скобок и кавычек по видам
+    dict_count: Dict[str, int]
+    # Числа с ошибками в разделителе
+    incorrect_numbers: str
+    # Результаты проверки условий if
+    conditions: List[IfCondition]
+    # Однострочный и отформатированный текст блока
+    code: str
+    code_formatted: str
+    # Индекс идентификаторов блока
+    identifiers: MVELIdentifiers
+
+
+def def_split_blocks(lst_tokens: List[Token]) -> Optional[List[Tuple[int, int]]]:
+    '''
+    Функция разбиения лексем на блоки верхнего уровня. Блок заканчивается на ";" вне скобок или на "}" вне скобок,
+    за которой не следуют "else" или ";"
+
+    :param lst_tokens: Лексемы MVEL-выражения
+    :return: Границы блоков (индексы первой лексемы и следующей за последней) или None, если скобки непарные
+             или есть кавычка без пары
+    '''
+    lst_blocks: List[Tuple[int, int]] = []
+    i_start: int = 0
+    # Вложенность отдельно по видам скобок: "(}" не должно считаться парой
+    dict_depth: Dict[str, int] = {'(': 0, '[': 0, '{': 0}
+    i_depth: int = 0
+    i_len: int = len(lst_tokens)
+    for i, token in enumerate(lst_tokens):
+        if token.kind == OPEN:
+            dict_depth[token.text] += 1
+            i_depth += 1
+        elif token.kind == CLOSE:
+            s_open: str = _DICT_PAIRS[token.text]
+            dict_depth[s_open] -= 1
+            i_depth -= 1
+            if dict_depth[s_open] < 0:
+                return None
+        elif token.kind == UNTERMINATED:
+            return None
+        if i_depth:
+            continue
+        if token.text == ';' or (token.text == '}' and token.kind == CLOSE and
+                                 (i + 1 == i_len or lst_tokens[i + 1].text not in ('else', ';'))):
+            lst_blocks.append((i_start, i + 1))
+            i_start = i + 1
+    if i_depth:
+        return None
+    if i_start < i_len:
+        lst_blocks.append((i_start, i_len))
+    return lst_blocks
+
+
+def def_analyze_block(lst_tokens: List[Token]) -> Optional[BlockAnalysis]:
+    '''
+    Функция анализа одного блока (этапы def_analyze_code, которые не зависят от соседних блоков)
+
+    :param lst_tokens: Лексемы блока
+    :return: Результат анализа или None, если условие if блока не заканчивается "{" внутри блока
+    '''
+    dict_count: Dict[str, int] = def_count_balance(lst_tokens)
+    lst_tokens = list(lst_tokens)
+    s_incorrect_numbers: str = def_fix_numbers(lst_tokens)
+    lst_tokens, lst_conditions = def_fix_if_tokens(lst_tokens)
+    if len(lst_conditions) != sum(1 for t in lst_tokens if t.kind == NAME and t.text == 'if'):
+        return None
+    return BlockAnalysis(lst_tokens, dict_count, s_incorrect_numbers, lst_conditions, def_render(lst_tokens),
+                         def_format_tokens(lst_tokens), def_scan_identifiers(lst_tokens))
+
+
+class MVELIncremental:
+    '''
+    Анализ MVEL-выражения с повторным использованием лексем и результатов неизмененных блоков предыдущего запуска
+    '''
+
+    def __init__(self):
+        # Текст и лексемы предыдущего запуска
+        self.stream = TokenStream()
+        # Исходный текст блока -> результат анализа (только блоки предыдущего запуска)
+        self._dict_blocks: Dict[str, BlockAnalysis] = {}
+        self.i_blocks: int = 0
+        self.i_reused: int = 0
+
+    def analyze_code(self, s_code: str) -> Dict[str, Any]:
+        '''
+        Анализ текста MVEL-выражения (см. def_analyze_code)
+
+        :param s_code: Строка с MVEL-выражением
+        :return: Словарь полей MVELResult из LST_EXPRESSION_FIELDS и список переменных с присваиванием ("assigned")
+        '''
+        lst_tokens: List[Token] = self.stream.update(s_code)
+        lst_ends: List[int] = self.stream.lst_ends
+        self.i_blocks = self.i_reused = 0
+        lst_bounds: Optional[List[Tuple[int, int]]] = def_split_blocks(lst_tokens)
+        dict_blocks: Dict[str, BlockAnalysis] = {}
+        lst_analysis: List[BlockAnalysis] = []
+        for i_start, i_end in lst_bounds or []:
+            # Ключ - исходный текст блока без пробелов перед ним (пробел перед первой лексемой блока на результат
+            # не влияет: после ";" и "}" он ставится всегда)
+            s_key: str = s_code[lst_ends[i_start - 1] if i_start else 0:lst_ends[i_end - 1]].lstrip()
+            block: Optional[BlockAnalysis] = dict_blocks.get(s_key) or self._dict_blocks.get(s_key)
+            if block is None:
+                block = def_analyze_block(lst_tokens[i_start:i_end])
+                if block is None:
+                    lst_bounds = None
+                    break
+            else:
+                self.i_reused += 1
+            dict_blocks[s_key] = block
+            lst_analysis.append(block)
+        if lst_bounds is None:
+            self._dict_blocks = {}
+            self.i_reused = 0
+            return def_analyze_code(s_code)
+        self._dict_blocks = dict_blocks
+        self.i_blocks = len(lst_analysis)
+        return self.merge(lst_analysis)
+
+    @staticmethod
+    def merge(lst_analysis: List[BlockAnalysis]) -> Dict[str, Any]:
+        '''
+        Сборка результата всего выражения из результатов блоков
+        '''
+        dict_out: Dict[str, Any] = {}
+        dict_count: Dict[str, int] = def_count_balance([])
+        identifiers = MVELIdentifiers()
+        lst_conditions: List[IfCondition] = []
+        lst_code: List[str] = []
+        for block in lst_analysis:
+            for key, i_count in block.dict_count.items():
+                dict_count[key] += i_count
+            identifiers.update(block.identifiers)
+            lst_conditions.extend(block.conditions)
+            # Блоки заканчиваются на ";" или "}", после которых ставится пробел (кроме ";" в начале следующего блока)
+            if lst_code and block.tokens[0].text not in _SET_NO_SPACE:
+                lst_code.append(' ')
+            lst_code.append(block.code)
+        dict_out['brackets'], dict_out['quotes'] = def_balance_text(dict_count)
+        dict_out['incorrect_numbers'] = ', '.join(block.incorrect_numbers for block in lst_analysis
+                                                  if block.incorrect_numbers)
+        dict_out['if_assign'], dict_out['if_edge_brackets'], dict_out['if_inner_brackets'] = \
+            def_if_reports(lst_conditions)
+        dict_out['code'] = ''.join(lst_code)
+        dict_out['code_formatted'] = ''.join(block.code_formatted for block in lst_analysis)
+        dict_out['var_all'] = ', '.join(identifiers.var_all)
+        dict_out['dict_var_local'] = identifiers.dict_var_local()
+        dict_out['var_local'] = def_var_local_text(dict_out['dict_var_local'])
+        dict_out['assigned'] = sorted(identifiers.assigned)
+        dict_out['mvel_result'] = def_find_MVEL_result(dict_out['code'])
+        return dict_out
+
+    def stats_text(self) -> str:
+        if not self.i_blocks:
+            return 'Инкрементальный анализ: выполнен полный анализ выражения'
+        return f'Инкрементальный анализ: повторно использовано блоков {self.i_reused} из {self.i_blocks}'
@@ -0,0 +1,218 @@
+'''
+Лексический анализатор MVEL-выражений.
+
+Разбивает выражение на лексемы (идентификаторы, числа, строки, комментарии, операторы, скобки) за один линейный
+проход и собирает их обратно в однострочную запись с единообразными пробелами. Текст внутри строк и комментариев
+не изменяется: пробелы вокруг операторов и исправления чисел применяются только к коду.
+
+Пример:
+    lst_tokens = def_tokenize("Double X=A+B*2,5; if (X>10) {Y = 'a*b'}")
+    def_render(lst_tokens)  # "Double X = A + B * 2,5; if (X > 10) {Y = 'a*b'}"
+'''
+import bisect
+import re
+from typing import Iterable, List, Match, NamedTuple, Tuple
+
+# Виды лексем
+NAME: str = 'name'                  # Идентификатор или ключевое слово
+NUMBER: str = 'number'              # Число (в исходной записи, в т.ч. с запятой вместо точки)
+STRING: str = 'string'              # Строка в кавычках (вместе с кавычками)
+UNTERMINATED: str = 'unterminated'  # Кавычка без пары
+COMMENT: str = 'comment'            # Комментарий (приводится к виду /* ... */)
+OP: str = 'op'                      # Оператор
+OPEN: str = 'open'                  # Открывающая скобка: ( [ {
+CLOSE: str = 'close'                # Закрывающая скобка: ) ] }
+PUNCT: str = 'punct'                # Разделители: . , ; $ и прочие символы
+
+# Операторы, которые всегда отделяются пробелами
+SET_SPACED_OPS: frozenset = frozenset({'=', '==', '!=', '<', '>', '<=', '>=', '+', '/', '*', '||',
+                                       '+=', '-=', '*=', '/=', '%='})
+
+# Единое регулярное выражение лексического анализа. Альтернативы проверяются по порядку: комментарии раньше
+# оператора "/", строки раньше одиночных кавычек. Операторы сравнения и "||", разделенные пробелами ("= =", "| |"),
+# склеиваются. Пробельные символы перед лексемой входят в совпадение (группа ws), пробелы в конце текста отбрасываются
+_RE_TOKEN = re.compile(r'''
+    (?P<ws>\s*)
+  (?:
+    (?P<comment>/\*.*?(?:\*/|\Z)|//[^\n]*)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<unterminated>['"])
+  | (?P<number>\d+(?:[.,]\d+)?(?:[eE][+-]?\d+)?[A-Za-z_]*)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op>[=!<>]\s*=(?!=)|\|\s*\||&&|\+\+|--|[-+*/%]=|[-+*/%=<>!&|^~?:])
+  | (?P<open>[(\[{])
+  | (?P<close>[)\]}])
+  | (?P<punct>\S)
+  )
+''', re.VERBOSE | re.DOTALL)
+
+_RE_SPACES = re.compile(r'\s+')
+_RE_SPACES_AT = re.compile(r'\s*')
+# Наибольшее количество символов после конца лексемы, от которых зависит ее распознавание
+_I_LOOKAHEAD: int = 4
+# Лексемы без пробела перед ними и лексемы, после которых всегда ставится пробел
+_SET_NO_SPACE: frozenset = frozenset({',', '.', ';'})
+_SET_SPACE_AFTER: frozenset = frozenset({',', ';', '}'})
+
+
+class Token(NamedTuple):
+    '''
+    Лексема MVEL-выражения
+    '''
+    # Вид лексемы (NAME, NUMBER, STRING, ...)
+    kind: str
+    # Текст лексемы
+    text: str
+    # В исходном тексте перед лексемой был пробельный символ
+    space: bool = False
+
+
+def def_tokenize(s_code: str) -> List[Token]:
+    '''
+    Функция лексического анализа MVEL-выражения (один проход по строке)
+
+    :param s_code: Строка с MVEL-выражением (в том числе многострочным)
+    :return: Список лексем без пробельных символов
+    '''
+    return def_tokenize_spans(s_code)[0]
+
+
+def def_tokenize_spans(s_code: str) -> Tuple[List[Token], List[int]]:
+    '''
+    Функция лексического анализа MVEL-выражения с позициями лексем
+
+    :param s_code: Строка с MVEL-выражением
+    :return: Список лексем и позиции концов лексем в строке (лексема начинается с пробелов после предыдущей)
+    '''
+    lst_tokens: List[Token] = []
+    lst_ends: List[int] = []
+    for match in _RE_TOKEN.finditer(s_code):
+        lst_tokens.append(def_match_token(match))
+        lst_ends.append(match.end())
+    return lst_tokens, lst_ends
+
+
+def def_match_token(match: Match) -> Token:
+    '''
+    Функция получения лексемы из совпадения _RE_TOKEN
+    '''
+    s_kind: str = match.lastgroup
+    s_text: str = match.group(s_kind)
+    if s_kind == COMMENT:
+        # Однострочная запись: переводы строк внутри комментария заменяются пробелом, "//" - на "/* */"
+        if s_text.startswith('//'):
+            s_text = '/* ' + s_text[2:].strip() + ' */'
+        s_text = _RE_SPACES.sub(' ', s_text)
+    elif s_kind == OP and len(s_text) > 2:
+        s_text = s_text[0] + s_text[-1]
+    return Token(s_kind, s_text, match.start() != match.start(s_kind))
+
+
+def def_common_prefix(s_1: str, s_2: str) -> int:
+    '''
+    Функция определения длины общего начала двух строк (двоичный поиск со сравнением срезов)
+    '''
+    i_low: int = 0
+    i_high: int = min(len(s_1), len(s_2))
+    while i_low < i_high:
+        i_mid: int = (i_low + i_high + 1) // 2
+        if s_1[i_low:i_mid] == s_2[i_low:i_mid]:
+            i_low = i_mid
+        else:
+            i_high = i_mid - 1
+    return i_low
+
+
+def def_retokenize(s_old: str, lst_tokens: List[Token], lst_ends: List[int],
+                   s_new: str) -> Tuple[List[Token], List[int]]:
+    '''
+    Функция повторного лексического анализа измененной строки: лексемы до и после измененного фрагмента берутся
+    из предыдущего анализа. Результат совпадает с def_tokenize_spans(s_new)
+
+    :param s_old: Предыдущая строка
+    :param lst_tokens: Лексемы предыдущей строки
+    :param lst_ends: Позиции концов лексем предыдущей строки
+    :param s_new: Новая строка
+    :return: Список лексем и позиции концов лексем новой строки
+    '''
+    i_prefix: int = def_common_prefix(s_old, s_new)
+    i_suffix: int = def_common_prefix(s_old[i_prefix:][::-1], s_new[i_prefix:][::-1])
+    # Лексема в начале сохраняется, если она и следующие за ней пробелы заканчиваются раньше изменения с запасом
+    # на просмотр вперед (число "2,5" или "1e+3" и оператор "= =" определяются по следующим символам).
+    # Кавычка без пары зависит от всего текста после нее
+    i_keep: int = bisect.bisect_right(lst_ends, i_prefix - _I_LOOKAHEAD)
+    while i_keep and _RE_SPACES_AT.match(s_new, lst_ends[i_keep - 1]).end() > i_prefix - _I_LOOKAHEAD:
+        i_keep -= 1
+    for i in range(i_keep):
+        if lst_tokens[i].kind == UNTERMINATED:
+            i_keep = i
+            break
+    i_pos: int = lst_ends[i_keep - 1] if i_keep else 0
+    lst_tokens_new: List[Token] = lst_tokens[:i_keep]
+    lst_ends_new: List[int] = lst_ends[:i_keep]
+
+    # Лексемы после изменения: анализ идет до совпадения начала лексемы с началом прежней лексемы в неизмененном
+    # конце строки - дальше последовательность лексем та же
+    i_shift: int = len(s_new) - len(s_old)
+    i_tail: int = len(s_new) - i_suffix
+    for match in _RE_TOKEN.finditer(s_new, i_pos):
+        i_start: int = match.start()
+        if i_start >= i_tail and i_start > i_pos:
+            # Прежняя лексема, которая начиналась в этой же точке неизмененного конца строки
+            i_sync: int = bisect.bisect_left(lst_ends, i_start - i_shift)
+            if i_sync < len(lst_ends) and lst_ends[i_sync] == i_start - i_shift:
+                lst_tokens_new.extend(lst_tokens[i_sync + 1:])
+                lst_ends_new.extend(i_end + i_shift for i_end in lst_ends[i_sync + 1:])
+                return lst_tokens_new, lst_ends_new
+        lst_tokens_new.append(def_match_token(match))
+        lst_ends_new.append(match.end())
+    return lst_tokens_new, lst_ends_new
+
+
+class TokenStream:
+    '''
+    Лексемы текста, который редактируется и анализируется повторно: после правки лексический анализ выполняется
+    только для измененного фрагмента (см. def_retokenize)
+    '''
+
+    def __init__(self):
+        self.s_code: str = ''
+        self.lst_tokens: List[Token] = []
+        self.lst_ends: List[int] = []
+
+    def update(self, s_code: str) -> List[Token]:
+        '''
+        Возвращает лексемы нового текста (как def_tokenize)
+        '''
+        if self.lst_tokens:
+            self.lst_tokens, self.lst_ends = def_retokenize(self.s_code, self.lst_tokens, self.lst_ends, s_code)
+        else:
+            self.lst_tokens, self.lst_ends = def_tokenize_spans(s_code)
+        self.s_code = s_code
+        return self.lst_tokens
+
+
+def def_render(lst_tokens: Iterable[Token]) -> str:
+    '''
+    Функция сборки лексем в однострочное MVEL-выражение с единообразными пробелами
+
+    :param lst_tokens: Лексемы
+    :return: Строка MVEL-выражения
+    '''
+    lst_out: List[str] = []
+    prev = None
+    for token in lst_tokens:
+        if prev is not None:
+            s_prev: str = prev.text
+            s_cur: str = token.text
+            # Без пробела после открывающей скобки, точки и "$", перед закрывающей скобкой и разделителями
+            if prev.kind == OPEN or s_prev == '.' or s_prev == '$' or token.kind == CLOSE or s_cur in _SET_NO_SPACE:
+                pass
+            # Пробел после разделителей и "}", вокруг комментариев и основных операторов. Для остальных лексем
+            # (унарный минус, "&&", вызов функции и т.п.) сохраняется исходное написание
+            elif (s_prev in _SET_SPACE_AFTER or prev.kind == COMMENT or token.kind == COMMENT or
+                  s_prev in SET_SPACED_OPS or s_cur in SET_SPACED_OPS or token.space):
+                lst_out.append(' ')
+        lst_out.append(token.text)
+        prev = token
+    return ''.join(lst_out)
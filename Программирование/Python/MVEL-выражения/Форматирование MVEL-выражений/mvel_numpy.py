@@ -0,0 +1,559 @@
+'''
+Компиляция MVEL-выражений в векторные вычислители NumPy для проверки формул на истории (PIMS).
+
+Поддерживаемое подмножество MVEL:
+    - арифметика (+ - * / %), сравнения (== != < > <= >=), логика (&& || ! and or), тернарный оператор ?:
+    - блоки if / else if / else (ветви вычисляются по маскам для всего массива сразу)
+    - объявления локальных переменных с типом (Double X = ...; Int N; Boolean B = ...) и присваивания (= += -= *= /=)
+    - проверка недостоверного значения Fn.badVal($X, '*'), которую формирует Debalans.py
+    - сравнение с null (x == null), функции Math.abs/sqrt/pow/min/max/exp/log/log10/floor/ceil/round/signum
+Недостоверное (отсутствующее) значение атрибута задается как NaN. Результат выражения - значение последней инструкции.
+Значения хранятся в float64. Арифметика над целыми операндами (Int/Long переменные, целочисленные литералы) выполняется
+как в Java: деление с отбрасыванием дробной части (7 / 2 = 3), остаток со знаком делимого; переполнение не моделируется.
+Атрибутом (входом) считается имя, которое читается до первого присваивания. Если атрибуту присваивается значение
+без объявления типа (A = 0), его история также используется, если передана: вне ветви if сохраняется исходное значение.
+
+Атрибуты выражения передаются массивами по псевдониму (alias) или по пути из "variables" выгрузки ОМ ZIIoT.
+
+Пример:
+    evaluator = def_compile_config(MVELConfig.from_text(s_configuration))
+    result = evaluator({'Модель\\ЦЕХ\\WI-15205|Текущая выработка': values_1, 'BB': values_2})
+
+    python mvel_numpy.py --config tag.json --history history.csv -o result.csv
+'''
+import argparse
+import csv
+import json
+import math
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set
+
+import numpy as np
+
+from mvel_engine import LST_DATA_TYPES, MVELConfig, def_fix_numbers
+from mvel_lexer import COMMENT, NAME, NUMBER, OP, OPEN, STRING, Token, def_tokenize
+
+# Приоритет бинарных операторов (больше - выполняется раньше)
+DICT_PRECEDENCE: Dict[str, int] = {'||': 1, 'or': 1, '&&': 2, 'and': 2, '==': 3, '!=': 3,
+                                   '<': 4, '>': 4, '<=': 4, '>=': 4, '+': 5, '-': 5, '*': 6, '/': 6, '%': 6}
+DICT_BINARY: Dict[str, Callable] = {'||': np.logical_or, 'or': np.logical_or, '&&': np.logical_and,
+                                    'and': np.logical_and, '==': np.equal, '!=': np.not_equal, '<': np.less,
+                                    '>': np.greater, '<=': np.less_equal, '>=': np.greater_equal, '+': np.add,
+                                    '-': np.subtract, '*': np.multiply, '/': np.true_divide, '%': np.fmod}
+# Функции Math.* (Java) и их аналоги NumPy
+DICT_MATH: Dict[str, Callable] = {'abs': np.abs, 'sqrt': np.sqrt, 'pow': np.power, 'min': np.minimum,
+                                  'max': np.maximum, 'exp': np.exp, 'log': np.log, 'log10': np.log10,
+                                  'floor': np.floor, 'ceil': np.ceil, 'round': lambda x: np.floor(np.add(x, 0.5)),
+                                  'signum': np.sign}
+SET_INT_TYPES: Set[str] = {'byte', 'short', 'int', 'long'}
+# Операторы, результат которых над целыми операндами - целое число
+SET_INT_ARITHMETIC: Set[str] = {'+', '-', '*', '/', '%'}
+# Функции Math.*, результат которых - целое число при целых аргументах (round - всегда)
+SET_INT_MATH: Set[str] = {'abs', 'min', 'max'}
+# Целочисленный литерал (в т.ч. Long: 10L)
+RE_INT_LITERAL = re.compile(r'\d+[lL]?')
+# Составные операторы присваивания
+DICT_ASSIGN: Dict[str, str] = {'+=': '+', '-=': '-', '*=': '*', '/=': '/', '%=': '%'}
+
+
+class MVELCompileError(ValueError):
+    '''
+    Выражение содержит конструкцию вне поддерживаемого подмножества MVEL или синтаксическую ошибку
+    '''
+
+
+class _Context:
+    '''
+    Состояние одного вычисления: локальные переменные и входные массивы
+    '''
+
+    def __init__(self, dict_inputs: Dict[str, np.ndarray], i_len: int):
+        self.dict_inputs = dict_inputs
+        self.i_len = i_len
+        self.dict_env: Dict[str, Any] = {}
+
+    def value(self, s_name: str) -> Any:
+        if s_name in self.dict_env:
+            return self.dict_env[s_name]
+        if s_name in self.dict_inputs:
+            return self.dict_inputs[s_name]
+        raise KeyError(f'Нет данных для атрибута "{s_name}"')
+
+    def assign(self, s_name: str, value: Any, mask: Optional[np.ndarray]):
+        '''
+        Присваивание с учетом маски ветви if: вне маски сохраняется прежнее значение (или NaN)
+        '''
+        if mask is None:
+            self.dict_env[s_name] = np.broadcast_to(value, (self.i_len,))
+            return
+        old = self.dict_env.get(s_name)
+        if old is None:
+            old = self.dict_inputs.get(s_name, math.nan)
+        self.dict_env[s_name] = np.where(mask, value, old)
+
+
+def def_to_bool(value: Any) -> Any:
+    '''
+    Функция приведения значения условия к логическому (NaN и 0 - ложь)
+    '''
+    value = np.asarray(value)
+    if value.dtype == bool:
+        return value
+    return np.logical_and(value != 0, ~np.isnan(value))
+
+
+def def_cast(s_type: str, value: Any) -> Any:
+    '''
+    Функция приведения значения к объявленному типу локальной переменной
+    '''
+    if s_type == 'boolean':
+        return def_to_bool(value)
+    value = np.asarray(value, dtype=float)
+    # Целые типы: отбрасывание дробной части (NaN сохраняется как признак недостоверности)
+    return np.trunc(value) if s_type in SET_INT_TYPES else value
+
+
+def def_int_expr(func: Callable) -> Callable:
+    '''
+    Функция пометки выражения целого типа: арифметика над такими выражениями целочисленная
+    '''
+    func.b_int = True
+    return func
+
+
+def def_is_int(value: Any) -> bool:
+    return getattr(value, 'b_int', False)
+
+
+def def_int_divide(left: Any, right: Any) -> Any:
+    '''
+    Функция целочисленного деления Java: отбрасывание дробной части частного
+    '''
+    return np.trunc(np.true_divide(left, right))
+
+
+def def_merge(acc: Any, mask: Any, value: Any) -> Any:
+    '''
+    Функция объединения значений ветвей if по маске
+    '''
+    if value is None:
+        return acc
+    return np.where(mask, value, math.nan if acc is None else acc)
+
+
+# Маркеры констант, допустимых только в определенных местах (null в сравнении, строка - аргумент функции)
+_NULL = object()
+
+
+class _String(str):
+    pass
+
+
+class _Parser:
+    '''
+    Рекурсивный нисходящий разбор лексем MVEL в замыкания над массивами NumPy
+    '''
+
+    def __init__(self, lst_tokens: List[Token]):
+        self.lst_tokens = [token for token in lst_tokens if token.kind != COMMENT]
+        self.i_pos: int = 0
+        # Типы локальных переменных, переменные с присваиванием и имена, прочитанные до первого присваивания
+        self.dict_types: Dict[str, str] = {}
+        self.set_assigned: Set[str] = set()
+        self.set_inputs: Set[str] = set()
+
+    # --- Лексемы ---
+    def peek(self, i_offset: int = 0) -> Optional[Token]:
+        i: int = self.i_pos + i_offset
+        return self.lst_tokens[i] if i < len(self.lst_tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise MVELCompileError('Неожиданный конец выражения')
+        self.i_pos += 1
+        return token
+
+    def accept(self, s_text: str) -> bool:
+        token = self.peek()
+        if token is not None and token.text == s_text and token.kind != STRING:
+            self.i_pos += 1
+            return True
+        return False
+
+    def expect(self, s_text: str):
+        token = self.peek()
+        if not self.accept(s_text):
+            raise MVELCompileError(f'Ожидается "{s_text}", найдено "{token.text if token else "конец выражения"}"')
+
+    # --- Инструкции ---
+    def program(self) -> Callable:
+        run = self.statements()
+        if self.peek() is not None:
+            raise MVELCompileError(f'Лишняя лексема "{self.peek().text}"')
+        return run
+
+    def statements(self) -> Callable:
+        lst_run: List[Callable] = []
+        while True:
+            while self.accept(';'):
+                pass
+            token = self.peek()
+            if token is None or token.text == '}':
+                break
+            lst_run.append(self.statement())
+
+        def run(ctx: _Context, mask: Optional[np.ndarray]) -> Any:
+            value = None
+            for run_one in lst_run:
+                value_one = run_one(ctx, mask)
+                if value_one is not None:
+                    value = value_one
+            return value
+        return run
+
+    def statement(self) -> Callable:
+        token = self.peek()
+        token_next = self.peek(1)
+        if token.kind == NAME and token.text == 'if':
+            return self.statement_if()
+        if token.text == '{' and token.kind == OPEN:
+            return self.block()
+        if token.kind == NAME and token.text == 'return':
+            self.next()
+            return self.statement_expression()
+        if token.kind == NAME and token.text.lower() in LST_DATA_TYPES and token_next is not None \
+                and token_next.kind == NAME:
+            return self.statement_declaration()
+        if token.kind == NAME and token_next is not None and token_next.kind == OP \
+                and (token_next.text == '=' or token_next.text in DICT_ASSIGN):
+            return self.statement_assign()
+        return self.statement_expression()
+
+    def block(self) -> Callable:
+        self.expect('{')
+        run = self.statements()
+        self.expect('}')
+        return run
+
+    def statement_if(self) -> Callable:
+        self.expect('if')
+        cond = self.expression()
+        run_then = self.block()
+        run_else: Optional[Callable] = None
+        if self.accept('else'):
+            run_else = self.statement_if() if self.peek() is not None and self.peek().text == 'if' else self.block()
+
+        def run(ctx: _Context, mask: Optional[np.ndarray]) -> Any:
+            b_cond = np.broadcast_to(def_to_bool(cond(ctx)), (ctx.i_len,))
+            mask_then = b_cond if mask is None else mask & b_cond
+            value = def_merge(None, mask_then, run_then(ctx, mask_then))
+            if run_else is not None:
+                mask_else = ~b_cond if mask is None else mask & ~b_cond
+                value = def_merge(value, mask_else, run_else(ctx, mask_else))
+            return value
+        return run
+
+    def statement_declaration(self) -> Callable:
+        s_type: str = self.next().text.lower()
+        s_name: str = self.next().text
+        if s_type in ('string', 'char'):
+            raise MVELCompileError(f'Тип {s_type} переменной "{s_name}" не поддерживается')
+        self.dict_types[s_name] = s_type
+        self.set_assigned.add(s_name)
+        value_expr: Optional[Callable] = self.expression() if self.accept('=') else None
+        default = False if s_type == 'boolean' else math.nan
+
+        def run(ctx: _Context, mask: Optional[np.ndarray]) -> Any:
+            value = def_cast(s_type, value_expr(ctx)) if value_expr is not None else default
+            ctx.assign(s_name, value, mask)
+            return value if value_expr is not None else None
+        return run
+
+    def statement_assign(self) -> Callable:
+        s_name: str = self.next().text
+        s_op: str = self.next().text
+        value_expr = self.expression()
+        if s_op in DICT_ASSIGN:
+            value_expr = self.binary_op(DICT_ASSIGN[s_op], self.variable(s_name), value_expr)
+        self.set_assigned.add(s_name)
+
+        def run(ctx: _Context, mask: Optional[np.ndarray]) -> Any:
+            value = value_expr(ctx)
+            s_type: Optional[str] = self.dict_types.get(s_name)
+            if s_type is not None:
+                value = def_cast(s_type, value)
+            ctx.assign(s_name, value, mask)
+            return value
+        return run
+
+    def statement_expression(self) -> Callable:
+        value_expr = self.expression()
+        return lambda ctx, mask: value_expr(ctx)
+
+    # --- Выражения ---
+    def expression(self) -> Callable:
+        cond = self.binary(1)
+        if self.accept('?'):
+            value_true = self.expression()
+            self.expect(':')
+            value_false = self.expression()
+            self.check_value(cond)
+            run = lambda ctx: np.where(def_to_bool(cond(ctx)), value_true(ctx), value_false(ctx))
+            return def_int_expr(run) if def_is_int(value_true) and def_is_int(value_false) else run
+        return cond
+
+    def binary(self, i_min_prec: int) -> Any:
+        left = self.unary()
+        while True:
+            token = self.peek()
+            if token is None or token.kind not in (OP, NAME):
+                return left
+            i_prec: Optional[int] = DICT_PRECEDENCE.get(token.text)
+            if i_prec is None or i_prec < i_min_prec:
+                return left
+            self.next()
+            right = self.binary(i_prec + 1)
+            left = self.binary_op(token.text, left, right)
+
+    def binary_op(self, s_op: str, left: Any, right: Any) -> Callable:
+        # Сравнение с null: проверка недостоверного значения
+        if s_op in ('==', '!=') and (left is _NULL or right is _NULL):
+            operand = right if left is _NULL else left
+            self.check_value(operand)
+            if s_op == '==':
+                return lambda ctx: np.isnan(np.asarray(operand(ctx), dtype=float))
+            return lambda ctx: ~np.isnan(np.asarray(operand(ctx), dtype=float))
+        self.check_value(left)
+        self.check_value(right)
+        func = DICT_BINARY[s_op]
+        if s_op in SET_INT_ARITHMETIC and def_is_int(left) and def_is_int(right):
+            func = def_int_divide if s_op == '/' else func
+            return def_int_expr(lambda ctx: func(left(ctx), right(ctx)))
+        return lambda ctx: func(left(ctx), right(ctx))
+
+    def unary(self) -> Any:
+        if self.accept('-'):
+            operand = self.unary()
+            self.check_value(operand)
+            run = lambda ctx: np.negative(operand(ctx))
+            return def_int_expr(run) if def_is_int(operand) else run
+        if self.accept('+'):
+            return self.unary()
+        if self.accept('!'):
+            operand = self.unary()
+            self.check_value(operand)
+            return lambda ctx: np.logical_not(def_to_bool(operand(ctx)))
+        return self.primary()
+
+    def primary(self) -> Any:
+        token = self.next()
+        if token.kind == NUMBER:
+            f_value: float = float(token.text.rstrip('lLdDfFbB'))
+            run = lambda ctx: f_value
+            return def_int_expr(run) if RE_INT_LITERAL.fullmatch(token.text) else run
+        if token.kind == STRING:
+            return _String(token.text[1:-1])
+        if token.text == '(' and token.kind == OPEN:
+            value_expr = self.expression()
+            self.expect(')')
+            return value_expr
+        if token.text == '$':
+            return self.variable(self.expect_name())
+        if token.kind == NAME:
+            s_lower: str = token.text.lower()
+            if s_lower in ('true', 'false'):
+                b_value: bool = s_lower == 'true'
+                return lambda ctx: b_value
+            if s_lower == 'null':
+                return _NULL
+            if self.peek() is not None and self.peek().text == '.':
+                return self.function(token.text)
+            return self.variable(token.text)
+        raise MVELCompileError(f'Неподдерживаемая лексема "{token.text}"')
+
+    def expect_name(self) -> str:
+        token = self.next()
+        if token.kind != NAME:
+            raise MVELCompileError(f'Ожидается имя атрибута, найдено "{token.text}"')
+        return token.text
+
+    def variable(self, s_name: str) -> Callable:
+        if s_name not in self.set_assigned:
+            self.set_inputs.add(s_name)
+        run = lambda ctx: ctx.value(s_name)
+        return def_int_expr(run) if self.dict_types.get(s_name) in SET_INT_TYPES else run
+
+    def function(self, s_object: str) -> Callable:
+        self.expect('.')
+        s_func: str = self.expect_name()
+        s_full: str = f'{s_object}.{s_func}'
+        self.expect('(')
+        lst_args: List[Any] = []
+        if not self.accept(')'):
+            while True:
+                lst_args.append(self.expression())
+                if self.accept(')'):
+                    break
+                self.expect(',')
+
+        if s_full == 'Fn.badVal':
+            # Fn.badVal($X, '*'): недостоверное значение атрибута в текущий момент времени
+            if not lst_args or len(lst_args) > 2 or (len(lst_args) == 2 and lst_args[1] != '*'):
+                raise MVELCompileError("Поддерживается только Fn.badVal($X, '*')")
+            operand = lst_args[0]
+            self.check_value(operand)
+            return lambda ctx: np.isnan(np.asarray(operand(ctx), dtype=float))
+        if s_object == 'Math' and s_func in DICT_MATH:
+            for arg in lst_args:
+                self.check_value(arg)
+            func = DICT_MATH[s_func]
+            run = lambda ctx: func(*(arg(ctx) for arg in lst_args))
+            if s_func == 'round' or (s_func in SET_INT_MATH and all(map(def_is_int, lst_args))):
+                return def_int_expr(run)
+            return run
+        raise MVELCompileError(f'Функция {s_full} не поддерживается')
+
+    @staticmethod
+    def check_value(value: Any):
+        if value is _NULL:
+            raise MVELCompileError('null допускается только в сравнении (x == null, x != null)')
+        if isinstance(value, _String):
+            raise MVELCompileError(f'Строка "{value}" допускается только как аргумент Fn.badVal')
+
+
+class MVELVectorized:
+    '''
+    Скомпилированное MVEL-выражение: вычисляется сразу для массивов значений атрибутов
+    '''
+
+    def __init__(self, s_code: str, lst_variables: Optional[List[Dict[str, Any]]] = None):
+        self.s_code = s_code
+        # Псевдоним атрибута -> путь к свойству в ОМ ZIIoT
+        self.dict_alias_path: Dict[str, str] = {str(dict_var.get('alias', '')): str(dict_var.get('value', ''))
+                                                for dict_var in lst_variables or []}
+        lst_tokens: List[Token] = def_tokenize(s_code)
+        def_fix_numbers(lst_tokens)
+        parser = _Parser(lst_tokens)
+        self._run = parser.program()
+        # Входные атрибуты: имена, прочитанные до первого присваивания (A = A * 2; if (Fn.badVal($A, '*')) {A = 0})
+        self.lst_inputs: List[str] = sorted(parser.set_inputs)
+        # Атрибуты с присваиванием без объявления типа: история используется, если передана (значение вне ветви if)
+        self.lst_optional_inputs: List[str] = sorted(parser.set_assigned - parser.set_inputs - parser.dict_types.keys())
+
+    def __call__(self, dict_data: Mapping[str, Any], i_len: Optional[int] = None) -> np.ndarray:
+        '''
+        Вычисляет выражение
+
+        :param dict_data: Массивы значений атрибутов по псевдониму или пути из "variables" (NaN - недостоверное)
+        :param i_len: Длина результата, если выражение не использует атрибуты
+        :return: Массив результатов для всех отметок времени
+        '''
+        dict_inputs: Dict[str, np.ndarray] = {}
+        for s_alias in self.lst_inputs:
+            s_key: str = s_alias if s_alias in dict_data else self.dict_alias_path.get(s_alias, s_alias)
+            if s_key not in dict_data:
+                raise KeyError(f'Нет данных для атрибута "{s_alias}"' +
+                               (f' ({s_key})' if s_key != s_alias else ''))
+            dict_inputs[s_alias] = np.asarray(dict_data[s_key], dtype=float)
+        for s_alias in self.lst_optional_inputs:
+            s_key = s_alias if s_alias in dict_data else self.dict_alias_path.get(s_alias, s_alias)
+            if s_key in dict_data:
+                dict_inputs[s_alias] = np.asarray(dict_data[s_key], dtype=float)
+        set_len: Set[int] = {len(values) for values in dict_inputs.values()}
+        if len(set_len) > 1:
+            raise ValueError(f'Массивы атрибутов разной длины: {sorted(set_len)}')
+        i_len = set_len.pop() if set_len else (i_len or 1)
+
+        ctx = _Context(dict_inputs, i_len)
+        # Деление на ноль и операции с NaN дают inf/NaN без предупреждений, как при расчете по точкам
+        with np.errstate(all='ignore'):
+            value = self._run(ctx, None)
+        if value is None:
+            raise MVELCompileError('Выражение не возвращает значение')
+        return np.array(np.broadcast_to(value, (i_len,)))
+
+
+def def_compile(s_code: str, lst_variables: Optional[List[Dict[str, Any]]] = None) -> MVELVectorized:
+    '''
+    Функция компиляции MVEL-выражения в векторный вычислитель
+
+    :param s_code: Строка с MVEL-выражением
+    :param lst_variables: Атрибуты из выгрузки ОМ ZIIoT ("variables": alias -> value)
+    :return: Вычислитель
+    '''
+    return MVELVectorized(s_code, lst_variables)
+
+
+def def_compile_config(config: MVELConfig) -> MVELVectorized:
+    '''
+    Функция компиляции MVEL-выражения из записи выгрузки ОМ ZIIoT (см. def_json_parsing)
+    '''
+    return MVELVectorized(config.expression, config.variables)
+
+
+def def_read_history(s_path: str, s_delimiter: str) -> Dict[str, Any]:
+    '''
+    Функция чтения истории из CSV: первая строка - заголовки (псевдонимы или пути атрибутов), первый столбец -
+    метка времени. Пустые и нечисловые значения считаются недостоверными (NaN)
+
+    :param s_path: Путь к файлу
+    :param s_delimiter: Разделитель столбцов (для ";" допускается запятая в вещественных числах)
+    :return: Словарь столбцов: метки времени - списком строк, значения - массивами
+    '''
+    with open(s_path, 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file, delimiter=s_delimiter)
+        lst_header: List[str] = next(reader)
+        lst_columns: List[List[str]] = [list(column) for column in zip(*reader)] or [[] for _ in lst_header]
+
+    def def_to_float(s_value: str) -> float:
+        try:
+            return float(s_value.replace(',', '.') if s_delimiter == ';' else s_value)
+        except ValueError:
+            return math.nan
+
+    dict_out: Dict[str, Any] = {lst_header[0]: lst_columns[0]}
+    for s_name, lst_values in zip(lst_header[1:], lst_columns[1:]):
+        dict_out[s_name] = np.fromiter((def_to_float(s) for s in lst_values), dtype=float, count=len(lst_values))
+    return dict_out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Расчет MVEL-выражения на истории значений атрибутов')
+    parser.add_argument('--config', help='Json-запись тега из выгрузки ОМ ZIIoT (поле "Configuration")')
+    parser.add_argument('--expression', help='MVEL-выражение (если нет --config)')
+    parser.add_argument('--history', help='CSV: метка времени и столбцы атрибутов (псевдоним или путь)',
+                        required=True)
+    parser.add_argument('--delimiter', help='Разделитель столбцов CSV', default=',')
+    parser.add_argument('--output', '-o', help='CSV с результатом', default='mvel_result.csv')
+    args = parser.parse_args(argv)
+
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as file:
+            config = MVELConfig.from_dict(json.load(file))
+    elif args.expression:
+        config = MVELConfig(expression=args.expression)
+    else:
+        parser.error('Нужно указать --config или --expression')
+
+    evaluator = def_compile_config(config)
+    dict_history = def_read_history(args.history, args.delimiter)
+    s_time_column: str = next(iter(dict_history))
+    lst_time: List[str] = dict_history[s_time_column]
+
+    f_start: float = time.perf_counter()
+    values = evaluator(dict_history, len(lst_time))
+    f_elapsed: float = time.perf_counter() - f_start
+    print(f'Рассчитано {len(values)} точек за {f_elapsed:.3f} с. Атрибуты: {", ".join(evaluator.lst_inputs)}')
+
+    with open(args.output, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file, delimiter=args.delimiter)
+        writer.writerow([s_time_column, config.tag_id or 'result'])
+        writer.writerows(zip(lst_time, values.tolist()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
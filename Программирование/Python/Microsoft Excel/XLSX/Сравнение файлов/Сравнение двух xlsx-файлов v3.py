@@ -2,17 +2,26 @@
 # -*- coding: utf-8 -*-
 
 from pathlib import Path
+import argparse
 import sys
+import gc
+import weakref
+from itertools import count
 import logging
-from collections import defaultdict
+from collections import defaultdict, Counter
+from bisect import bisect_left
+import openpyxl
 from openpyxl import load_workbook, Workbook
 from openpyxl.utils import get_column_letter, column_index_from_string
 from openpyxl.styles import PatternFill
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.reader.workbook import WorkbookParser
 from tqdm import tqdm
 import difflib
 import pandas as pd
 import warnings
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 
 # Подавление предупреждения openpyxl о Data Validation extension
 warnings.filterwarnings("ignore", message="Data Validation extension is not supported")
@@ -21,6 +30,14 @@ warnings.filterwarnings("ignore", message="Data Validation extension is not supp
 TEXT_HIGHLIGHT_FILL = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
 EXCLUDE_OUTPUTS = {"primary_text_diff.xlsx", "secondary_text_diff.xlsx", "result_analyze.log", "summary_diffs.xlsx"}
 FORMAT_STRICTNESS = 'strict'  # 'lenient' or 'strict'
+# Выравнивание строк/столбцов: до этого размера матрицы (n*m) — полное выравнивание Нидлмана-Вунша,
+# для больших листов — выравнивание в полосе вокруг диагонали (память и время линейны по размеру листа)
+ALIGN_FULL_DP_MAX_CELLS = 1_000_000
+ALIGN_BAND_WIDTH = 100  # минимальная полуширина полосы
+ALIGN_BAND_MAX = 500    # полуширина полосы не больше (расширяется на разницу в количестве строк)
+# Проверенная версия openpyxl: разбор одного листа (SingleSheetReader) и сохранение копии листа используют
+# внутренние атрибуты openpyxl (WorkbookParser.find_sheets, ExcelReader.valid_files, Workbook._sheets)
+OPENPYXL_TESTED = '3.1'
 # ==============================
 
 # Основной лог — теперь минимальный, подробные логи идут в отдельные файлы per-sheet
@@ -71,6 +88,7 @@ def row_signature(sheet, row_idx, min_col=None, max_col=None):
 def sequence_similarity(a, b):
     if a is None: a = ""
     if b is None: b = ""
+    if a == b: return 1.0
     return difflib.SequenceMatcher(None, a, b).ratio()
 
 def needleman_wunsch_align(seqA, seqB, match_score_func, gap_penalty=-0.2):
@@ -112,6 +130,106 @@ def needleman_wunsch_align(seqA, seqB, match_score_func, gap_penalty=-0.2):
     alignment.reverse()
     return alignment
 
+def banded_align(seqA, seqB, match_score_func, gap_penalty=-0.2, band=ALIGN_BAND_WIDTH):
+    # Выравнивание в полосе вокруг диагонали (0,0)-(n,m): хранятся две строки счёта и указатели только внутри
+    # полосы (bytearray), память O((n+m)*band). Правила выбора хода те же, что в needleman_wunsch_align, поэтому
+    # если оптимальный путь проходит внутри полосы, результат совпадает с полным выравниванием
+    n = len(seqA); m = len(seqB)
+    neg = float('-inf')
+    bounds = []; pointers = []
+    prev = None; prev_lo = prev_hi = 0
+    for i in range(n+1):
+        # Полоса строки i покрывает диагональ строк i и i+1, поэтому соседние строки всегда перекрываются
+        lo = max(0, (i*m)//n - band)
+        hi = min(m, -(-(i+1)*m//n) + band)
+        cur = [0.0]*(hi-lo+1); ptr = bytearray(hi-lo+1)
+        a = seqA[i-1] if i > 0 else None
+        for j in range(lo, hi+1):
+            k = j - lo
+            if i == 0:
+                if j == 0:
+                    ptr[k] = 3
+                else:
+                    cur[k] = cur[k-1] + gap_penalty; ptr[k] = 2
+                continue
+            if j == 0:
+                cur[k] = prev[0] + gap_penalty; ptr[k] = 1
+                continue
+            match = prev[j-1-prev_lo] + match_score_func(a, seqB[j-1]) if prev_lo <= j-1 <= prev_hi else neg
+            delete = prev[j-prev_lo] + gap_penalty if j <= prev_hi else neg
+            insert = cur[k-1] + gap_penalty if j > lo else neg
+            best = match; p = 0
+            if delete > best:
+                best = delete; p = 1
+            if insert > best:
+                best = insert; p = 2
+            cur[k] = best; ptr[k] = p
+        bounds.append(lo); pointers.append(ptr)
+        prev = cur; prev_lo = lo; prev_hi = hi
+    i, j = n, m
+    alignment = []
+    while i > 0 or j > 0:
+        p = pointers[i][j-bounds[i]]
+        if p == 0:
+            alignment.append((seqA[i-1], seqB[j-1])); i -= 1; j -= 1
+        elif p == 1:
+            alignment.append((seqA[i-1], None)); i -= 1
+        else:
+            alignment.append((None, seqB[j-1])); j -= 1
+    alignment.reverse()
+    return alignment
+
+def align_sequences(seqA, seqB, match_score_func, gap_penalty=-0.2):
+    # Небольшие матрицы выравниваются полностью (как раньше), большие — в полосе вокруг диагонали.
+    # Полоса расширяется на разницу длин, чтобы покрыть вставку/удаление блока строк
+    n = len(seqA); m = len(seqB)
+    if n * m <= ALIGN_FULL_DP_MAX_CELLS:
+        return needleman_wunsch_align(seqA, seqB, match_score_func, gap_penalty)
+    band = min(ALIGN_BAND_WIDTH + abs(n - m), max(ALIGN_BAND_WIDTH, ALIGN_BAND_MAX))
+    return banded_align(seqA, seqB, match_score_func, gap_penalty, band)
+
+def anchor_pairs(sigs_a, sigs_b):
+    # Якоря (как в patience diff): строки, которые встречаются ровно один раз в каждом листе и совпадают.
+    # Из них берётся наибольшая возрастающая по обоим листам подпоследовательность, O(k log k)
+    count_a = Counter(sigs_a); count_b = Counter(sigs_b)
+    pos_b = {sig: j for j, sig in enumerate(sigs_b) if count_b[sig] == 1}
+    pairs = [(i, pos_b[sig]) for i, sig in enumerate(sigs_a) if count_a[sig] == 1 and sig in pos_b]
+    tails = []; tails_k = []; prev = [-1]*len(pairs)
+    for k, (i, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos > 0: prev[k] = tails_k[pos-1]
+        if pos == len(tails):
+            tails.append(j); tails_k.append(k)
+        else:
+            tails[pos] = j; tails_k[pos] = k
+    anchors = []
+    k = tails_k[-1] if tails_k else -1
+    while k >= 0:
+        anchors.append(pairs[k]); k = prev[k]
+    anchors.reverse()
+    return anchors
+
+def align_with_anchors(seqA, seqB, sigs_a, sigs_b, match_score_func, gap_penalty=-0.2):
+    # Якоря фиксируются сразу, совпадающие строки на краях промежутков между якорями сопоставляются без счёта,
+    # и только остаток промежутков выравнивается по похожести (align_sequences)
+    alignment = []
+    start_a = start_b = 0
+    for end_a, end_b in anchor_pairs(sigs_a, sigs_b) + [(len(seqA), len(seqB))]:
+        lo_a, lo_b, hi_a, hi_b = start_a, start_b, end_a, end_b
+        # Конец промежутка — первым, как при обратном проходе полного выравнивания
+        tail = []
+        while hi_a > lo_a and hi_b > lo_b and sigs_a[hi_a-1] == sigs_b[hi_b-1]:
+            hi_a -= 1; hi_b -= 1; tail.append((seqA[hi_a], seqB[hi_b]))
+        while lo_a < hi_a and lo_b < hi_b and sigs_a[lo_a] == sigs_b[lo_b]:
+            alignment.append((seqA[lo_a], seqB[lo_b])); lo_a += 1; lo_b += 1
+        if lo_a < hi_a or lo_b < hi_b:
+            alignment.extend(align_sequences(seqA[lo_a:hi_a], seqB[lo_b:hi_b], match_score_func, gap_penalty))
+        alignment.extend(reversed(tail))
+        if end_a < len(seqA):
+            alignment.append((seqA[end_a], seqB[end_b]))
+        start_a, start_b = end_a + 1, end_b + 1
+    return alignment
+
 def get_used_bounds(sheet):
     min_row = None; min_col = None; max_row = 0; max_col = 0
     for row in sheet.iter_rows():
@@ -207,6 +325,42 @@ def compare_formats(sig_a, sig_b, strictness='strict'):
     equal = len(diffs) == 0
     return equal, "; ".join(diffs)
 
+# --- Кэш оформления ---
+# openpyxl хранит стиль ячейки как массив индексов (cell._style: шрифт, заливка, границы, выравнивание, формат числа)
+# в общих списках книги, а различных стилей на листе обычно несколько десятков. Поэтому подпись оформления строится
+# один раз на (книга, стиль), а сравнение выполняется один раз на пару стилей.
+# Книге выдается порядковый номер: в отличие от id(wb) он не повторяется после освобождения книги (release)
+_workbook_tokens = weakref.WeakKeyDictionary()
+_workbook_counter = count()
+_signature_cache = {}
+_compare_cache = {}
+
+def style_key(cell):
+    if cell is None: return None
+    wb = cell.parent.parent
+    token = _workbook_tokens.get(wb)
+    if token is None:
+        token = _workbook_tokens[wb] = next(_workbook_counter)
+    return token, tuple(cell._style)
+
+def cached_format_signature(cell):
+    key = style_key(cell)
+    if key is None: return None
+    sig = _signature_cache.get(key)
+    if sig is None:
+        sig = _signature_cache[key] = format_signature(cell)
+    return sig
+
+def compare_cell_formats(p_cell, s_cell, strictness='strict'):
+    key = (style_key(p_cell), style_key(s_cell), strictness)
+    result = _compare_cache.get(key)
+    if result is None:
+        result = _compare_cache[key] = compare_formats(cached_format_signature(p_cell), cached_format_signature(s_cell), strictness=strictness)
+    return result
+
+def clear_style_caches():
+    _signature_cache.clear(); _compare_cache.clear()
+
 def align_and_compare_sheets(ws_primary, ws_secondary):
     diffs = {'Text': [], 'Formulas': [], 'Formatting': [], 'Hidden': {'rows_added': [], 'rows_removed': [], 'cols_added': [], 'cols_removed': []}, 'Comments': []}
     pmin_r, pmin_c, pmax_r, pmax_c = get_used_bounds(ws_primary)
@@ -223,7 +377,7 @@ def align_and_compare_sheets(ws_primary, ws_secondary):
     idx_map_A = {r:i for i,r in enumerate(seqA)}; idx_map_B = {r:i for i,r in enumerate(seqB)}
     def match_wrapper_fast(a,b):
         i = idx_map_A[a]; j = idx_map_B[b]; return row_score(i,j)
-    row_alignment = needleman_wunsch_align(seqA, seqB, match_wrapper_fast, gap_penalty=-0.15)
+    row_alignment = align_with_anchors(seqA, seqB, prim_sigs, sec_sigs, match_wrapper_fast, gap_penalty=-0.15)
     aligned_rows = row_alignment
     mapping_positions = []
     for pair in tqdm(aligned_rows, desc="    выравнивание строк", leave=False):
@@ -238,7 +392,11 @@ def align_and_compare_sheets(ws_primary, ws_secondary):
         prim_idx_map = {c:i for i,c in enumerate(prim_cols)}; sec_idx_map = {c:i for i,c in enumerate(sec_cols)}
         def match_col_fast(a,b):
             i = prim_idx_map[a]; j = sec_idx_map[b]; return sequence_similarity(prim_cells[i], sec_cells[j])
-        col_alignment = needleman_wunsch_align(prim_cols, sec_cols, match_col_fast, gap_penalty=-0.3)
+        if prim_cells == sec_cells:
+            # Одинаковые строки: оптимально только сопоставление столбцов по порядку
+            col_alignment = list(zip(prim_cols, sec_cols))
+        else:
+            col_alignment = align_sequences(prim_cols, sec_cols, match_col_fast, gap_penalty=-0.3)
         aligned_cols = col_alignment
         mapping_positions.append((p_row, s_row, aligned_cols))
         for p_col, s_col in aligned_cols:
@@ -258,8 +416,7 @@ def align_and_compare_sheets(ws_primary, ws_secondary):
             if p_text != s_text:
                 if not (p_text == "" and s_text == ""):
                     diffs['Text'].append((p_coord, s_coord, p_text, s_text))
-            sig_p = format_signature(p_cell); sig_s = format_signature(s_cell)
-            equal_fmt, details = compare_formats(sig_p, sig_s, strictness=FORMAT_STRICTNESS)
+            equal_fmt, details = compare_cell_formats(p_cell, s_cell, strictness=FORMAT_STRICTNESS)
             if not equal_fmt:
                 diffs['Formatting'].append((p_coord, s_coord, details))
             p_comm = p_cell.comment.text if (p_cell is not None and getattr(p_cell, 'comment', None)) else None
@@ -331,9 +488,85 @@ def save_summary_excel(diffs, out_path):
     # Important: close writer (writer.save() may not exist in some pandas versions)
     writer.close()
 
-def create_single_sheet_copy_with_highlights(src_path, sheet_name, highlights_set, out_path):
-    keep_vba = src_path.suffix.lower() == '.xlsm'
-    wb = load_workbook(src_path, data_only=False, keep_vba=keep_vba)
+def check_openpyxl_internals():
+    # Внутренние атрибуты openpyxl могут измениться в другой версии: тогда остановка с ошибкой, а не пустые листы
+    missing = [name for name, ok in (
+        ('Workbook._sheets', isinstance(getattr(Workbook(), '_sheets', None), list)),
+        ('WorkbookParser.find_sheets', callable(getattr(WorkbookParser, 'find_sheets', None))),
+        ('ExcelReader.read_worksheets', callable(getattr(ExcelReader, 'read_worksheets', None))),
+    ) if not ok]
+    if missing:
+        raise RuntimeError(f"openpyxl {openpyxl.__version__}: нет внутренних атрибутов {', '.join(missing)}. "
+                           f"Установите проверенную версию: pip install \"openpyxl=={OPENPYXL_TESTED}.*\"")
+    if not openpyxl.__version__.startswith(OPENPYXL_TESTED + '.'):
+        warnings.warn(f"openpyxl {openpyxl.__version__} не проверялся (проверена {OPENPYXL_TESTED}.*)")
+
+class SingleSheetReader(ExcelReader):
+    # Разбирается только лист sheet_name, остальные листы книги создаются пустыми: имена и порядок листов
+    # сохраняются, поэтому именованные диапазоны (по индексу листа) привязываются к тем же листам
+    def __init__(self, fn, sheet_name, **kwargs):
+        super().__init__(fn, **kwargs)
+        self.sheet_name = sheet_name
+
+    def read_worksheets(self):
+        find_sheets = getattr(getattr(self, 'parser', None), 'find_sheets', None)
+        valid_files = getattr(self, 'valid_files', None)
+        if find_sheets is None or valid_files is None:
+            raise RuntimeError(f"openpyxl {openpyxl.__version__}: изменилось устройство ExcelReader, "
+                               f"разбор одного листа невозможен (проверена версия {OPENPYXL_TESTED}.*)")
+        found = []
+        def only_target():
+            for sheet, rel in find_sheets():
+                if sheet.name == self.sheet_name:
+                    found.append(sheet.name)
+                    yield sheet, rel
+                elif rel.target in valid_files:
+                    self.wb.create_sheet(sheet.name)
+        self.parser.find_sheets = only_target
+        try:
+            super().read_worksheets()
+        finally:
+            self.parser.find_sheets = find_sheets
+        if found and self.sheet_name not in self.wb.sheetnames:
+            raise RuntimeError(f"openpyxl {openpyxl.__version__}: лист {self.sheet_name} найден в книге, но не загружен")
+
+class WorkbookSession:
+    # Книги сравнения загружаются один раз за запуск и общие для сравнения листов и выгрузки копий с подсветкой.
+    # После обработки лист удаляется из книг (release), чтобы память освобождалась сразу, а не в конце запуска.
+    # Если задан sheet_name, из каждой книги разбирается только этот лист (воркеры --jobs)
+    def __init__(self, sheet_name=None):
+        self.books = {}
+        self.sheet_name = sheet_name
+
+    def get(self, path):
+        wb = self.books.get(path)
+        if wb is None:
+            keep_vba = path.suffix.lower() == '.xlsm'
+            if self.sheet_name is None:
+                wb = load_workbook(path, data_only=False, keep_vba=keep_vba)
+            else:
+                reader = SingleSheetReader(path, self.sheet_name, data_only=False, keep_vba=keep_vba)
+                reader.read()
+                wb = reader.wb
+            self.books[path] = wb
+        return wb
+
+    def release(self, sheet_name):
+        for wb in self.books.values():
+            if sheet_name in wb.sheetnames:
+                wb.remove(wb[sheet_name])
+        gc.collect()
+
+    def close(self):
+        for wb in self.books.values():
+            wb.close()
+        self.books.clear()
+        clear_style_caches()
+        gc.collect()
+
+def create_single_sheet_copy_with_highlights(src_path, sheet_name, highlights_set, out_path, session=None):
+    wb = session.get(src_path) if session is not None else \
+        load_workbook(src_path, data_only=False, keep_vba=(src_path.suffix.lower() == '.xlsm'))
     # If sheet not present, create empty workbook with that name
     if sheet_name not in wb.sheetnames:
         # create a workbook with single empty sheet
@@ -342,13 +575,6 @@ def create_single_sheet_copy_with_highlights(src_path, sheet_name, highlights_se
         ws.title = sheet_name
         new_wb.save(out_path)
         return
-    # Remove other sheets
-    for name in list(wb.sheetnames):
-        if name != sheet_name:
-            try:
-                wb.remove(wb[name])
-            except Exception:
-                pass
     ws = wb[sheet_name]
     # Apply highlight to provided coordinates
     for coord in highlights_set:
@@ -370,8 +596,16 @@ def create_single_sheet_copy_with_highlights(src_path, sheet_name, highlights_se
             ws.conditional_formatting._cf_rules = {}
         except Exception:
             pass
-    # Save keeping vba if needed
-    wb.save(out_path)
+    # Save keeping vba if needed. В файл попадает только этот лист: остальные листы книги исключаются на время
+    # сохранения (wb.remove только убирает лист из wb._sheets), книга сессии остаётся целой
+    sheets = wb._sheets
+    wb._sheets = [ws]
+    try:
+        if wb.worksheets != [ws]:
+            raise RuntimeError(f"openpyxl {openpyxl.__version__}: Workbook._sheets не определяет листы книги")
+        wb.save(out_path)
+    finally:
+        wb._sheets = sheets
 
 def write_logs_to_files(diffs, loggers):
     # Write Text
@@ -414,11 +648,17 @@ def write_logs_to_files(diffs, loggers):
     else:
         f.write("Категория: Примечания — различий не обнаружено.\n")
 
-def process_sheet_pair(primary_path, secondary_path, sheet_name, out_root):
+def process_sheet_pair(primary_path, secondary_path, sheet_name, out_root, session=None):
+    if session is None:
+        session = WorkbookSession()
+        try:
+            return process_sheet_pair(primary_path, secondary_path, sheet_name, out_root, session)
+        finally:
+            session.close()
     loggers = prepare_loggers(sheet_name, out_root)
     try:
-        wb_p = load_workbook(primary_path, data_only=False, keep_vba=(primary_path.suffix.lower()=='.xlsm'))
-        wb_s = load_workbook(secondary_path, data_only=False, keep_vba=(secondary_path.suffix.lower()=='.xlsm'))
+        wb_p = session.get(primary_path)
+        wb_s = session.get(secondary_path)
     except Exception as e:
         logging.info(f"Ошибка при загрузке файлов: {e}")
         close_loggers(loggers)
@@ -445,8 +685,8 @@ def process_sheet_pair(primary_path, secondary_path, sheet_name, out_root):
     sheet_dir = loggers['dir']
     out_p = sheet_dir / (f"primary_text_diff{'.xlsm' if primary_path.suffix.lower()=='.xlsm' else '.xlsx'}")
     out_s = sheet_dir / (f"secondary_text_diff{'.xlsm' if secondary_path.suffix.lower()=='.xlsm' else '.xlsx'}")
-    create_single_sheet_copy_with_highlights(primary_path, sheet_name, prim_coords, out_p)
-    create_single_sheet_copy_with_highlights(secondary_path, sheet_name, sec_coords, out_s)
+    create_single_sheet_copy_with_highlights(primary_path, sheet_name, prim_coords, out_p, session)
+    create_single_sheet_copy_with_highlights(secondary_path, sheet_name, sec_coords, out_s, session)
     # Сохраняем summary_diffs.xlsx в папке листа
     summary_path = sheet_dir / 'summary_diffs.xlsx'
     try:
@@ -456,7 +696,32 @@ def process_sheet_pair(primary_path, secondary_path, sheet_name, out_root):
         logging.info(f"Не удалось сохранить summary для листа {sheet_name}: {e}")
     close_loggers(loggers)
 
+def process_sheet_worker(primary_path, secondary_path, sheet_name, out_root):
+    # Воркер --jobs: из книг разбирается только сравниваемый лист, после обработки книги закрываются
+    session = WorkbookSession(sheet_name)
+    try:
+        process_sheet_pair(primary_path, secondary_path, sheet_name, out_root, session)
+    finally:
+        session.close()
+    return sheet_name
+
+def list_sheet_names(path):
+    # Только имена листов: в режиме только для чтения содержимое листов не разбирается
+    wb = load_workbook(path, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сравнение двух xlsx/xlsm-файлов из текущего каталога по листам")
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="количество процессов для параллельного сравнения листов (по умолчанию 1 — по очереди)")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    check_openpyxl_internals()
     files = find_excel_files_in_cwd()
     if len(files) < 2:
         print("В текущем каталоге меньше двух .xlsx/.xlsm файлов. Положите хотя бы два файла и запустите снова.")
@@ -479,10 +744,13 @@ def main():
         primary_path = file2; secondary_path = file1
     else:
         primary_path = file1; secondary_path = file2
-    # Загружаем книги (для определения листов)
-    wb_p = load_workbook(primary_path, data_only=False, keep_vba=(primary_path.suffix.lower()=='.xlsm'))
-    wb_s = load_workbook(secondary_path, data_only=False, keep_vba=(secondary_path.suffix.lower()=='.xlsm'))
-    sheets_p = wb_p.sheetnames; sheets_s = wb_s.sheetnames
+    # Загружаем книги один раз: они же используются при сравнении листов и выгрузке копий с подсветкой.
+    # При --jobs книги загружают процессы-воркеры, здесь нужны только имена листов
+    session = WorkbookSession()
+    if args.jobs > 1:
+        sheets_p = list_sheet_names(primary_path); sheets_s = list_sheet_names(secondary_path)
+    else:
+        sheets_p = session.get(primary_path).sheetnames; sheets_s = session.get(secondary_path).sheetnames
     # Если набор имён листов совпадает — анализируем все без запроса
     set_p = set(sheets_p); set_s = set(sheets_s)
     out_root = Path('./results')
@@ -511,10 +779,23 @@ def main():
             sidx_s = 1
         sheet_secondary_name = sheets_s[sidx_s-1]
         # If selected names are same, process single; otherwise process the two names (intersection handled later)
-        sheets_to_process = [sheet_primary_name, sheet_secondary_name]
+        # Одинаковое имя обрабатывается один раз (лист освобождается после обработки)
+        sheets_to_process = list(dict.fromkeys([sheet_primary_name, sheet_secondary_name]))
     # Для каждого листа запускаем процессинг
-    for sheet_name in sheets_to_process:
-        process_sheet_pair(primary_path, secondary_path, sheet_name, out_root)
+    try:
+        if args.jobs > 1 and len(sheets_to_process) > 1:
+            # Листы независимы: результаты results/<лист>/ те же, что при последовательной обработке
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(sheets_to_process))) as pool:
+                futures = [pool.submit(process_sheet_worker, primary_path, secondary_path, sheet_name, out_root)
+                           for sheet_name in sheets_to_process]
+                for future in futures:
+                    future.result()
+        else:
+            for sheet_name in sheets_to_process:
+                process_sheet_pair(primary_path, secondary_path, sheet_name, out_root, session)
+                session.release(sheet_name)
+    finally:
+        session.close()
     print("Готово. Смотрите папку ./results для логов и diff-файлов по листам.")
 
 if __name__ == '__main__':